@@ -0,0 +1,286 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the rating replay, rating queries and service endpoints on synthetic seasons."
+    )
+    parser.add_argument(
+        "--db-url",
+        help="database to benchmark against, e.g. a local Postgres. "
+        "Its tables are dropped and recreated. Defaults to a temporary SQLite file"
+    )
+    parser.add_argument("--players", type=int, default=30, help="number of players")
+    parser.add_argument("--games", type=int, default=2000, help="number of games across all seasons")
+    parser.add_argument("--seasons", type=int, default=2, help="number of seasons, the last one is active")
+    parser.add_argument("--inserts", type=int, default=20, help="number of games created through the API")
+    parser.add_argument(
+        "--past-fraction",
+        type=float,
+        default=0.5,
+        help="fraction of the games created through the API that are past-dated"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="number of timed runs per read benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the synthetic data")
+    parser.add_argument("--output", help="path of the JSON results, printed to stdout if not given")
+    return parser.parse_args()
+
+
+def summarize(timings: list[float]) -> dict[str, float]:
+    return {
+        "runs": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings)
+    }
+
+
+def measure(
+    fn: Callable[[], Any],
+    repeat: int,
+    setup: Callable[[], Any] | None = None
+) -> dict[str, float]:
+    """
+    Time repeat runs of fn after one untimed warmup run. setup runs untimed
+    before every run.
+    """
+    timings = []
+    for i in range(repeat + 1):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        if i > 0:
+            timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def main():
+    args = parse_args()
+
+    # The database modules read their settings on import
+    if args.db_url:
+        os.environ["DB_URL"] = args.db_url
+    else:
+        db_path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+        os.environ["DB_URL"] = f"sqlite:///{db_path}"
+        os.environ["ASYNC_DB_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("SHARED_SECRET", "benchmark")
+    os.environ.setdefault("ORIGINS", "*")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from sqlmodel import Session, SQLModel, insert, select
+
+    from foos import color, database as db, rating
+    from foos.database import models, pair_stats
+    import service
+
+    if db.engine.dialect.name == "sqlite":
+        # SQLite drops time zones, and every game date is stored in PST
+        def restore_timezone(game: models.Game, *args):
+            game_date = game.__dict__.get("date")
+            if game_date is not None and game_date.tzinfo is None:
+                game.__dict__["date"] = game_date.replace(tzinfo=service.PST)
+        event.listen(models.Game, "load", restore_timezone)
+        event.listen(models.Game, "refresh", restore_timezone)
+
+    rng = random.Random(args.seed)
+    players = [f"player_{i}" for i in range(args.players)]
+    today = datetime.datetime.now(service.PST).replace(hour=0, minute=0, second=0, microsecond=0)
+    season_days = 90
+    first_day = today - datetime.timedelta(days=season_days * args.seasons)
+
+    def random_game(game_date: datetime.datetime) -> dict[str, Any]:
+        yellow_offense, yellow_defense, black_offense, black_defense = rng.sample(players, 4)
+        losing_score = rng.randint(0, 9)
+        yellow_won = rng.random() < 0.5
+        return {
+            "yellow_offense": yellow_offense,
+            "yellow_defense": yellow_defense,
+            "yellow_score": 10 if yellow_won else losing_score,
+            "black_offense": black_offense,
+            "black_defense": black_defense,
+            "black_score": losing_score if yellow_won else 10,
+            "date": game_date
+        }
+
+    # Seed the database with every season's games and ratings
+    SQLModel.metadata.drop_all(db.engine)
+    db.create_db_and_tables()
+    start = time.perf_counter()
+    with Session(db.engine) as session:
+        session.add_all([
+            models.Player(id=player_id, name=player_id, color=color.get_random_dark_color())
+            for player_id in players
+        ])
+        seasons = [
+            models.Season(
+                name=str(i + 1),
+                start_date=(first_day + datetime.timedelta(days=season_days * i)).date(),
+                end_date=(first_day + datetime.timedelta(days=season_days * (i + 1) - 1)).date(),
+                rating_method="sigmoid_differential",
+                active=i == args.seasons - 1
+            )
+            for i in range(args.seasons)
+        ]
+        session.add_all(seasons)
+        session.commit()
+
+        games_per_season = args.games // args.seasons
+        game_number = 0
+        for i, season in enumerate(seasons):
+            season_games = []
+            for j in range(games_per_season):
+                game_number += 1
+                day = season_days * i + j * season_days // games_per_season
+                season_games.append(models.Game(
+                    id=game_number,
+                    game_number=game_number,
+                    season_id=season.id,
+                    **random_game(first_day + datetime.timedelta(days=day))
+                ))
+            session.execute(insert(models.Game), [game.model_dump() for game in season_games])
+            timeseries_rows = rating.replay_games(season_games, {}, season.rating_method).to_timeseries_rows()
+            session.execute(insert(models.TimeSeries), timeseries_rows)
+        session.commit()
+        rating.backfill_player_season_ratings(session)
+        rating.backfill_game_ratings(session)
+        rating.backfill_daily_ratings(session)
+        rating.backfill_rating_checkpoints(session)
+        pair_stats.backfill_pair_stats(session)
+        active_season = seasons[-1]
+        active_season_id = active_season.id
+        active_games = list(session.exec(
+            select(models.Game)
+            .where(models.Game.season_id == active_season_id)
+            .order_by(models.Game.game_number)
+        ).all())
+    seed_seconds = time.perf_counter() - start
+
+    results: dict[str, dict[str, float]] = {}
+    results["replay_games"] = measure(
+        lambda: rating.replay_games(active_games, {}, "sigmoid_differential").to_timeseries_rows(),
+        args.repeat
+    )
+
+    mid_game_number = active_games[len(active_games) // 2].game_number
+    with Session(db.engine) as session:
+        results["get_player_ratings_cold"] = measure(
+            lambda: rating.get_player_ratings(session, active_season_id),
+            args.repeat,
+            setup=rating.rating_cache.clear
+        )
+        results["get_player_ratings_warm"] = measure(
+            lambda: rating.get_player_ratings(session, active_season_id),
+            args.repeat
+        )
+        results["get_player_ratings_mid_season"] = measure(
+            lambda: rating.get_player_ratings(session, active_season_id, game_number=mid_game_number),
+            args.repeat
+        )
+        results["get_player_stats"] = measure(
+            lambda: rating.get_player_stats(session, active_season_id),
+            args.repeat
+        )
+
+    with TestClient(service.app, headers={"X-Auth-Token": os.environ["SHARED_SECRET"]}) as client:
+        def get(url: str, **params):
+            response = client.get(url, params={"season_id": active_season_id, **params})
+            response.raise_for_status()
+
+        for url in ["/games/", "/players/stats/", "/timeseries/day/"]:
+            results[f"GET {url} uncached"] = measure(
+                lambda: get(url),
+                args.repeat,
+                setup=service.response_cache.clear
+            )
+            results[f"GET {url} cached"] = measure(lambda: get(url), args.repeat)
+
+        # Historical leaderboards should cost the same anywhere in the season
+        for label, game in [
+            ("early", active_games[len(active_games) // 10]),
+            ("mid", active_games[len(active_games) // 2]),
+            ("late", active_games[-1])
+        ]:
+            results[f"GET /players/stats/ as_of_game {label}"] = measure(
+                lambda: get("/players/stats/", as_of_game=game.game_number),
+                args.repeat,
+                setup=service.response_cache.clear
+            )
+
+        # Create games through the API, past-dated ones renumber and replay
+        # the rest of the season
+        append_timings = []
+        past_timings = []
+        for _ in range(args.inserts):
+            past_dated = rng.random() < args.past_fraction
+            if past_dated:
+                game_date = today - datetime.timedelta(days=rng.randint(1, season_days - 1))
+            else:
+                game_date = today
+            game = random_game(game_date)
+            game["iso_date"] = game.pop("date").isoformat()
+            start = time.perf_counter()
+            response = client.post("/games/", json=game)
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            (past_timings if past_dated else append_timings).append(elapsed)
+        if append_timings:
+            results["POST /games/ append"] = summarize(append_timings)
+        if past_timings:
+            results["POST /games/ past-dated"] = summarize(past_timings)
+
+        with Session(db.engine) as session:
+            first_game_id = session.exec(
+                select(models.Game.id)
+                .where(models.Game.season_id == active_season_id)
+                .order_by(models.Game.game_number)
+            ).first()
+        move_timings = []
+        for delta in [1, -1] * max(args.inserts // 2, 1):
+            start = time.perf_counter()
+            response = client.put("/games/move/", params={"game_id": first_game_id, "delta": delta})
+            move_timings.append(time.perf_counter() - start)
+            response.raise_for_status()
+        results["PUT /games/move/ season start"] = summarize(move_timings)
+
+    output = {
+        "config": {
+            "players": args.players,
+            "games": args.games,
+            "seasons": args.seasons,
+            "inserts": args.inserts,
+            "past_fraction": args.past_fraction,
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": db.engine.dialect.name
+        },
+        "seed_seconds": seed_seconds,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,247 @@
-import sys
-from datetime import datetime
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
 
-from foos.database import models
-from foos import rating
+from foos.rating import sweep
+from foos.rating.methods import RATING_METHODS, get_rating_method
+from foos.rating.replay import EncodedGames, replay_encoded
 
 
-def main():
-    games = pd.read_csv(sys.argv[1], nrows=None)
-    players: list[str] = pd.concat(
-        [games["yellow_front"], games["yellow_back"], games["black_front"], games["black_back"]]
-    ).unique().tolist()
-
-    games["yellow_front"] = games["yellow_front"].str.lower().replace(" ", "_")
-    games["yellow_back"] = games["yellow_back"].str.lower().replace(" ", "_")
-    games["black_front"] = games["black_front"].str.lower().replace(" ", "_")
-    games["black_back"] = games["black_back"].str.lower().replace(" ", "_")
-
-    player_id_to_rating = { p.lower().replace(" ", "_"): rating.BASE_RATING for p in players }
-    for _, row in games.iterrows():
-        game = models.Game(
-            date = datetime.strptime(row[["date"]].item(), "%m/%d/%y"),
-            yellow_offense = row[["yellow_front"]].item(),
-            yellow_defense = row[["yellow_back"]].item(),
-            yellow_score = row[["yellow_score"]].item(),
-            black_offense = row[["black_front"]].item(),
-            black_defense = row[["black_back"]].item(),
-            black_score = row[["black_score"]].item()
+# Column names of the original spreadsheet exports
+LEGACY_COLUMNS = {
+    "yellow_front": "yellow_offense",
+    "yellow_back": "yellow_defense",
+    "black_front": "black_offense",
+    "black_back": "black_defense"
+}
+POSITION_COLUMNS = ["yellow_offense", "yellow_defense", "black_offense", "black_defense"]
+
+
+class SimulationResult:
+    def __init__(
+        self,
+        method: str,
+        params: dict[str, float],
+        num_predicted: int,
+        num_correct: int,
+        leaderboards: dict[int, list[tuple[str, float]]]
+    ):
+        self.method = method
+        self.params = params
+        self.num_predicted = num_predicted
+        self.num_correct = num_correct
+        self.leaderboards = leaderboards
+
+    @property
+    def accuracy(self) -> float:
+        return self.num_correct / self.num_predicted if self.num_predicted else 0.0
+
+
+def load_seasons(path: str, season_ids: list[int] | None = None) -> list[EncodedGames]:
+    """
+    Load a games export and encode each season's games in game order.
+    Exports without game numbers are replayed in file order, and exports
+    without seasons are treated as a single season.
+    """
+    games = pd.read_csv(path).rename(columns=LEGACY_COLUMNS)
+    for column in POSITION_COLUMNS:
+        games[column] = games[column].str.lower().str.replace(" ", "_")
+    if "game_number" in games:
+        games = games.sort_values(by="game_number", kind="stable")
+    else:
+        games["game_number"] = range(1, len(games) + 1)
+    if "season_id" not in games:
+        games["season_id"] = 0
+    if "id" not in games:
+        games["id"] = games["game_number"]
+    if season_ids:
+        games = games[games["season_id"].isin(season_ids)]
+
+    return [
+        EncodedGames(
+            game_ids=season_games["id"].tolist(),
+            season_ids=[int(season_id)] * len(season_games),
+            game_numbers=season_games["game_number"].tolist(),
+            positions=[season_games[column].tolist() for column in POSITION_COLUMNS],
+            yellow_scores=season_games["yellow_score"].to_numpy(),
+            black_scores=season_games["black_score"].to_numpy(),
+            player_ids=[]
+        )
+        for season_id, season_games in games.groupby("season_id")
+    ]
+
+
+_seasons: list[EncodedGames] = []
+
+
+def _init_worker(seasons: list[EncodedGames]):
+    global _seasons
+    _seasons = seasons
+
+
+def simulate(method: str, params: dict[str, float]) -> SimulationResult:
+    """
+    Replay every loaded season from scratch with the given method and
+    parameters. A game counts as predicted when the teams' pre-game ratings
+    differ, and as correct when the higher rated team won.
+    """
+    num_predicted = 0
+    num_correct = 0
+    leaderboards: dict[int, list[tuple[str, float]]] = {}
+    for encoded in _seasons:
+        result = replay_encoded(encoded, {}, method, params)
+        prev_ratings = result.ratings - result.deltas
+        rating_diff = (prev_ratings[:, 0] + prev_ratings[:, 1] - prev_ratings[:, 2] - prev_ratings[:, 3]) / 2
+        predicted = rating_diff != 0
+        num_predicted += int(predicted.sum())
+        num_correct += int((np.sign(rating_diff[predicted]) == encoded.sign[predicted]).sum())
+        leaderboards[encoded.season_ids[0]] = sorted(
+            result.player_id_to_rating().items(),
+            key=lambda x: x[1],
+            reverse=True
         )
-        game_player_ids = [
-            game.yellow_offense,
-            game.yellow_defense,
-            game.black_offense,
-            game.black_defense
-        ]
-        game_player_id_to_rating: dict[str, float] = {
-            player_id: rating
-            for player_id, rating in player_id_to_rating.items()
-            if player_id in game_player_ids
-        }
-        player_id_to_rating.update(rating.update_ratings(game, game_player_id_to_rating))
-
-    sorted_player_id_ratings = sorted(
-        player_id_to_rating.items(),
-        key=lambda x: x[1],
-        reverse=True
+    return SimulationResult(method, params, num_predicted, num_correct, leaderboards)
+
+
+def simulate_sweep(method: str, params: dict[str, np.ndarray]) -> sweep.SweepResult:
+    return sweep.sweep(_seasons, method, params)
+
+
+def get_configurations(methods: list[str], params_sets: list[dict[str, float]]) -> list[tuple[str, dict[str, float]]]:
+    """
+    Pair every method with every parameter set it accepts.
+    """
+    configurations = []
+    for method in methods:
+        for params in params_sets:
+            try:
+                get_rating_method(method).validate_params(params)
+            except ValueError:
+                continue
+            configurations.append((method, params))
+    return configurations
+
+
+def run_sweeps(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """
+    Sweep the parameter grid under every method that accepts it, splitting
+    each method's configurations across the worker processes, and print the
+    best configurations.
+    """
+    if not args.grid:
+        parser.error("the grid needs at least one parameter")
+    params = sweep.expand_grid(args.grid)
+    methods = [
+        method
+        for method, _ in get_configurations(args.method or list(RATING_METHODS), [args.grid])
+    ]
+    if not methods:
+        parser.error("no rating method accepts the given grid")
+
+    start_time = time.perf_counter()
+    seasons = load_seasons(args.path, args.season)
+    if args.workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(seasons,)
+        ) as executor:
+            results = [
+                sweep.SweepResult.concatenate(list(executor.map(
+                    simulate_sweep,
+                    itertools.repeat(method),
+                    sweep.split_params(params, args.workers)
+                )))
+                for method in methods
+            ]
+    else:
+        _init_worker(seasons)
+        results = [simulate_sweep(method, params) for method in methods]
+    elapsed = time.perf_counter() - start_time
+
+    for result in results:
+        print(f"== {result.method}")
+        for configuration, scores in result.top(args.top_configs, args.metric):
+            print(
+                f"  {json.dumps(configuration)}: log_loss {scores['log_loss']:.4f}, "
+                f"brier {scores['brier']:.4f}, accuracy {scores['accuracy']:.4f}"
+            )
+    num_games = sum(len(encoded) for encoded in seasons)
+    num_configurations = sum(len(result) for result in results)
+    print(f"Swept {num_configurations} configurations over {num_games} games in {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a games export under rating methods and parameter sets."
+    )
+    parser.add_argument("path", help="path to the games CSV")
+    parser.add_argument(
+        "--method",
+        action="append",
+        choices=list(RATING_METHODS),
+        help="rating method to simulate, can be repeated (default: all)"
+    )
+    parser.add_argument(
+        "--params",
+        action="append",
+        type=json.loads,
+        help="JSON object of delta formula constants, can be repeated (default: the formula defaults)"
+    )
+    parser.add_argument(
+        "--grid",
+        type=json.loads,
+        help="JSON object of delta formula constants to lists of values to sweep, e.g. '{\"rating_scale\": [30, 40, 60]}'"
     )
-    for player_id, player_rating in sorted_player_id_ratings:
-        print(f"{player_id}: {player_rating}")
+    parser.add_argument(
+        "--metric",
+        choices=sweep.METRICS,
+        default="log_loss",
+        help="metric to rank swept configurations by (default: log_loss)"
+    )
+    parser.add_argument("--season", action="append", type=int, help="season id to replay, can be repeated")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--top", type=int, default=10, help="number of players per leaderboard")
+    parser.add_argument("--top-configs", type=int, default=10, help="number of configurations printed per sweep")
+    args = parser.parse_args()
+    if args.grid is not None:
+        run_sweeps(parser, args)
+        return
+
+    configurations = get_configurations(args.method or list(RATING_METHODS), args.params or [{}])
+    if not configurations:
+        parser.error("no rating method accepts the given parameters")
+
+    start_time = time.perf_counter()
+    seasons = load_seasons(args.path, args.season)
+    if args.workers > 1 and len(configurations) > 1:
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(seasons,)
+        ) as executor:
+            results = list(executor.map(simulate, *zip(*configurations)))
+    else:
+        _init_worker(seasons)
+        results = [simulate(method, params) for method, params in configurations]
+    elapsed = time.perf_counter() - start_time
+
+    results.sort(key=lambda result: result.accuracy, reverse=True)
+    for result in results:
+        print(f"== {result.method} {json.dumps(result.params)}")
+        print(f"accuracy: {result.accuracy:.4f} ({result.num_correct}/{result.num_predicted} games)")
+        for season_id, leaderboard in result.leaderboards.items():
+            print(f"season {season_id}:")
+            for player_id, player_rating in leaderboard[:args.top]:
+                print(f"  {player_id}: {player_rating:.1f}")
+    num_games = sum(len(encoded) for encoded in seasons)
+    print(f"Simulated {len(results)} configurations over {num_games} games in {elapsed:.2f}s")
 
 
 if __name__ == "__main__":
@@ -1,7 +1,16 @@
+import functools
 import os
+import threading
+from typing import Any
+
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel, create_engine
 from dotenv import load_dotenv
 
+from foos.database import migrations
+
 
 load_dotenv()
 
@@ -9,7 +18,105 @@ DB_URL = os.getenv("DB_URL")
 if not DB_URL:
     raise ValueError("Missing DB url")
 
-engine = create_engine(DB_URL)
+
+def get_async_db_url(db_url: str) -> URL:
+    """
+    Get the asyncpg equivalent of a Postgres URL, or the aiosqlite one of a
+    SQLite URL. asyncpg rejects libpq-only query options, so `sslmode` is
+    passed on as `ssl` and the rest dropped.
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() != "postgresql":
+        return url
+    query = dict(url.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    query.pop("channel_binding", None)
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+
+def _getenv_bool(name: str) -> bool | None:
+    value = os.getenv(name)
+    if value is None:
+        return None
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_engine_options() -> dict[str, Any]:
+    """
+    Get the connection pool options from the environment. Unset options keep
+    SQLAlchemy's defaults. DB_NULL_POOL opens a fresh connection per session,
+    for deploys that sit behind an external pooler such as PgBouncer.
+    """
+    if _getenv_bool("DB_NULL_POOL"):
+        return {"poolclass": NullPool}
+    options: dict[str, Any] = {}
+    for option, name in [
+        ("pool_size", "DB_POOL_SIZE"),
+        ("max_overflow", "DB_MAX_OVERFLOW"),
+        ("pool_recycle", "DB_POOL_RECYCLE"),
+        ("pool_timeout", "DB_POOL_TIMEOUT")
+    ]:
+        value = os.getenv(name)
+        if value:
+            options[option] = int(value)
+    pool_pre_ping = _getenv_bool("DB_POOL_PRE_PING")
+    if pool_pre_ping is not None:
+        options["pool_pre_ping"] = pool_pre_ping
+    return options
+
+
+class SessionMetrics:
+    """
+    Running totals of the sessions handed out to requests.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.num_sessions = 0
+        self.num_errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, error: bool):
+        with self._lock:
+            self.num_sessions += 1
+            self.num_errors += int(error)
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "num_sessions": self.num_sessions,
+                "num_errors": self.num_errors,
+                "total_seconds": self.total_seconds,
+                "max_seconds": self.max_seconds,
+                "pool": engine.pool.status(),
+                "async_pool": get_async_engine().pool.status()
+            }
+
+
+@functools.cache
+def get_async_engine() -> AsyncEngine:
+    """
+    Get the engine of the async read endpoints, created on first use so
+    scripts that only use the sync engine don't need an async driver.
+    """
+    return create_async_engine(
+        os.getenv("ASYNC_DB_URL") or get_async_db_url(DB_URL),
+        **get_engine_options()
+    )
+
+
+engine = create_engine(DB_URL, **get_engine_options())
+session_metrics = SessionMetrics()
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    migrations.migrate(engine)
+    # create_all skips new indexes on tables that already exist
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
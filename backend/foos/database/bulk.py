@@ -0,0 +1,21 @@
+import io
+
+import pandas as pd
+from sqlmodel import Session
+
+
+def copy_frame(session: Session, table: str, frame: pd.DataFrame):
+    """
+    Stream the frame into the table with COPY on the session's connection.
+    """
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
@@ -0,0 +1,145 @@
+from collections import Counter
+
+from sqlalchemy import ColumnElement
+from sqlmodel import Session, case, col, or_, select, update
+
+from foos.database import models
+from foos.database.versions import bump_data_versions
+
+
+def renumber_games(
+    session: Session,
+    start: int,
+    end: int | None,
+    offset: int,
+    *,
+    game_id: int | None = None,
+    game_number: int | None = None
+) -> None:
+    """
+    Shift the game numbers between start and end (inclusive, open ended if end
+    is None) by offset. If game_id is given, that game is moved to game_number
+    in the same pass.
+
+    Every row moves with two set-based UPDATEs. Nothing is committed.
+    """
+    in_range = col(models.Game.game_number) >= start
+    if end is not None:
+        in_range = in_range & (col(models.Game.game_number) <= end)
+
+    new_game_number = col(models.Game.game_number) + offset
+    if game_id is not None:
+        new_game_number = case(
+            (col(models.Game.id) == game_id, game_number),
+            else_=new_game_number
+        )
+        in_range = or_(in_range, col(models.Game.id) == game_id)
+
+    renumbered_from = min(start, start + offset)
+    if game_number is not None:
+        renumbered_from = min(renumbered_from, game_number)
+    _set_game_numbers(session, in_range, new_game_number, renumbered_from)
+
+
+def open_game_number_gaps(session: Session, game_numbers: list[int]) -> list[int]:
+    """
+    Make room for new games to be inserted at each of the given game numbers,
+    i.e. each right before the existing game currently numbered so. Every
+    later game is shifted in one pass by the number of new games inserted
+    before it. New games inserted at the same game number keep their order.
+    Nothing is committed.
+
+    Returns the game number of each new game, in the given order.
+    """
+    if not game_numbers:
+        return []
+    num_inserted_at = Counter(game_numbers)
+    insert_game_numbers = sorted(num_inserted_at)
+    num_inserted_before = {}
+    num_inserted = 0
+    for game_number in insert_game_numbers:
+        num_inserted_before[game_number] = num_inserted
+        num_inserted += num_inserted_at[game_number]
+
+    # Games from each insert point on shift by every game inserted up to it
+    offset = case(
+        *[
+            (
+                col(models.Game.game_number) >= game_number,
+                num_inserted_before[game_number] + num_inserted_at[game_number]
+            )
+            for game_number in reversed(insert_game_numbers)
+        ],
+        else_=0
+    )
+    _set_game_numbers(
+        session,
+        col(models.Game.game_number) >= insert_game_numbers[0],
+        col(models.Game.game_number) + offset,
+        insert_game_numbers[0]
+    )
+
+    new_game_numbers = []
+    num_seen: Counter[int] = Counter()
+    for game_number in game_numbers:
+        new_game_numbers.append(game_number + num_inserted_before[game_number] + num_seen[game_number])
+        num_seen[game_number] += 1
+    return new_game_numbers
+
+
+def _set_game_numbers(
+    session: Session,
+    in_range: ColumnElement[bool],
+    new_game_number: ColumnElement[int],
+    renumbered_from: int
+) -> None:
+    """
+    Set the game numbers of the games in range. The new numbers are first
+    written negated and then flipped back, so every row moves with two
+    set-based UPDATEs and no intermediate state collides on the unique game
+    number index.
+
+    Game numbers are shared across seasons, so the data version of every
+    season with a game from renumbered_from onward is bumped. Their rows are
+    locked in id order before any game is touched, the same order as the
+    rating writers, which lock the season before writing its ratings.
+    """
+    renumbered_season_ids = session.exec(
+        select(models.Season.id)
+        .where(
+            col(models.Season.id).in_(
+                select(models.Game.season_id)
+                .where(col(models.Game.game_number) >= renumbered_from)
+            )
+        )
+        .order_by(models.Season.id)
+        .with_for_update()
+    ).all()
+    if renumbered_season_ids:
+        bump_data_versions(session, list(renumbered_season_ids))
+
+    session.execute(
+        update(models.Game)
+        .where(in_range)
+        .values(game_number=-new_game_number)
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        update(models.Game)
+        .where(col(models.Game.game_number) < 0)
+        .values(game_number=-col(models.Game.game_number))
+        .execution_options(synchronize_session=False)
+    )
+
+    # Keep the game numbers denormalized onto the timeseries in sync
+    session.execute(
+        update(models.TimeSeries)
+        .where(
+            models.TimeSeries.game_id == models.Game.id,
+            col(models.Game.game_number) >= renumbered_from,
+            col(models.TimeSeries.game_number) != col(models.Game.game_number)
+        )
+        .values(game_number=models.Game.game_number)
+        .execution_options(synchronize_session=False)
+    )
+    session.expire_all()
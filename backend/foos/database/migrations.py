@@ -0,0 +1,47 @@
+from sqlalchemy import Engine, inspect, text, update
+
+from foos.database import models
+
+
+def add_missing_columns(engine: Engine):
+    """
+    Add columns introduced after a table was first created. create_all only
+    creates missing tables, so existing databases need these added by hand.
+    """
+    inspector = inspect(engine)
+    for table in [models.TimeSeries.__table__, models.Season.__table__]:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_ddl = f"{column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    column_ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+
+
+def backfill_timeseries_game_columns(engine: Engine):
+    """
+    Copy the season ID and game number of each game onto its timeseries points
+    where they are still missing.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            update(models.TimeSeries)
+            .where(
+                models.TimeSeries.game_id == models.Game.id,
+                models.TimeSeries.season_id.is_(None)
+            )
+            .values(
+                season_id=models.Game.season_id,
+                game_number=models.Game.game_number
+            )
+        )
+
+
+def migrate(engine: Engine):
+    add_missing_columns(engine)
+    backfill_timeseries_game_columns(engine)
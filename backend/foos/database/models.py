@@ -1,5 +1,5 @@
 import datetime
-from sqlmodel import Field, Relationship, SQLModel, Column, DateTime, Index
+from sqlmodel import Field, Relationship, SQLModel, Column, DateTime, Index, col
 
 
 ## Game models
@@ -23,6 +23,7 @@ class GamePublic(GameBase):
 
 class GameDeltaPublic(GameBase):
     id: int
+    game_number: int
     date: datetime.datetime
 
     yellow_offense_rating: int
@@ -69,6 +70,7 @@ class Game(GameBase, table=True):
 
 Index("game_date_idx", Game.date)
 Index("game_game_number_removed_at_idx", Game.game_number, Game.removed_at, unique=True)
+Index("game_season_id_game_number_idx", Game.season_id, Game.game_number)
 
 
 ## Player models
@@ -113,10 +115,123 @@ class TimeSeries(SQLModel, table=True):
     delta: float
     win: bool
 
+    # Denormalized from the game for the rating lookups
+    season_id: int | None = Field(default=None, foreign_key="season.id")
+    game_number: int | None = None
+
     game: "Game" = Relationship(back_populates="timeseries")
     player: "Player" = Relationship(back_populates="timeseries")
 
 Index("timeseries_player_id_rating_idx", TimeSeries.player_id, TimeSeries.rating)
+Index(
+    "timeseries_season_id_player_id_game_number_idx",
+    TimeSeries.season_id,
+    TimeSeries.player_id,
+    col(TimeSeries.game_number).desc(),
+    postgresql_include=["rating"]
+)
+
+
+class GameRating(SQLModel, table=True):
+    game_id: int = Field(foreign_key="game.id", primary_key=True, ondelete="CASCADE")
+
+    yellow_offense_rating: float
+    yellow_offense_delta: float
+
+    yellow_defense_rating: float
+    yellow_defense_delta: float
+
+    black_offense_rating: float
+    black_offense_delta: float
+
+    black_defense_rating: float
+    black_defense_delta: float
+
+
+class PlayerSeasonRating(SQLModel, table=True):
+    season_id: int = Field(foreign_key="season.id", primary_key=True)
+    player_id: str = Field(foreign_key="player.id", primary_key=True)
+    rating: float
+    num_games: int
+    num_wins: int
+
+
+class DailyRating(SQLModel, table=True):
+    season_id: int = Field(foreign_key="season.id", primary_key=True)
+    date: datetime.datetime = Field(
+        sa_column=Column(DateTime(timezone=True), primary_key=True)
+    )
+    player_id: str = Field(foreign_key="player.id", primary_key=True)
+    rating: float
+
+
+# Games played and won in the season by a player at a position, with or
+# against another player
+class PlayerPairStats(SQLModel, table=True):
+    season_id: int = Field(foreign_key="season.id", primary_key=True)
+    player_id: str = Field(foreign_key="player.id", primary_key=True)
+    # "offense" or "defense"
+    position: str = Field(primary_key=True)
+    other_player_id: str = Field(foreign_key="player.id", primary_key=True)
+    # "partner" or "opponent"
+    relation: str = Field(primary_key=True)
+    num_games: int
+    num_wins: int
+
+
+class PairStatsPublic(SQLModel):
+    player_id: str
+    num_games: int
+    num_wins: int
+    win_rate: float
+
+
+class PositionStatsPublic(SQLModel):
+    position: str
+    num_games: int
+    num_wins: int
+    win_rate: float
+
+
+class PlayerMatchupsPublic(SQLModel):
+    player_id: str
+    positions: list[PositionStatsPublic]
+    # Sorted from best to worst win rate
+    partners: list[PairStatsPublic]
+    opponents: list[PairStatsPublic]
+
+
+class HeadToHeadPublic(SQLModel):
+    player_id: str
+    other_player_id: str
+    # Record of player_id against and alongside other_player_id
+    against: PairStatsPublic
+    together: PairStatsPublic
+
+
+class MatchPredictionPublic(SQLModel):
+    yellow_offense: str
+    yellow_defense: str
+    black_offense: str
+    black_defense: str
+    # Average ratings of the teams
+    yellow_rating: float
+    black_rating: float
+    yellow_win_probability: float
+    # Expected scores
+    yellow_score: float
+    black_score: float
+
+
+# Every rated player's season rating, game count and win count right after
+# the game, stored every few games of the season
+class RatingCheckpoint(SQLModel, table=True):
+    season_id: int = Field(foreign_key="season.id", primary_key=True)
+    game_id: int = Field(foreign_key="game.id", primary_key=True, ondelete="CASCADE")
+    player_id: str = Field(foreign_key="player.id", primary_key=True)
+    rating: float
+    num_games: int
+    num_wins: int
 
 
 class MinimalTimeSeriesPoint:
@@ -137,5 +252,14 @@ class Season(SQLModel, table=True):
     end_date: datetime.date
     rating_method: str
     active: bool
+    # Bumped whenever the season's games or ratings change
+    data_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # First game number whose ratings are stale while a background recompute
+    # is pending, and the earliest day whose end of day ratings are stale
+    ratings_stale_since: int | None = None
+    ratings_stale_since_date: datetime.datetime | None = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True)
+    )
 
     games: list["Game"] = Relationship(back_populates="season")
@@ -0,0 +1,146 @@
+from collections import Counter
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, col, delete, insert, select
+
+from foos.database import models
+
+
+PairStatsKey = tuple[int, str, str, str, str]
+
+
+def get_game_pair_stats(game: models.Game) -> dict[PairStatsKey, int]:
+    """
+    Get the (season_id, player_id, position, other_player_id, relation) keys
+    of the pair stats counted by the game, mapped to 1 if the player won it.
+    Each player gets one partner key and two opponent keys.
+    """
+    yellow_won = game.yellow_score > game.black_score
+    teams = [
+        (game.yellow_offense, game.yellow_defense, yellow_won),
+        (game.black_offense, game.black_defense, not yellow_won)
+    ]
+    keys: dict[PairStatsKey, int] = {}
+    for i, (offense, defense, won) in enumerate(teams):
+        other_offense, other_defense, _ = teams[1 - i]
+        for player_id, position, partner_id in [
+            (offense, "offense", defense),
+            (defense, "defense", offense)
+        ]:
+            keys[(game.season_id, player_id, position, partner_id, "partner")] = int(won)
+            for opponent_id in [other_offense, other_defense]:
+                keys[(game.season_id, player_id, position, opponent_id, "opponent")] = int(won)
+    return keys
+
+
+def get_pair_stats_rows(
+    num_games: Counter[PairStatsKey],
+    num_wins: Counter[PairStatsKey]
+) -> list[dict[str, int | str]]:
+    # Sorted so concurrent upserts lock the rows in the same order
+    return [
+        {
+            "season_id": season_id,
+            "player_id": player_id,
+            "position": position,
+            "other_player_id": other_player_id,
+            "relation": relation,
+            "num_games": key_num_games,
+            "num_wins": num_wins[(season_id, player_id, position, other_player_id, relation)]
+        }
+        for (season_id, player_id, position, other_player_id, relation), key_num_games
+        in sorted(num_games.items())
+    ]
+
+
+def update_pair_stats(session: Session, games: list[models.Game], sign: int = 1) -> None:
+    """
+    Count the games in the pair stats of their seasons, or uncount them if
+    sign is -1. Callers uncount a game before editing or deleting it and
+    count it again after editing it. The counts are changed in place with a
+    single upsert so concurrent writers don't overwrite each other.
+    Nothing is committed.
+    """
+    num_games: Counter[PairStatsKey] = Counter()
+    num_wins: Counter[PairStatsKey] = Counter()
+    for game in games:
+        if game.season_id is None:
+            continue
+        for key, won in get_game_pair_stats(game).items():
+            num_games[key] += sign
+            num_wins[key] += sign * won
+    if not num_games:
+        return
+
+    upsert = sqlite.insert if session.get_bind().dialect.name == "sqlite" else postgresql.insert
+    query = upsert(models.PlayerPairStats)
+    session.execute(
+        query.on_conflict_do_update(
+            index_elements=[
+                "season_id",
+                "player_id",
+                "position",
+                "other_player_id",
+                "relation"
+            ],
+            set_={
+                "num_games": models.PlayerPairStats.num_games + query.excluded.num_games,
+                "num_wins": models.PlayerPairStats.num_wins + query.excluded.num_wins
+            }
+        ),
+        get_pair_stats_rows(num_games, num_wins)
+    )
+    if sign < 0:
+        session.execute(
+            delete(models.PlayerPairStats)
+            .where(
+                col(models.PlayerPairStats.season_id).in_({key[0] for key in num_games}),
+                models.PlayerPairStats.num_games <= 0
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def backfill_pair_stats(session: Session) -> None:
+    """
+    Build the pair stats of every game if none exist yet.
+    """
+    if session.exec(select(models.PlayerPairStats).limit(1)).first():
+        return
+    num_games: Counter[PairStatsKey] = Counter()
+    num_wins: Counter[PairStatsKey] = Counter()
+    games = session.exec(
+        select(models.Game)
+        .where(col(models.Game.season_id).is_not(None))
+        .execution_options(yield_per=1000)
+    )
+    for game in games:
+        for key, won in get_game_pair_stats(game).items():
+            num_games[key] += 1
+            num_wins[key] += won
+    if num_games:
+        session.execute(insert(models.PlayerPairStats), get_pair_stats_rows(num_games, num_wins))
+    session.commit()
+
+
+def get_player_pair_stats(
+    session: Session,
+    season_id: int,
+    player_id: str,
+    other_player_id: str | None = None
+) -> list[models.PlayerPairStats]:
+    """
+    Get the player's pair stats in the season, at most four rows per other
+    player, read through the primary key. If other_player_id is given, only
+    get the ones with that player.
+    """
+    query = (
+        select(models.PlayerPairStats)
+        .where(
+            models.PlayerPairStats.season_id == season_id,
+            models.PlayerPairStats.player_id == player_id
+        )
+    )
+    if other_player_id is not None:
+        query = query.where(models.PlayerPairStats.other_player_id == other_player_id)
+    return list(session.exec(query).all())
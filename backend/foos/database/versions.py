@@ -0,0 +1,47 @@
+from sqlalchemy import event
+from sqlmodel import Session, col, update
+
+from foos.database import models
+
+
+# Session info key of the (previous, latest) data versions of the seasons
+# bumped in the session's current transaction
+BUMPED_DATA_VERSIONS_KEY = "bumped_data_versions"
+
+
+def bump_data_versions(session: Session, season_ids: list[int] | None = None) -> dict[int, int]:
+    """
+    Bump the data version of the given seasons, or of every season if
+    season_ids is None, and get their new data versions. The session keeps
+    each season's data version from before the transaction's first bump and
+    its latest one until `pop_bumped_data_versions`. Nothing is committed.
+    """
+    query = (
+        update(models.Season)
+        .values(data_version=models.Season.data_version + 1)
+        .returning(models.Season.id, models.Season.data_version)
+        .execution_options(synchronize_session=False)
+    )
+    if season_ids is not None:
+        query = query.where(col(models.Season.id).in_(season_ids))
+    season_id_to_data_version: dict[int, int] = dict(session.execute(query).all())
+
+    bumped_data_versions = session.info.setdefault(BUMPED_DATA_VERSIONS_KEY, {})
+    for season_id, data_version in season_id_to_data_version.items():
+        prev_data_version, _ = bumped_data_versions.get(season_id, (data_version - 1, None))
+        bumped_data_versions[season_id] = (prev_data_version, data_version)
+    return season_id_to_data_version
+
+
+def pop_bumped_data_versions(session: Session) -> dict[int, tuple[int, int]]:
+    """
+    Get the (previous, latest) data versions of the seasons bumped in the
+    session's last transaction and forget them. Must be called after the
+    commit.
+    """
+    return session.info.pop(BUMPED_DATA_VERSIONS_KEY, {})
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bumped_data_versions(session: Session):
+    session.info.pop(BUMPED_DATA_VERSIONS_KEY, None)
@@ -0,0 +1,268 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import sys
+import threading
+import time
+from typing import Any, Iterator
+
+from sqlalchemy import Engine, event
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_PROFILE_INTERVAL_SECONDS = 0.005
+
+
+class RequestStats:
+    """
+    Time spent by a single request, filled in by the SQLAlchemy event hooks
+    and `timed` blocks running in the request's context.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.db_seconds = 0.0
+        self.num_statements = 0
+        self.timings: defaultdict[str, float] = defaultdict(float)
+        # Thread the request started on, and the number of the request's
+        # statements and `timed` blocks running on each thread. Pool threads
+        # go on to run other requests' code, so they are only sampled by the
+        # profiler while running the request's.
+        self.thread_id = threading.get_ident()
+        self._num_running: Counter[int] = Counter()
+
+    def start_running(self):
+        with self._lock:
+            self._num_running[threading.get_ident()] += 1
+
+    def stop_running(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._num_running[thread_id] -= 1
+            if self._num_running[thread_id] <= 0:
+                del self._num_running[thread_id]
+
+    def record_statement(self, seconds: float):
+        with self._lock:
+            self.db_seconds += seconds
+            self.num_statements += 1
+
+    def record_timing(self, name: str, seconds: float):
+        with self._lock:
+            self.timings[name] += seconds
+
+    def get_thread_ids(self) -> set[int]:
+        """
+        Get the threads currently running the request's code.
+        """
+        with self._lock:
+            return {self.thread_id, *self._num_running}
+
+    def server_timing(self, total_seconds: float) -> str:
+        """
+        Format the stats as a Server-Timing header value, in milliseconds.
+        """
+        metrics = [
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.num_statements} statements"'
+        ]
+        metrics += [
+            f"{name};dur={seconds * 1000:.1f}"
+            for name, seconds in self.timings.items()
+        ]
+        metrics.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def start_request() -> RequestStats:
+    """
+    Start collecting stats for the current request. Threads and tasks spawned
+    from the current context afterwards report into the same stats.
+    """
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """
+    Add the time spent in the block to the current request's `name` timing.
+    Does nothing outside of a request.
+    """
+    stats = _request_stats.get()
+    if stats is None:
+        yield
+        return
+    stats.start_running()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.record_timing(name, time.perf_counter() - start)
+        stats.stop_running()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.start_running()
+    conn.info.setdefault("statement_start_times", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["statement_start_times"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record_statement(time.perf_counter() - start)
+        stats.stop_running()
+
+
+def instrument_engine(engine: Engine):
+    """
+    Count the statements of every request and time them on the given engine.
+    Async engines are instrumented through their `sync_engine`.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RequestMetrics:
+    """
+    Thread-safe running totals of the request stats per route, rendered in the
+    Prometheus text exposition format.
+    """
+    def __init__(self, buckets: tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._num_requests: Counter[tuple[str, str, int]] = Counter()
+        self._bucket_counts: defaultdict[tuple[str, str], list[int]] = defaultdict(
+            lambda: [0] * len(self.buckets)
+        )
+        self._num_observations: Counter[tuple[str, str]] = Counter()
+        self._seconds: Counter[tuple[str, str]] = Counter()
+        self._db_seconds: Counter[tuple[str, str]] = Counter()
+        self._num_statements: Counter[tuple[str, str]] = Counter()
+        self._timings: Counter[tuple[str, str, str]] = Counter()
+
+    def record(self, method: str, route: str, status_code: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            self._num_requests[(method, route, status_code)] += 1
+            bucket_counts = self._bucket_counts[key]
+            for i, bucket in enumerate(self.buckets):
+                if seconds <= bucket:
+                    bucket_counts[i] += 1
+            self._num_observations[key] += 1
+            self._seconds[key] += seconds
+            self._db_seconds[key] += stats.db_seconds
+            self._num_statements[key] += stats.num_statements
+            for name, timing_seconds in stats.timings.items():
+                self._timings[(method, route, name)] += timing_seconds
+
+    def render(self, extra_metrics: list[tuple[str, str, float]] | None = None) -> str:
+        """
+        Render every metric, plus the given extra (name, type, value) metrics,
+        in the Prometheus text format.
+        """
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP foos_http_requests_total Requests handled.",
+                "# TYPE foos_http_requests_total counter"
+            ]
+            for (method, route, status_code), count in sorted(self._num_requests.items()):
+                lines.append(
+                    f"foos_http_requests_total{_labels(method=method, route=route, status=status_code)} {count}"
+                )
+
+            lines += [
+                "# HELP foos_http_request_duration_seconds Request wall time.",
+                "# TYPE foos_http_request_duration_seconds histogram"
+            ]
+            for (method, route), bucket_counts in sorted(self._bucket_counts.items()):
+                for bucket, count in zip(self.buckets, bucket_counts):
+                    labels = _labels(method=method, route=route, le=bucket)
+                    lines.append(f"foos_http_request_duration_seconds_bucket{labels} {count}")
+                labels = _labels(method=method, route=route, le="+Inf")
+                lines.append(
+                    f"foos_http_request_duration_seconds_bucket{labels} {self._num_observations[(method, route)]}"
+                )
+                labels = _labels(method=method, route=route)
+                lines.append(f"foos_http_request_duration_seconds_sum{labels} {self._seconds[(method, route)]}")
+                lines.append(
+                    f"foos_http_request_duration_seconds_count{labels} {self._num_observations[(method, route)]}"
+                )
+
+            for name, help_text, values in [
+                ("foos_db_seconds_total", "Time spent executing SQL statements.", self._db_seconds),
+                ("foos_db_statements_total", "SQL statements executed.", self._num_statements)
+            ]:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (method, route), value in sorted(values.items()):
+                    lines.append(f"{name}{_labels(method=method, route=route)} {value}")
+
+            lines += [
+                "# HELP foos_timing_seconds_total Time spent in instrumented blocks, e.g. the rating replay.",
+                "# TYPE foos_timing_seconds_total counter"
+            ]
+            for (method, route, name), value in sorted(self._timings.items()):
+                lines.append(f"foos_timing_seconds_total{_labels(method=method, route=route, name=name)} {value}")
+
+        for name, metric_type, value in extra_metrics or []:
+            lines += [f"# TYPE {name} {metric_type}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in labels.items()
+    ) + "}"
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of a request's threads in a background thread and
+    counts them as folded stacks, the input format of flamegraph.pl and
+    speedscope. Besides the thread the request started on, pool threads are
+    only sampled while they run the request's statements and `timed` blocks.
+    """
+    def __init__(self, stats: RequestStats, interval: float = DEFAULT_PROFILE_INTERVAL_SECONDS):
+        self.stats = stats
+        self.interval = interval
+        self.folded_stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.stats.get_thread_ids():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    self.folded_stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.folded_stacks.most_common():
+                f.write(f"{stack} {count}\n")
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import Session, select
+
+from foos.database import models
+
+
+DEFAULT_MAX_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    A client's queue of (data version, serialized event) pairs for a season.
+    Events are put from any thread through the subscriber's event loop. A
+    client too slow to keep up is flagged as overflowed instead of buffering
+    without bound, and should refetch everything.
+    """
+    def __init__(self, season_id: int, loop: asyncio.AbstractEventLoop, max_queue_size: int):
+        self.season_id = season_id
+        self.loop = loop
+        self.queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue(max_queue_size)
+        self.overflowed = False
+
+    def put(self, data_version: int, data: str):
+        self.loop.call_soon_threadsafe(self._put, data_version, data)
+
+    def _put(self, data_version: int, data: str):
+        if self.queue.full():
+            self.overflowed = True
+        else:
+            self.queue.put_nowait((data_version, data))
+
+
+class LiveUpdates:
+    """
+    In-process broadcaster of per-season change events.
+
+    Writers publish after committing. Each event carries the players whose
+    season rating changed since the previous event, diffed against the last
+    ratings sent for the season, so publishing costs one read of the season's
+    materialized ratings and nothing at all without subscribers.
+    """
+    def __init__(self, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscriptions: dict[int, set[Subscription]] = {}
+        self._ratings: dict[int, dict[str, float]] = {}
+
+    def subscribe(self, season_id: int, player_id_to_rating: dict[str, float]) -> Subscription:
+        """
+        Subscribe to the season's events from the running event loop.
+        player_id_to_rating is the season's current ratings, used as the
+        baseline of the first diff if nobody else is subscribed.
+        """
+        subscription = Subscription(season_id, asyncio.get_running_loop(), self.max_queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(season_id, set()).add(subscription)
+            self._ratings.setdefault(season_id, player_id_to_rating)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.season_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.season_id, None)
+                self._ratings.pop(subscription.season_id, None)
+
+    def has_subscribers(self, season_id: int) -> bool:
+        with self._lock:
+            return bool(self._subscriptions.get(season_id))
+
+    def publish(self, session: Session, season_id: int, event: dict[str, Any]):
+        """
+        Send the event to the season's subscribers along with the season's
+        data version and the players whose rating changed. Must be called
+        after the change is committed.
+        """
+        if not self.has_subscribers(season_id):
+            return
+        data_version = session.exec(
+            select(models.Season.data_version)
+            .where(models.Season.id == season_id)
+        ).first() or 0
+        player_id_to_rating: dict[str, float] = dict(session.exec(
+            select(models.PlayerSeasonRating.player_id, models.PlayerSeasonRating.rating)
+            .where(models.PlayerSeasonRating.season_id == season_id)
+        ).all())
+
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(season_id, set()))
+            prev_player_id_to_rating = self._ratings.get(season_id, {})
+            self._ratings[season_id] = player_id_to_rating
+        players = [
+            {
+                "id": player_id,
+                "rating": round(player_rating),
+                "delta": round(player_rating - prev_player_id_to_rating[player_id])
+                if player_id in prev_player_id_to_rating else None
+            }
+            for player_id, player_rating in player_id_to_rating.items()
+            if prev_player_id_to_rating.get(player_id) != player_rating
+        ]
+        data = json.dumps(jsonable_encoder({
+            **event,
+            "season_id": season_id,
+            "data_version": data_version,
+            "players": players
+        }))
+        for subscription in subscriptions:
+            subscription.put(data_version, data)
@@ -1,13 +1,29 @@
 import datetime
+from collections import Counter
+from typing import Any
 
-from sqlmodel import Integer, Session, cast, col, desc, func, join, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Integer, Session, cast, col, delete, desc, func, insert, select, update
 from sqlalchemy import Select
+from sqlalchemy.orm import aliased
 
+from foos import instrumentation
 from foos.database import models
-from foos.rating import delta
+from foos.database.versions import bump_data_versions
+from foos.rating.cache import RatingCache
+from foos.rating.checkpoints import (
+    CHECKPOINT_INTERVAL,
+    backfill_rating_checkpoints,
+    get_checkpoint_player_stats,
+    get_checkpoint_stats,
+    get_games_timeseries_query,
+    update_rating_checkpoints
+)
+from foos.rating.methods import get_rating_method
+from foos.rating.replay import BASE_RATING, replay_games
 
 
-BASE_RATING = 500.0
+rating_cache = RatingCache()
 
 
 class Team:
@@ -38,22 +54,33 @@ def get_ratings_query(
 ) -> Select[tuple[str, float]]:
     """
     Get the ratings query for the given season, date, and game number.
+    Each player's latest rating is picked by game number, which the
+    (season_id, player_id, game_number DESC) timeseries index serves directly.
+    A date bounds the game numbers at the season's last game on or before it,
+    so the timeseries is never joined with the games.
     """
     query = (
         select(models.TimeSeries.player_id, models.TimeSeries.rating)
-        .join(models.Game)
-        .where(models.Game.season_id == season_id)
+        .where(models.TimeSeries.season_id == season_id)
         .order_by(
             models.TimeSeries.player_id,
-            desc(models.Game.date),
-            desc(models.Game.game_number)
+            desc(models.TimeSeries.game_number)
         )
         .prefix_with(f"DISTINCT ON ({models.TimeSeries.player_id})")
     )
     if date:
-        query = query.where(models.Game.date <= date)
+        query = query.where(
+            models.TimeSeries.game_number <= (
+                select(func.max(models.Game.game_number))
+                .where(
+                    models.Game.season_id == season_id,
+                    models.Game.date <= date
+                )
+                .scalar_subquery()
+            )
+        )
     if game_number:
-        query = query.where(models.Game.game_number <= game_number)
+        query = query.where(models.TimeSeries.game_number <= game_number)
     return query
 
 
@@ -70,11 +97,22 @@ def get_player_ratings(
     If player_ids is None, get the ratings for all players.
     If date is None, get the ratings for the latest game.
     If game_number is None, get the ratings for the latest game.
+    Lookups without a date are served from the rating cache, which orders
+    games by game number only.
     """
-    ratings_query = get_ratings_query(season_id, date, game_number)
-    if player_ids:
-        ratings_query = ratings_query.where(col(models.TimeSeries.player_id).in_(player_ids))
-    player_id_to_rating: dict[str, float] = dict(session.exec(ratings_query).all())
+    if date is None:
+        player_id_to_rating = rating_cache.get_player_ratings(session, season_id, game_number)
+        if player_ids:
+            player_id_to_rating = {
+                player_id: player_id_to_rating[player_id]
+                for player_id in player_ids
+                if player_id in player_id_to_rating
+            }
+    else:
+        ratings_query = get_ratings_query(season_id, date, game_number)
+        if player_ids:
+            ratings_query = ratings_query.where(col(models.TimeSeries.player_id).in_(player_ids))
+        player_id_to_rating = dict(session.exec(ratings_query).all())
     if player_ids:
         for player_id in player_ids:
             if player_id not in player_id_to_rating:
@@ -83,45 +121,380 @@ def get_player_ratings(
 
 
 def get_player_stats(session: Session, season_id: int) -> dict[models.Player, PlayerStats]:
+    stats_query = (
+        select(models.Player, models.PlayerSeasonRating)
+        .join(models.PlayerSeasonRating)
+        .where(models.PlayerSeasonRating.season_id == season_id)
+        .order_by(models.Player.name)
+    )
+    stats = {
+        player: PlayerStats(season_rating.num_games, season_rating.num_wins, season_rating.rating)
+        for player, season_rating in session.exec(stats_query).all()
+    }
+    return stats
+
+
+def update_player_season_ratings(
+    session: Session,
+    season_id: int,
+    player_id_to_rating: dict[str, float] | None = None
+) -> None:
+    """
+    Rebuild the season's materialized player ratings, game counts and win
+    counts. If player_id_to_rating is None, the latest ratings are looked up.
+    Nothing is committed.
+    """
+    if player_id_to_rating is None:
+        player_id_to_rating = get_player_ratings(session, season_id)
     stats_query = (
         select(
             models.TimeSeries.player_id,
-            func.count(models.TimeSeries.game_id).label("game_count"),
-            func.sum(cast(models.TimeSeries.win, Integer)).label("win_count")
-        )
-        .join(models.Game)
-        .where(
-            models.Game.season_id == season_id
+            func.count(models.TimeSeries.game_id),
+            func.sum(cast(models.TimeSeries.win, Integer))
         )
+        .where(models.TimeSeries.season_id == season_id)
         .group_by(models.TimeSeries.player_id)
-    ).subquery("stats")
-    ratings_query = get_ratings_query(season_id).subquery("ratings")
+    )
+    season_rating_rows = [
+        {
+            "season_id": season_id,
+            "player_id": player_id,
+            "rating": player_id_to_rating.get(player_id, BASE_RATING),
+            "num_games": num_games,
+            "num_wins": num_wins or 0
+        }
+        for player_id, num_games, num_wins in session.exec(stats_query).all()
+    ]
+    session.execute(
+        delete(models.PlayerSeasonRating)
+        .where(models.PlayerSeasonRating.season_id == season_id)
+        .execution_options(synchronize_session=False)
+    )
+    if season_rating_rows:
+        session.execute(insert(models.PlayerSeasonRating), season_rating_rows)
 
-    full_query = (
-        select(
-            models.Player,
-            stats_query.c.game_count,
-            stats_query.c.win_count,
-            ratings_query.c.rating
-        )
-        .select_from(
-            join(
-                models.Player,
-                stats_query,
-                models.Player.id == stats_query.c.player_id
+
+def add_player_season_ratings(
+    session: Session,
+    season_id: int,
+    timeseries_rows: list[dict[str, Any]]
+) -> None:
+    """
+    Count newly appended games, given as timeseries rows in game number
+    order, in the season's materialized player ratings. Only the rows of the
+    games' players are upserted, with their latest rating and their game and
+    win counts incremented in place. Nothing is committed.
+    """
+    player_id_to_rating: dict[str, float] = {}
+    num_games: Counter[str] = Counter()
+    num_wins: Counter[str] = Counter()
+    for row in timeseries_rows:
+        player_id_to_rating[row["player_id"]] = row["rating"]
+        num_games[row["player_id"]] += 1
+        num_wins[row["player_id"]] += int(row["win"])
+    if not num_games:
+        return
+
+    upsert = sqlite.insert if session.get_bind().dialect.name == "sqlite" else postgresql.insert
+    query = upsert(models.PlayerSeasonRating)
+    session.execute(
+        query.on_conflict_do_update(
+            index_elements=["season_id", "player_id"],
+            set_={
+                "rating": query.excluded.rating,
+                "num_games": models.PlayerSeasonRating.num_games + query.excluded.num_games,
+                "num_wins": models.PlayerSeasonRating.num_wins + query.excluded.num_wins
+            }
+        ),
+        # Sorted so concurrent upserts lock the rows in the same order
+        [
+            {
+                "season_id": season_id,
+                "player_id": player_id,
+                "rating": player_id_to_rating[player_id],
+                "num_games": num_games[player_id],
+                "num_wins": num_wins[player_id]
+            }
+            for player_id in sorted(num_games)
+        ]
+    )
+
+
+def replace_player_season_ratings(
+    session: Session,
+    season_id: int,
+    game_number: int,
+    timeseries_rows: list[dict[str, Any]]
+) -> None:
+    """
+    Update the season's materialized player ratings after its games from
+    game_number onward were replayed into the given timeseries rows, in game
+    number order. Each player's stats before game_number are rebuilt from the
+    rating checkpoints and the replayed games are counted on top of them.
+    Only the rows that changed are upserted, and the rows of players left
+    without a game in the season are deleted. Nothing is committed.
+    """
+    _, player_id_to_stats = get_checkpoint_player_stats(session, season_id, game_number - 1)
+    for row in timeseries_rows:
+        _, num_games, num_wins = player_id_to_stats.get(row["player_id"], (BASE_RATING, 0, 0))
+        player_id_to_stats[row["player_id"]] = (row["rating"], num_games + 1, num_wins + int(row["win"]))
+
+    prev_player_id_to_stats = {
+        player_id: (player_rating, num_games, num_wins)
+        for player_id, player_rating, num_games, num_wins in session.exec(
+            select(
+                models.PlayerSeasonRating.player_id,
+                models.PlayerSeasonRating.rating,
+                models.PlayerSeasonRating.num_games,
+                models.PlayerSeasonRating.num_wins
             )
-            .join(
-                ratings_query,
-                models.Player.id == ratings_query.c.player_id
+            .where(models.PlayerSeasonRating.season_id == season_id)
+        ).all()
+    }
+    removed_player_ids = prev_player_id_to_stats.keys() - player_id_to_stats.keys()
+    if removed_player_ids:
+        session.execute(
+            delete(models.PlayerSeasonRating)
+            .where(
+                models.PlayerSeasonRating.season_id == season_id,
+                col(models.PlayerSeasonRating.player_id).in_(removed_player_ids)
             )
+            .execution_options(synchronize_session=False)
         )
-        .order_by(models.Player.name)
+    # Sorted so concurrent upserts lock the rows in the same order
+    season_rating_rows = [
+        {
+            "season_id": season_id,
+            "player_id": player_id,
+            "rating": player_rating,
+            "num_games": num_games,
+            "num_wins": num_wins
+        }
+        for player_id, (player_rating, num_games, num_wins) in sorted(player_id_to_stats.items())
+        if prev_player_id_to_stats.get(player_id) != (player_rating, num_games, num_wins)
+    ]
+    if not season_rating_rows:
+        return
+
+    upsert = sqlite.insert if session.get_bind().dialect.name == "sqlite" else postgresql.insert
+    query = upsert(models.PlayerSeasonRating)
+    session.execute(
+        query.on_conflict_do_update(
+            index_elements=["season_id", "player_id"],
+            set_={
+                "rating": query.excluded.rating,
+                "num_games": query.excluded.num_games,
+                "num_wins": query.excluded.num_wins
+            }
+        ),
+        season_rating_rows
     )
-    stats = {
-        player: PlayerStats(num_games, num_wins, rating)
-        for player, num_games, num_wins, rating in session.exec(full_query).all()
+
+
+def backfill_player_season_ratings(session: Session) -> None:
+    """
+    Build the materialized player ratings of every season if none exist yet.
+    """
+    if session.exec(select(models.PlayerSeasonRating).limit(1)).first():
+        return
+    for season_id in session.exec(select(models.Season.id)).all():
+        update_player_season_ratings(session, season_id)
+    session.commit()
+
+
+def update_daily_ratings(
+    session: Session,
+    season_id: int,
+    date: datetime.datetime | None = None
+) -> None:
+    """
+    Rebuild the season's end-of-day player ratings for every day from date
+    onward. If date is None, rebuild every day. A player's end-of-day rating
+    is the rating after their highest numbered game of that day.
+    Nothing is committed.
+    """
+    query = (
+        select(
+            models.Game.date,
+            models.TimeSeries.player_id,
+            models.TimeSeries.rating
+        )
+        .join(models.Game)
+        .where(models.TimeSeries.season_id == season_id)
+        .order_by(models.TimeSeries.game_number)
+    )
+    stale_query = (
+        delete(models.DailyRating)
+        .where(models.DailyRating.season_id == season_id)
+        .execution_options(synchronize_session=False)
+    )
+    if date is not None:
+        query = query.where(models.Game.date >= date)
+        stale_query = stale_query.where(models.DailyRating.date >= date)
+
+    date_player_id_to_rating: dict[tuple[datetime.datetime, str], float] = {}
+    for game_date, player_id, player_rating in session.exec(query):
+        date_player_id_to_rating[(game_date, player_id)] = player_rating
+    session.execute(stale_query)
+    if date_player_id_to_rating:
+        session.execute(
+            insert(models.DailyRating),
+            [
+                {
+                    "season_id": season_id,
+                    "date": game_date,
+                    "player_id": player_id,
+                    "rating": player_rating
+                }
+                for (game_date, player_id), player_rating in date_player_id_to_rating.items()
+            ]
+        )
+
+
+def backfill_daily_ratings(session: Session) -> None:
+    """
+    Build the end-of-day player ratings of every season if none exist yet.
+    """
+    if session.exec(select(models.DailyRating).limit(1)).first():
+        return
+    for season_id in session.exec(select(models.Season.id)).all():
+        update_daily_ratings(session, season_id)
+    session.commit()
+
+
+def get_player_stats_as_of(
+    session: Session,
+    season_id: int,
+    *,
+    game_number: int | None = None,
+    date: datetime.datetime | None = None
+) -> dict[models.Player, PlayerStats]:
+    """
+    Get each player's season stats right after the given game number and the
+    last game on or before the given date, whichever comes first.
+    The stats are rebuilt from the latest rating checkpoint before then plus
+    the timeseries points of at most CHECKPOINT_INTERVAL games, so lookups
+    cost the same anywhere in the season.
+    """
+    if date is not None:
+        date_game_number = session.exec(
+            select(func.max(models.Game.game_number))
+            .where(
+                models.Game.season_id == season_id,
+                models.Game.date <= date
+            )
+        ).one()
+        if date_game_number is None:
+            return {}
+        if game_number is None or date_game_number < game_number:
+            game_number = date_game_number
+
+    checkpoint_game_number, player_id_to_stats = get_checkpoint_stats(session, season_id, game_number)
+    for _, _, player_id, player_rating, win in session.exec(
+        get_games_timeseries_query(season_id, checkpoint_game_number, game_number)
+    ):
+        _, num_games, num_wins = player_id_to_stats.get(player_id, (BASE_RATING, 0, 0))
+        player_id_to_stats[player_id] = (player_rating, num_games + 1, num_wins + win)
+    if not player_id_to_stats:
+        return {}
+
+    players = session.exec(
+        select(models.Player)
+        .where(col(models.Player.id).in_(player_id_to_stats))
+        .order_by(models.Player.name)
+    ).all()
+    return {
+        player: PlayerStats(
+            player_id_to_stats[player.id][1],
+            player_id_to_stats[player.id][2],
+            player_id_to_stats[player.id][0]
+        )
+        for player in players
     }
-    return stats
+
+
+def get_game_ratings_query(season_id: int | None = None) -> Select:
+    """
+    Get the query of each game's post-game ratings and deltas, joined from
+    the timeseries, for every game or only the given season's games.
+    """
+    # Create aliases for the TimeSeries table for each player position
+    tyo = aliased(models.TimeSeries)
+    tyd = aliased(models.TimeSeries)
+    tbo = aliased(models.TimeSeries)
+    tbd = aliased(models.TimeSeries)
+
+    query = (
+        select(
+            models.Game.id,
+            tyo.rating,
+            tyo.delta,
+            tyd.rating,
+            tyd.delta,
+            tbo.rating,
+            tbo.delta,
+            tbd.rating,
+            tbd.delta
+        )
+        .join(
+            tyo,
+            (models.Game.id == tyo.game_id) &
+            (models.Game.yellow_offense == tyo.player_id)
+        )
+        .join(
+            tyd,
+            (models.Game.id == tyd.game_id) &
+            (models.Game.yellow_defense == tyd.player_id)
+        )
+        .join(
+            tbo,
+            (models.Game.id == tbo.game_id) &
+            (models.Game.black_offense == tbo.player_id)
+        )
+        .join(
+            tbd,
+            (models.Game.id == tbd.game_id) &
+            (models.Game.black_defense == tbd.player_id)
+        )
+    )
+    if season_id is not None:
+        query = query.where(models.Game.season_id == season_id)
+    return query
+
+
+def insert_game_ratings(session: Session, season_id: int | None = None) -> None:
+    """
+    Insert the per-game ratings of every game, or of the given season's
+    games, from the timeseries with a single INSERT ... SELECT.
+    Nothing is committed.
+    """
+    session.execute(
+        insert(models.GameRating).from_select(
+            [
+                "game_id",
+                "yellow_offense_rating",
+                "yellow_offense_delta",
+                "yellow_defense_rating",
+                "yellow_defense_delta",
+                "black_offense_rating",
+                "black_offense_delta",
+                "black_defense_rating",
+                "black_defense_delta"
+            ],
+            get_game_ratings_query(season_id)
+        )
+    )
+
+
+def backfill_game_ratings(session: Session) -> None:
+    """
+    Build the per-game ratings of every game from the timeseries if none exist
+    yet.
+    """
+    if session.exec(select(models.GameRating).limit(1)).first():
+        return
+    insert_game_ratings(session)
+    session.commit()
 
 
 def update_ratings(
@@ -155,22 +528,11 @@ def update_ratings(
     rating_diff = win_team_rating - lose_team_rating
     actual_score_diff = win_team.score - lose_team.score
 
-    if method == "min_scaled_flat_score":
-        d = delta.min_scaled_flat_score(
-            actual_score_diff=actual_score_diff,
-            rating_diff=rating_diff,
-            win_score=win_team.score
-        )
-    elif method == "sigmoid_differential":
-        d = delta.sigmoid_differential(
-            actual_score_diff=actual_score_diff,
-            rating_diff=rating_diff,
-            win_score=win_team.score
-        )
-    elif method == "square_differential":
-        d = delta.square_differential(actual_score_diff=actual_score_diff)
-    else:
-        raise ValueError(f"Unknown rating method: {method}")
+    d = get_rating_method(method).delta_function(
+        actual_score_diff,
+        rating_diff,
+        win_team.score
+    )
 
     player_id_to_rating[win_team.offense] += d
     player_id_to_rating[win_team.defense] += d
@@ -180,41 +542,102 @@ def update_ratings(
     return player_id_to_rating
 
 
-def calculate_timeseries_points(
-    games: list[models.Game],
-    player_id_to_rating: dict[str, float],
-    method: str
-) -> list[models.TimeSeries]:
-    """
-    Calculate the timeseries points for the given games and player ratings.
-    """
-    timeseries_points = []
-    for game in games:
-        # Extract player IDs from the current game
-        game_player_ids = [
-            game.yellow_offense,
-            game.yellow_defense,
-            game.black_offense,
-            game.black_defense
-        ]
-        # Backfill new players
-        for player_id in game_player_ids:
-            if player_id not in player_id_to_rating:
-                player_id_to_rating[player_id] = BASE_RATING
-        # Take subset of ratings for players in this game
-        game_player_id_to_rating = {
-            player_id: player_id_to_rating[player_id]
-            for player_id in game_player_ids
-        }
-        player_id_to_updated_rating = update_ratings(game, game_player_id_to_rating, method)
-        for player_id, updated_rating in player_id_to_updated_rating.items():
-            db_timeseries_point = models.TimeSeries(
-                game_id=game.id,
-                player_id=player_id,
-                rating=updated_rating,
-                delta=updated_rating - player_id_to_rating[player_id],
-                win=updated_rating > player_id_to_rating[player_id]
-            )
-            timeseries_points.append(db_timeseries_point)
-        player_id_to_rating.update(player_id_to_updated_rating)
-    return timeseries_points
+def bump_data_version(session: Session, season_id: int | None = None) -> dict[int, int]:
+    """
+    Bump the data version of the given season, or of every season if
+    season_id is None, and get the new data version of each bumped season.
+    Nothing is committed.
+    """
+    return bump_data_versions(session, None if season_id is None else [season_id])
+
+
+def recalculate_timeseries_points(
+    session: Session,
+    season: models.Season,
+    game_number: int,
+    *,
+    since_date: datetime.datetime | None = None,
+    appended: bool = False
+) -> list[models.Game]:
+    """
+    Replace the timeseries points of the season's games from game_number onward
+    by replaying them from the ratings just before game_number.
+    The snapshot ratings are read before the stale points are removed, so the
+    rating cache can serve them.
+    Stale rows are removed with bulk DELETEs, the new timeseries points and
+    per-game ratings are written with bulk INSERTs, and the season's
+    materialized player ratings are updated by counting the replayed games on
+    top of the stats before game_number. If appended is set, every game from
+    game_number onward is new, so their players' counts are incremented in
+    place instead.
+    The end-of-day ratings are rebuilt from the earliest day among the
+    replayed games and since_date, which callers set to a date a game was
+    moved away from or removed from, and the rating checkpoints from
+    game_number onward. Finally the season's data version is bumped.
+    Nothing is committed so the caller can keep the whole mutation in a
+    single transaction.
+    The season's row is locked first so rating writes to a season, including
+    whole-season re-rates, run one at a time and see each other's ratings
+    and rating method.
+    Returns the replayed games in game number order.
+    """
+    session.refresh(season, with_for_update=True)
+    player_id_to_snapshot_rating = get_player_ratings(
+        session,
+        season.id,
+        game_number=game_number - 1
+    )
+
+    stale_game_ids = (
+        select(models.Game.id)
+        .where(
+            models.Game.season_id == season.id,
+            models.Game.game_number >= game_number
+        )
+    )
+    session.execute(
+        delete(models.TimeSeries)
+        .where(
+            models.TimeSeries.season_id == season.id,
+            models.TimeSeries.game_number >= game_number
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        delete(models.GameRating)
+        .where(col(models.GameRating.game_id).in_(stale_game_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    affected_games = session.exec(
+        select(models.Game)
+        .where(
+            models.Game.season_id == season.id,
+            models.Game.game_number >= game_number
+        )
+        .order_by(models.Game.game_number)
+    ).all()
+    with instrumentation.timed("replay"):
+        result = replay_games(
+            list(affected_games),
+            player_id_to_snapshot_rating,
+            season.rating_method
+        )
+    timeseries_rows = result.to_timeseries_rows()
+    if timeseries_rows:
+        session.execute(insert(models.TimeSeries), timeseries_rows)
+        session.execute(insert(models.GameRating), result.to_game_rating_rows())
+    if appended:
+        add_player_season_ratings(session, season.id, timeseries_rows)
+    else:
+        replace_player_season_ratings(session, season.id, game_number, timeseries_rows)
+    update_rating_checkpoints(session, season.id, game_number)
+
+    affected_dates = [game.date for game in affected_games]
+    if since_date is not None:
+        affected_dates.append(since_date)
+    if affected_dates:
+        update_daily_ratings(session, season.id, min(affected_dates))
+
+    bump_data_version(session, season.id)
+    return list(affected_games)
@@ -0,0 +1,123 @@
+import threading
+
+from sqlmodel import Session, select
+
+from foos.database import models
+from foos.database.versions import pop_bumped_data_versions
+from foos.rating.checkpoints import get_checkpoint_ratings, get_games_timeseries_query
+
+
+class SeasonRatingState:
+    """
+    Every player's latest rating in a season, valid for the season's
+    `data_version`. `game_number` is the number of the last game applied,
+    None until the ratings are first loaded, and `complete` is unset while
+    games appended since then are not applied yet. `lock` serializes the
+    loads of the season's ratings.
+    """
+    def __init__(self, data_version: int):
+        self.data_version = data_version
+        self.lock = threading.Lock()
+        self.latest: dict[str, float] = {}
+        self.game_number: int | None = None
+        self.complete = False
+
+    def reset(self):
+        self.latest = {}
+        self.game_number = None
+        self.complete = False
+
+
+class RatingCache:
+    """
+    In-process store of every season's latest ratings.
+
+    A season's latest ratings are loaded once from its stored rating
+    checkpoints, the only checkpoints kept, and then extended as games get
+    appended. Ratings as of an earlier game are rebuilt from the checkpoints
+    too. Every write bumps the season's data version, so a season is
+    reloaded when its data version changed, including after writes made by
+    other processes. Writers call `invalidate` with the first game number
+    they changed so seasons whose loaded games are untouched only load the
+    new games.
+
+    The process-wide lock only guards the dict of seasons. Database reads run
+    outside of it, under the lock of the season being loaded.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seasons: dict[int, SeasonRatingState] = {}
+
+    def get_player_ratings(
+        self,
+        session: Session,
+        season_id: int,
+        game_number: int | None = None
+    ) -> dict[str, float]:
+        """
+        Get every rated player's rating in the season after the given game
+        number. If game_number is None, get the ratings after the latest game.
+        """
+        data_version = session.exec(
+            select(models.Season.data_version)
+            .where(models.Season.id == season_id)
+        ).first() or 0
+        with self._lock:
+            state = self._seasons.get(season_id)
+            if state is None or state.data_version != data_version:
+                state = SeasonRatingState(data_version)
+                self._seasons[season_id] = state
+        with state.lock:
+            if not state.complete:
+                self._load(session, season_id, state)
+            if game_number is None or game_number >= state.game_number:
+                return dict(state.latest)
+        _, player_id_to_rating = get_checkpoint_ratings(session, season_id, game_number)
+        return player_id_to_rating
+
+    def invalidate(self, session: Session, game_number: int):
+        """
+        Drop the cached ratings of seasons with a loaded game from
+        game_number onward. Game numbers are shared across seasons, so every
+        season is checked. A season is only carried over to its new data
+        version if nothing but the session's own committed transaction
+        changed it, i.e. its data version went from the cached one straight
+        to the one bumped in the transaction, otherwise it is reloaded.
+        Must be called after the change is committed.
+        """
+        bumped_data_versions = pop_bumped_data_versions(session)
+        season_id_to_data_version = dict(session.exec(
+            select(models.Season.id, models.Season.data_version)
+        ).all())
+        with self._lock:
+            states = list(self._seasons.items())
+        for season_id, state in states:
+            data_version = season_id_to_data_version.get(season_id, 0)
+            prev_data_version, bumped_data_version = bumped_data_versions.get(
+                season_id,
+                (state.data_version, state.data_version)
+            )
+            with state.lock:
+                if (
+                    state.data_version != prev_data_version
+                    or data_version != bumped_data_version
+                    or (state.game_number is not None and state.game_number >= game_number)
+                ):
+                    state.reset()
+                state.complete = False
+                state.data_version = data_version
+
+    def clear(self):
+        with self._lock:
+            self._seasons.clear()
+
+    def _load(self, session: Session, season_id: int, state: SeasonRatingState):
+        if state.game_number is None:
+            state.game_number, state.latest = get_checkpoint_ratings(session, season_id)
+        else:
+            for _, row_game_number, player_id, rating, _ in session.exec(
+                get_games_timeseries_query(season_id, state.game_number)
+            ):
+                state.latest[player_id] = rating
+                state.game_number = row_game_number
+        state.complete = True
@@ -0,0 +1,210 @@
+from itertools import groupby
+
+from sqlalchemy import Select
+from sqlmodel import Session, col, delete, desc, func, insert, select
+
+from foos.database import models
+from foos.rating.replay import BASE_RATING
+
+
+# Number of season games between stored rating checkpoints
+CHECKPOINT_INTERVAL = 50
+
+
+def get_latest_checkpoint(
+    session: Session,
+    season_id: int,
+    game_number: int | None = None
+) -> tuple[int, int] | None:
+    """
+    Get the game ID and game number of the season's latest rating checkpoint
+    at or before game_number, or None if there is none.
+    If game_number is None, get the season's latest checkpoint.
+    """
+    query = (
+        select(models.Game.id, models.Game.game_number)
+        .where(
+            col(models.Game.id).in_(
+                select(models.RatingCheckpoint.game_id)
+                .where(models.RatingCheckpoint.season_id == season_id)
+            )
+        )
+        .order_by(desc(models.Game.game_number))
+        .limit(1)
+    )
+    if game_number is not None:
+        query = query.where(models.Game.game_number <= game_number)
+    checkpoint = session.exec(query).first()
+    return tuple(checkpoint) if checkpoint is not None else None
+
+
+def get_checkpoint_stats(
+    session: Session,
+    season_id: int,
+    game_number: int | None = None
+) -> tuple[int, dict[str, tuple[float, int, int]]]:
+    """
+    Get the game number of the season's latest checkpoint at or before
+    game_number along with each player's (rating, num_games, num_wins) at
+    it. Without a checkpoint, the game number is 0 and nobody is rated.
+    """
+    checkpoint = get_latest_checkpoint(session, season_id, game_number)
+    if checkpoint is None:
+        return 0, {}
+    checkpoint_game_id, checkpoint_game_number = checkpoint
+    checkpoint_rows = session.exec(
+        select(
+            models.RatingCheckpoint.player_id,
+            models.RatingCheckpoint.rating,
+            models.RatingCheckpoint.num_games,
+            models.RatingCheckpoint.num_wins
+        )
+        .where(
+            models.RatingCheckpoint.season_id == season_id,
+            models.RatingCheckpoint.game_id == checkpoint_game_id
+        )
+    ).all()
+    return checkpoint_game_number, {
+        player_id: (player_rating, num_games, num_wins)
+        for player_id, player_rating, num_games, num_wins in checkpoint_rows
+    }
+
+
+def get_games_timeseries_query(
+    season_id: int,
+    after_game_number: int,
+    game_number: int | None = None
+) -> Select[tuple[int, int, str, float, bool]]:
+    """
+    Get the query of the (game ID, game number, player ID, rating, win)
+    timeseries points of the season's games after after_game_number, up to
+    game_number if given, in game number order. The points are looked up
+    through their denormalized season ID and game number, which the
+    (season_id, player_id, game_number DESC) timeseries index covers, without
+    joining the games.
+    """
+    query = (
+        select(
+            models.TimeSeries.game_id,
+            models.TimeSeries.game_number,
+            models.TimeSeries.player_id,
+            models.TimeSeries.rating,
+            models.TimeSeries.win
+        )
+        .where(
+            models.TimeSeries.season_id == season_id,
+            models.TimeSeries.game_number > after_game_number
+        )
+        .order_by(models.TimeSeries.game_number)
+    )
+    if game_number is not None:
+        query = query.where(models.TimeSeries.game_number <= game_number)
+    return query
+
+
+def get_checkpoint_player_stats(
+    session: Session,
+    season_id: int,
+    game_number: int | None = None
+) -> tuple[int, dict[str, tuple[float, int, int]]]:
+    """
+    Get each rated player's (rating, num_games, num_wins) in the season
+    right after game_number, or after the latest game if None, along with
+    the game number of the last game applied, or 0 if there is none. The
+    stats are rebuilt from the latest checkpoint at or before game_number
+    plus the timeseries points of at most CHECKPOINT_INTERVAL games.
+    """
+    last_game_number, player_id_to_stats = get_checkpoint_stats(session, season_id, game_number)
+    for _, row_game_number, player_id, player_rating, win in session.exec(
+        get_games_timeseries_query(season_id, last_game_number, game_number)
+    ):
+        _, player_num_games, player_num_wins = player_id_to_stats.get(player_id, (BASE_RATING, 0, 0))
+        player_id_to_stats[player_id] = (player_rating, player_num_games + 1, player_num_wins + win)
+        last_game_number = row_game_number
+    return last_game_number, player_id_to_stats
+
+
+def get_checkpoint_ratings(
+    session: Session,
+    season_id: int,
+    game_number: int | None = None
+) -> tuple[int, dict[str, float]]:
+    """
+    Get every rated player's rating in the season right after game_number,
+    or after the latest game if None, along with the game number of the last
+    game applied, or 0 if there is none.
+    """
+    last_game_number, player_id_to_stats = get_checkpoint_player_stats(session, season_id, game_number)
+    return last_game_number, {
+        player_id: player_rating
+        for player_id, (player_rating, _, _) in player_id_to_stats.items()
+    }
+
+
+def update_rating_checkpoints(session: Session, season_id: int, game_number: int) -> None:
+    """
+    Rebuild the season's rating checkpoints from game_number onward by
+    applying the timeseries points since the latest checkpoint before
+    game_number. A checkpoint is stored after every CHECKPOINT_INTERVAL-th
+    game of the season. Nothing is committed.
+    """
+    session.execute(
+        delete(models.RatingCheckpoint)
+        .where(
+            models.RatingCheckpoint.season_id == season_id,
+            col(models.RatingCheckpoint.game_id).in_(
+                select(models.Game.id)
+                .where(
+                    models.Game.season_id == season_id,
+                    models.Game.game_number >= game_number
+                )
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    checkpoint_game_number, player_id_to_stats = get_checkpoint_stats(
+        session,
+        season_id,
+        game_number - 1
+    )
+    num_games = session.exec(
+        select(func.count(models.Game.id))
+        .where(
+            models.Game.season_id == season_id,
+            models.Game.game_number <= checkpoint_game_number
+        )
+    ).one()
+
+    checkpoint_rows = []
+    timeseries = session.exec(get_games_timeseries_query(season_id, checkpoint_game_number))
+    for game_id, game_timeseries in groupby(timeseries, key=lambda row: row[0]):
+        for _, _, player_id, player_rating, win in game_timeseries:
+            _, player_num_games, player_num_wins = player_id_to_stats.get(player_id, (BASE_RATING, 0, 0))
+            player_id_to_stats[player_id] = (player_rating, player_num_games + 1, player_num_wins + win)
+        num_games += 1
+        if num_games % CHECKPOINT_INTERVAL == 0:
+            checkpoint_rows += [
+                {
+                    "season_id": season_id,
+                    "game_id": game_id,
+                    "player_id": player_id,
+                    "rating": player_rating,
+                    "num_games": player_num_games,
+                    "num_wins": player_num_wins
+                }
+                for player_id, (player_rating, player_num_games, player_num_wins) in player_id_to_stats.items()
+            ]
+    if checkpoint_rows:
+        session.execute(insert(models.RatingCheckpoint), checkpoint_rows)
+
+
+def backfill_rating_checkpoints(session: Session) -> None:
+    """
+    Build the rating checkpoints of every season if none exist yet.
+    """
+    if session.exec(select(models.RatingCheckpoint).limit(1)).first():
+        return
+    for season_id in session.exec(select(models.Season.id)).all():
+        update_rating_checkpoints(session, season_id, 0)
+    session.commit()
@@ -1,8 +1,16 @@
 import math
 
-def min_scaled_flat_score(actual_score_diff: float, rating_diff: float, win_score: int, flat_delta: float = 20) -> float:
+import numpy as np
+
+def min_scaled_flat_score(
+    actual_score_diff: float,
+    rating_diff: float,
+    win_score: int,
+    flat_delta: float = 20,
+    rating_scale: float = 40
+) -> float:
     # Rating diff only
-    rating_diff_coef = (1 / (1 + math.e ** (rating_diff / 40)))
+    rating_diff_coef = (1 / (1 + math.e ** (rating_diff / rating_scale)))
 
     # Tiny bit extra for people who win harder
     # People who win by a lot should get a larger delta
@@ -11,19 +19,64 @@ def min_scaled_flat_score(actual_score_diff: float, rating_diff: float, win_scor
 
     return flat_delta * rating_diff_coef * actual_score_diff_coef
 
-def sigmoid_differential(actual_score_diff: float, rating_diff: float, win_score: int) -> float:
-    expected_score_diff = (2.0 / (1 + math.e ** (-rating_diff / 40)) - 1) * win_score
+def sigmoid_differential(
+    actual_score_diff: float,
+    rating_diff: float,
+    win_score: int,
+    rating_scale: float = 40,
+    score_exponent: float = 1.3,
+    coef_range: float = 1.5,
+    coef_floor: float = 0.25,
+    delta_scale: float = 30
+) -> float:
+    expected_score_diff = (2.0 / (1 + math.e ** (-rating_diff / rating_scale)) - 1) * win_score
     # `actual_score_diff` is always > 0
     error = actual_score_diff - expected_score_diff
 
     # If error >> 0 (scored more than expected) large coef,
     # if error << 0 (scored less than expected)
-    error_coef = (1.5 / (1 + math.e ** (-error))) + 0.25
+    error_coef = (coef_range / (1 + math.e ** (-error))) + coef_floor
     # If rating diff >> 0 then small coef, if rating diff << 0 then large coef
-    rating_diff_coef = (1.5 / (1 + math.e ** (rating_diff / 40))) + 0.25
-    delta = (actual_score_diff ** 1.3) * error_coef * rating_diff_coef
+    rating_diff_coef = (coef_range / (1 + math.e ** (rating_diff / rating_scale))) + coef_floor
+    delta = (actual_score_diff ** score_exponent) * error_coef * rating_diff_coef
     # Scale delta to between 0 and 40
-    return (40 / (1 + math.e ** (-delta / 30)) - 20) * 2
+    return (40 / (1 + math.e ** (-delta / delta_scale)) - 20) * 2
+
+def square_differential(actual_score_diff: float, exponent: float = 2) -> float:
+    return actual_score_diff ** exponent
+
+
+# Batched forms of the formulas above over arrays of score diffs, rating diffs
+# and win scores, or over arrays of parameters
+
+def min_scaled_flat_score_batch(
+    actual_score_diff: np.ndarray,
+    rating_diff: np.ndarray,
+    win_score: np.ndarray,
+    flat_delta: float | np.ndarray = 20,
+    rating_scale: float | np.ndarray = 40
+) -> np.ndarray:
+    return flat_delta / (1 + np.exp(rating_diff / rating_scale))
+
+def sigmoid_differential_batch(
+    actual_score_diff: np.ndarray,
+    rating_diff: np.ndarray,
+    win_score: np.ndarray,
+    rating_scale: float | np.ndarray = 40,
+    score_exponent: float | np.ndarray = 1.3,
+    coef_range: float | np.ndarray = 1.5,
+    coef_floor: float | np.ndarray = 0.25,
+    delta_scale: float | np.ndarray = 30
+) -> np.ndarray:
+    expected_score_diff = (2.0 / (1 + np.exp(-rating_diff / rating_scale)) - 1) * win_score
+    error = actual_score_diff - expected_score_diff
+    error_coef = (coef_range / (1 + np.exp(-error))) + coef_floor
+    rating_diff_coef = (coef_range / (1 + np.exp(rating_diff / rating_scale))) + coef_floor
+    delta = np.power(actual_score_diff, score_exponent) * error_coef * rating_diff_coef
+    return (40 / (1 + np.exp(-delta / delta_scale)) - 20) * 2
 
-def square_differential(actual_score_diff: float) -> float:
-    return actual_score_diff ** 2
+def square_differential_batch(
+    actual_score_diff: np.ndarray,
+    exponent: float | np.ndarray = 2
+) -> np.ndarray:
+    return np.power(actual_score_diff, exponent)
@@ -0,0 +1,125 @@
+import functools
+import inspect
+from typing import Callable
+
+import numpy as np
+
+from foos.rating import delta
+
+
+# (actual_score_diff, rating_diff, win_score, **params) -> delta of the winning team
+DeltaFunction = Callable[..., float]
+# Same as DeltaFunction over arrays of games or arrays of params
+BatchDeltaFunction = Callable[..., np.ndarray]
+
+
+class RatingMethod:
+    """
+    A rating method's delta formula in two forms: a scalar per-game function
+    and an optional batched kernel that broadcasts over NumPy arrays of games
+    or of parameters. Both take the winning team's score diff, the winning
+    team's rating diff and the winning score, followed by the formula's
+    tunable constants as keyword arguments.
+
+    Methods whose delta does not depend on the rating diff can be replayed
+    with a single call of the batched kernel over all games.
+    """
+    def __init__(
+        self,
+        name: str,
+        delta_function: DeltaFunction,
+        batch_delta_function: BatchDeltaFunction | None = None,
+        *,
+        uses_rating_diff: bool = True,
+        signature_function: Callable[..., float] | None = None
+    ):
+        self.name = name
+        self.delta_function = delta_function
+        self.batch_delta_function = batch_delta_function
+        self.uses_rating_diff = uses_rating_diff
+        # Function whose keyword arguments are the method's parameters
+        self._signature = inspect.signature(signature_function or delta_function)
+
+    def validate_params(self, params: dict[str, float | np.ndarray] | None):
+        if not params:
+            return
+        try:
+            self._signature.bind_partial(0, **params)
+        except TypeError as e:
+            raise ValueError(f"Invalid parameters for rating method {self.name}: {e}") from e
+
+    def get_default_params(self) -> dict[str, float]:
+        """
+        Get the default values of the delta formula's constants.
+        """
+        return {
+            name: parameter.default
+            for name, parameter in self._signature.parameters.items()
+            if parameter.default is not inspect.Parameter.empty
+        }
+
+    def get_delta_function(self, params: dict[str, float] | None = None) -> DeltaFunction:
+        """
+        Get the scalar delta function with any of its constants overridden by
+        params.
+        """
+        self.validate_params(params)
+        if not params:
+            return self.delta_function
+        return functools.partial(self.delta_function, **params)
+
+    def get_batch_delta_function(self, params: dict[str, float | np.ndarray] | None = None) -> BatchDeltaFunction:
+        """
+        Get the batched delta kernel with any of its constants overridden by
+        params. Methods without a kernel fall back to vectorizing the scalar
+        function.
+        """
+        self.validate_params(params)
+        batch_delta_function = self.batch_delta_function
+        if batch_delta_function is None:
+            batch_delta_function = np.vectorize(self.delta_function)
+        if not params:
+            return batch_delta_function
+        return functools.partial(batch_delta_function, **params)
+
+
+RATING_METHODS: dict[str, RatingMethod] = {}
+
+
+def register_rating_method(method: RatingMethod) -> RatingMethod:
+    if method.name in RATING_METHODS:
+        raise ValueError(f"Rating method already registered: {method.name}")
+    RATING_METHODS[method.name] = method
+    return method
+
+
+def get_rating_method(name: str) -> RatingMethod:
+    method = RATING_METHODS.get(name)
+    if method is None:
+        raise ValueError(f"Unknown rating method: {name}")
+    return method
+
+
+register_rating_method(RatingMethod(
+    "min_scaled_flat_score",
+    delta.min_scaled_flat_score,
+    delta.min_scaled_flat_score_batch
+))
+register_rating_method(RatingMethod(
+    "sigmoid_differential",
+    delta.sigmoid_differential,
+    delta.sigmoid_differential_batch
+))
+register_rating_method(RatingMethod(
+    "square_differential",
+    lambda actual_score_diff, rating_diff, win_score, **params: delta.square_differential(
+        actual_score_diff,
+        **params
+    ),
+    lambda actual_score_diff, rating_diff, win_score, **params: delta.square_differential_batch(
+        actual_score_diff,
+        **params
+    ),
+    uses_rating_diff=False,
+    signature_function=delta.square_differential
+))
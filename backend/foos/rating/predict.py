@@ -0,0 +1,87 @@
+import functools
+import itertools
+
+import numpy as np
+
+from foos.rating.methods import get_rating_method
+
+
+# Rating diff scale of the predicted win probability for methods without a
+# `rating_scale` parameter
+DEFAULT_PREDICTION_SCALE = 40.0
+# Score the winning team plays to
+DEFAULT_WIN_SCORE = 10
+
+
+def get_prediction_scale(method: str, params: dict[str, float] | None = None) -> float:
+    """
+    Get the rating diff scale of the method's predicted win probability: its
+    `rating_scale`, overridden by params, or DEFAULT_PREDICTION_SCALE for
+    methods without one.
+    """
+    params = {**get_rating_method(method).get_default_params(), **(params or {})}
+    return params.get("rating_scale", DEFAULT_PREDICTION_SCALE)
+
+
+@functools.cache
+def get_team_splits(num_players: int) -> np.ndarray:
+    """
+    Get every 2v2 match between num_players players as rows of (yellow
+    offense, yellow defense, black offense, black defense) player indices.
+    Each group of four players is split three ways, with its first player
+    always on yellow so no match is listed twice with the sides swapped.
+    """
+    if num_players < 4:
+        return np.empty((0, 4), dtype=np.intp)
+    groups = np.array(list(itertools.combinations(range(num_players), 4)), dtype=np.intp)
+    a, b, c, d = groups.T
+    splits = np.stack([
+        np.stack([a, b, c, d], axis=1),
+        np.stack([a, c, b, d], axis=1),
+        np.stack([a, d, b, c], axis=1)
+    ], axis=1)
+    splits = splits.reshape(-1, 4)
+    splits.flags.writeable = False
+    return splits
+
+
+class MatchPredictions:
+    """
+    Predicted outcomes of 2v2 matches, indexed like the rows of `matches`.
+
+    Yellow's win probability is a logistic curve over the teams' rating
+    diff, the curve the rating sweeps are scored with. The expected scores
+    follow `sigmoid_differential`: the winner reaches the win score and the
+    expected score diff is (2 * win probability - 1) * win score.
+    """
+    def __init__(
+        self,
+        ratings: np.ndarray,
+        matches: np.ndarray,
+        win_score: int = DEFAULT_WIN_SCORE,
+        scale: float = DEFAULT_PREDICTION_SCALE
+    ):
+        self.matches = matches
+        self.yellow_ratings = (ratings[matches[:, 0]] + ratings[matches[:, 1]]) / 2
+        self.black_ratings = (ratings[matches[:, 2]] + ratings[matches[:, 3]]) / 2
+        rating_diff = self.yellow_ratings - self.black_ratings
+        with np.errstate(over="ignore"):
+            self.yellow_win_probabilities = 1 / (1 + np.exp(-rating_diff / scale))
+        expected_score_diff = (2 * self.yellow_win_probabilities - 1) * win_score
+        self.yellow_scores = np.minimum(win_score, win_score + expected_score_diff)
+        self.black_scores = np.minimum(win_score, win_score - expected_score_diff)
+
+    def __len__(self) -> int:
+        return len(self.matches)
+
+    def most_balanced(self, limit: int) -> np.ndarray:
+        """
+        Get the indices of the limit matches whose win probability is closest
+        to even, most balanced first. Only the selected matches are sorted.
+        """
+        imbalance = np.abs(self.yellow_win_probabilities - 0.5)
+        if limit < len(imbalance):
+            candidates = np.argpartition(imbalance, limit)[:limit]
+        else:
+            candidates = np.arange(len(imbalance))
+        return candidates[np.argsort(imbalance[candidates], kind="stable")]
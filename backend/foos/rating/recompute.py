@@ -0,0 +1,156 @@
+import datetime
+import threading
+import traceback
+from typing import Callable
+
+from sqlalchemy import Engine
+from sqlmodel import Session, col, select
+
+from foos import rating
+from foos.database import models
+
+
+DEFAULT_DELAY_SECONDS = 1.0
+DEFAULT_POLL_INTERVAL_SECONDS = 30.0
+
+
+def mark_ratings_stale(
+    session: Session,
+    season: models.Season,
+    game_number: int,
+    since_date: datetime.datetime | None = None
+) -> None:
+    """
+    Mark the season's ratings stale from game_number onward, and its end of
+    day ratings stale from since_date onward, for the recompute worker to pick
+    up. Markers of pending recomputes are merged so a single recompute covers
+    every edit since the last one. The season's data version is bumped since
+    its games changed. Nothing is committed.
+    """
+    session.refresh(season, with_for_update=True)
+    if season.ratings_stale_since is None or game_number < season.ratings_stale_since:
+        season.ratings_stale_since = game_number
+    if since_date is not None and (
+        season.ratings_stale_since_date is None
+        or since_date < season.ratings_stale_since_date
+    ):
+        season.ratings_stale_since_date = since_date
+    rating.bump_data_version(session, season.id)
+    session.add(season)
+    session.flush()
+
+
+def recompute_stale_ratings(session: Session, season_id: int) -> bool:
+    """
+    Recompute the season's stale ratings and clear its marker in a single
+    transaction. The season row stays locked until the commit, so edits that
+    mark the season stale meanwhile wait and get picked up by the next run.
+    Returns whether anything was recomputed.
+    """
+    season = session.exec(
+        select(models.Season)
+        .where(models.Season.id == season_id)
+        .with_for_update()
+    ).first()
+    if season is None or season.ratings_stale_since is None:
+        return False
+
+    game_number = season.ratings_stale_since
+    rating.recalculate_timeseries_points(
+        session,
+        season,
+        game_number,
+        since_date=season.ratings_stale_since_date
+    )
+    season.ratings_stale_since = None
+    season.ratings_stale_since_date = None
+    session.add(season)
+    session.commit()
+    rating.rating_cache.invalidate(session, game_number)
+    return True
+
+
+class RecomputeWorker:
+    """
+    Background thread recomputing the ratings of stale seasons.
+
+    The stale markers on the season table are the queue, so pending
+    recomputes survive restarts and are shared between processes. Writers call
+    `notify` after committing; the worker then waits `delay` seconds so a
+    burst of edits to a season coalesces into one recompute. Seasons marked
+    stale by other processes are picked up every `poll_interval` seconds.
+    `on_recompute` is called with the session and season id after each
+    committed recompute.
+    """
+    def __init__(
+        self,
+        engine: Engine,
+        delay: float = DEFAULT_DELAY_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+        on_recompute: Callable[[Session, int], None] | None = None
+    ):
+        self.engine = engine
+        self.delay = delay
+        self.poll_interval = poll_interval
+        self.on_recompute = on_recompute
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="recompute-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def notify(self):
+        self._wake.set()
+
+    def run_pending(self) -> int:
+        """
+        Recompute every stale season. Returns the number of seasons recomputed.
+        """
+        with Session(self.engine) as session:
+            season_ids = session.exec(
+                select(models.Season.id)
+                .where(col(models.Season.ratings_stale_since).is_not(None))
+            ).all()
+
+        num_recomputed = 0
+        for season_id in season_ids:
+            try:
+                with Session(self.engine) as session:
+                    if not recompute_stale_ratings(session, season_id):
+                        continue
+                    num_recomputed += 1
+                    if self.on_recompute is not None:
+                        self.on_recompute(session, season_id)
+            except Exception:
+                # Leave the marker in place so the next run retries
+                traceback.print_exc()
+        return num_recomputed
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            if self._stop.is_set():
+                break
+            if self._wake.is_set():
+                # Let quick successive edits pile up before recomputing
+                self._stop.wait(self.delay)
+                self._wake.clear()
+            try:
+                self.run_pending()
+            except Exception:
+                # E.g. the database is briefly unreachable, the stale markers
+                # are picked up again on the next wake up or poll
+                traceback.print_exc()
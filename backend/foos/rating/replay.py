@@ -0,0 +1,274 @@
+from typing import Any, Sequence
+
+import numpy as np
+
+from foos.database import models
+from foos.rating.methods import RatingMethod, get_rating_method
+
+
+BASE_RATING = 500.0
+
+# Direction of each position's rating change relative to the yellow team's delta
+_POSITION_SIGNS = np.array([1.0, 1.0, -1.0, -1.0])
+
+
+class EncodedGames:
+    """
+    Games encoded as dense arrays indexed by game order.
+
+    `player_index` holds the yellow offense, yellow defense, black offense and
+    black defense player indices of each game, in that order. `sign` is 1 when
+    yellow won and -1 when black won, so a game's rating diff and delta can be
+    computed from the yellow team's point of view without sorting teams.
+    """
+    def __init__(
+        self,
+        game_ids: Sequence[int],
+        season_ids: Sequence[int | None],
+        game_numbers: Sequence[int | None],
+        positions: Sequence[Sequence[str]],
+        yellow_scores: Sequence[int],
+        black_scores: Sequence[int],
+        player_ids: list[str]
+    ):
+        """
+        `positions` holds the yellow offense, yellow defense, black offense
+        and black defense player id columns, in that order.
+        """
+        self.player_ids = player_ids
+        self.player_id_to_index = {player_id: i for i, player_id in enumerate(player_ids)}
+
+        self.game_ids = list(game_ids)
+        self.season_ids = list(season_ids)
+        self.game_numbers = list(game_numbers)
+        # Players are indexed in order of first appearance
+        self.player_index = np.array(
+            [[self._index(player_id) for player_id in game] for game in zip(*positions)],
+            dtype=np.intp
+        ).reshape(-1, 4)
+
+        yellow_scores = np.asarray(yellow_scores, dtype=np.float64)
+        black_scores = np.asarray(black_scores, dtype=np.float64)
+        self.sign = np.where(yellow_scores > black_scores, 1.0, -1.0)
+        self.actual_score_diff = np.abs(yellow_scores - black_scores)
+        self.win_score = np.maximum(yellow_scores, black_scores)
+
+    @classmethod
+    def from_games(cls, games: list[models.Game], player_ids: list[str]) -> "EncodedGames":
+        return cls(
+            game_ids=[game.id for game in games],
+            season_ids=[game.season_id for game in games],
+            game_numbers=[game.game_number for game in games],
+            positions=[
+                [game.yellow_offense for game in games],
+                [game.yellow_defense for game in games],
+                [game.black_offense for game in games],
+                [game.black_defense for game in games]
+            ],
+            yellow_scores=[game.yellow_score for game in games],
+            black_scores=[game.black_score for game in games],
+            player_ids=player_ids
+        )
+
+    def _index(self, player_id: str) -> int:
+        index = self.player_id_to_index.get(player_id)
+        if index is None:
+            index = len(self.player_ids)
+            self.player_ids.append(player_id)
+            self.player_id_to_index[player_id] = index
+        return index
+
+    def __len__(self) -> int:
+        return len(self.game_ids)
+
+
+class ReplayResult:
+    """
+    Output buffers of a replay, laid out like `EncodedGames.player_index`.
+    """
+    def __init__(self, encoded: EncodedGames, ratings: np.ndarray, deltas: np.ndarray, final_ratings: np.ndarray):
+        self.encoded = encoded
+        self.ratings = ratings
+        self.deltas = deltas
+        self.final_ratings = final_ratings
+
+    def player_id_to_rating(self) -> dict[str, float]:
+        return dict(zip(self.encoded.player_ids, self.final_ratings.tolist()))
+
+    def to_timeseries_rows(self) -> list[dict[str, Any]]:
+        """
+        Get the timeseries points as column mappings for bulk inserts.
+        """
+        player_ids = self.encoded.player_ids
+        timeseries_rows = []
+        for game_id, season_id, game_number, player_index, ratings, deltas in zip(
+            self.encoded.game_ids,
+            self.encoded.season_ids,
+            self.encoded.game_numbers,
+            self.encoded.player_index.tolist(),
+            self.ratings.tolist(),
+            self.deltas.tolist()
+        ):
+            for i in range(4):
+                timeseries_rows.append({
+                    "game_id": game_id,
+                    "player_id": player_ids[player_index[i]],
+                    "rating": ratings[i],
+                    "delta": deltas[i],
+                    "win": deltas[i] > 0,
+                    "season_id": season_id,
+                    "game_number": game_number
+                })
+        return timeseries_rows
+
+    def to_timeseries_columns(self) -> dict[str, np.ndarray]:
+        """
+        Get the timeseries points as column arrays, ordered like the rows of
+        `to_timeseries_rows`.
+        """
+        deltas = self.deltas.ravel()
+        return {
+            "game_id": np.repeat(np.asarray(self.encoded.game_ids), 4),
+            "player_id": np.asarray(self.encoded.player_ids, dtype=object)[self.encoded.player_index.ravel()],
+            "rating": self.ratings.ravel(),
+            "delta": deltas,
+            "win": deltas > 0,
+            "season_id": np.repeat(np.asarray(self.encoded.season_ids), 4),
+            "game_number": np.repeat(np.asarray(self.encoded.game_numbers), 4)
+        }
+
+    def to_game_rating_rows(self) -> list[dict[str, Any]]:
+        """
+        Get each game's post-game ratings and deltas as column mappings for
+        bulk inserts into the game rating table.
+        """
+        return [
+            {
+                "game_id": game_id,
+                "yellow_offense_rating": ratings[0],
+                "yellow_offense_delta": deltas[0],
+                "yellow_defense_rating": ratings[1],
+                "yellow_defense_delta": deltas[1],
+                "black_offense_rating": ratings[2],
+                "black_offense_delta": deltas[2],
+                "black_defense_rating": ratings[3],
+                "black_defense_delta": deltas[3]
+            }
+            for game_id, ratings, deltas in zip(
+                self.encoded.game_ids,
+                self.ratings.tolist(),
+                self.deltas.tolist()
+            )
+        ]
+
+
+def replay_games(
+    games: list[models.Game],
+    player_id_to_rating: dict[str, float],
+    method: str,
+    params: dict[str, float] | None = None
+) -> ReplayResult:
+    """
+    Replay the given games in order starting from the given player ratings.
+    Players missing from player_id_to_rating start at BASE_RATING. params
+    overrides the constants of the method's delta formula.
+    """
+    return replay_encoded(
+        EncodedGames.from_games(games, list(player_id_to_rating)),
+        player_id_to_rating,
+        method,
+        params
+    )
+
+
+def replay_encoded(
+    encoded: EncodedGames,
+    player_id_to_rating: dict[str, float],
+    method: str,
+    params: dict[str, float] | None = None
+) -> ReplayResult:
+    """
+    Replay already encoded games in order starting from the given player
+    ratings. Players missing from player_id_to_rating start at BASE_RATING.
+
+    The rating method is looked up once. Methods whose delta does not depend
+    on the rating diff are replayed with their batched kernel, otherwise the
+    replay is inherently sequential: the ratings are kept in a dense vector
+    that the hot loop reads as a list of floats, which is faster than scalar
+    indexing into a NumPy array, and writes into preallocated output buffers.
+    """
+    rating_method = get_rating_method(method)
+    initial_ratings = [player_id_to_rating.get(player_id, BASE_RATING) for player_id in encoded.player_ids]
+    if not rating_method.uses_rating_diff:
+        return _replay_batched(encoded, initial_ratings, rating_method, params)
+
+    delta_function = rating_method.get_delta_function(params)
+
+    num_games = len(encoded)
+    ratings_out = np.empty((num_games, 4), dtype=np.float64)
+    deltas_out = np.empty((num_games, 4), dtype=np.float64)
+
+    ratings = initial_ratings
+    for i, (yo, yd, bo, bd), sign, actual_score_diff, win_score in zip(
+        range(num_games),
+        encoded.player_index.tolist(),
+        encoded.sign.tolist(),
+        encoded.actual_score_diff.tolist(),
+        encoded.win_score.tolist()
+    ):
+        prev = (ratings[yo], ratings[yd], ratings[bo], ratings[bd])
+        yellow_rating = (prev[0] + prev[1]) / 2
+        black_rating = (prev[2] + prev[3]) / 2
+        rating_diff = sign * (yellow_rating - black_rating)
+        d = sign * delta_function(actual_score_diff, rating_diff, win_score)
+
+        updated = (prev[0] + d, prev[1] + d, prev[2] - d, prev[3] - d)
+        ratings[yo], ratings[yd], ratings[bo], ratings[bd] = updated
+        ratings_out[i] = updated
+        deltas_out[i] = (
+            updated[0] - prev[0],
+            updated[1] - prev[1],
+            updated[2] - prev[2],
+            updated[3] - prev[3]
+        )
+
+    return ReplayResult(encoded, ratings_out, deltas_out, np.array(ratings, dtype=np.float64))
+
+
+def _replay_batched(
+    encoded: EncodedGames,
+    initial_ratings: list[float],
+    rating_method: RatingMethod,
+    params: dict[str, float] | None
+) -> ReplayResult:
+    """
+    Replay games whose deltas do not depend on the ratings. Every delta comes
+    from one call of the method's batched kernel, and each player's ratings
+    are a running sum of their deltas. The sums add the same terms in the same
+    order as the sequential replay, so the results only differ from it where
+    the kernel's floating point math differs from the scalar function's.
+    """
+    batch_delta_function = rating_method.get_batch_delta_function(params)
+    d = encoded.sign * np.broadcast_to(
+        batch_delta_function(encoded.actual_score_diff, None, encoded.win_score),
+        encoded.sign.shape
+    )
+    flat_player_index = encoded.player_index.ravel()
+    flat_deltas = (d[:, np.newaxis] * _POSITION_SIGNS).ravel()
+    prev_ratings = np.empty_like(flat_deltas)
+    ratings_out = np.empty_like(flat_deltas)
+    final_ratings = np.array(initial_ratings, dtype=np.float64)
+    # A player plays at most once per game, so sorting by player keeps each
+    # player's games in order
+    order = np.argsort(flat_player_index, kind="stable")
+    players, starts = np.unique(flat_player_index[order], return_index=True)
+    for player, positions in zip(players.tolist(), np.split(order, starts[1:])):
+        player_ratings = np.cumsum(np.concatenate(([final_ratings[player]], flat_deltas[positions])))
+        prev_ratings[positions] = player_ratings[:-1]
+        ratings_out[positions] = player_ratings[1:]
+        final_ratings[player] = player_ratings[-1]
+
+    ratings_out = ratings_out.reshape(-1, 4)
+    # Recompute the deltas from the ratings like the sequential replay does
+    deltas_out = ratings_out - prev_ratings.reshape(-1, 4)
+    return ReplayResult(encoded, ratings_out, deltas_out, final_ratings)
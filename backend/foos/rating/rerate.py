@@ -0,0 +1,179 @@
+import pandas as pd
+from psycopg2 import errors
+from sqlalchemy import Column, MetaData, Table, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, col, delete, insert, select
+
+from foos import instrumentation, rating
+from foos.database import models
+from foos.database.bulk import copy_frame
+from foos.rating.methods import get_rating_method
+from foos.rating.replay import EncodedGames, replay_encoded
+
+
+DEFAULT_CHUNK_SIZE = 10_000
+# How long the swap waits for row locks held by writers before giving up,
+# kept under Postgres' default deadlock_timeout so writers never get aborted
+SWAP_LOCK_TIMEOUT = "500ms"
+
+TIMESERIES_COLUMNS = [
+    "game_id",
+    "player_id",
+    "rating",
+    "delta",
+    "win",
+    "season_id",
+    "game_number"
+]
+
+
+class SeasonChangedError(Exception):
+    """
+    The season's games or ratings changed while it was being re-rated.
+    """
+
+
+def get_shadow_timeseries_table() -> Table:
+    """
+    Get a temporary table with the timeseries columns, dropped when the
+    transaction ends.
+    """
+    return Table(
+        "timeseries_shadow",
+        MetaData(),
+        *[
+            Column(column.name, column.type)
+            for column in models.TimeSeries.__table__.columns
+            if column.name in TIMESERIES_COLUMNS
+        ],
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP"
+    )
+
+
+def rerate_season(
+    session: Session,
+    season_id: int,
+    method: str | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Replace every rating of the season with a replay of all its games under
+    method, or under the season's own rating method if None, and store
+    method as the season's rating method. Returns the number of games.
+
+    The games are streamed in game number order, replayed chunk by chunk and
+    their timeseries points copied into a temporary shadow table with COPY.
+    The season's timeseries points are then swapped for the shadow rows, and
+    its per-game, materialized, end of day ratings and checkpoints rebuilt,
+    all in one transaction. Readers keep seeing the old ratings until it
+    commits.
+
+    Raises SeasonChangedError, with nothing changed, if a game edit touched
+    the season meanwhile or held its rows for longer than SWAP_LOCK_TIMEOUT.
+    The caller can then simply retry. Any other database error is raised as
+    is, with nothing changed either.
+    """
+    season = session.get(models.Season, season_id)
+    if season is None:
+        raise ValueError(f"Unknown season: {season_id}")
+    method = method or season.rating_method
+    get_rating_method(method)
+    data_version = season.data_version
+
+    shadow = get_shadow_timeseries_table()
+    shadow.create(session.connection())
+
+    games = session.exec(
+        select(
+            models.Game.id,
+            models.Game.game_number,
+            models.Game.yellow_offense,
+            models.Game.yellow_defense,
+            models.Game.black_offense,
+            models.Game.black_defense,
+            models.Game.yellow_score,
+            models.Game.black_score
+        )
+        .where(models.Game.season_id == season_id)
+        .order_by(models.Game.game_number)
+        .execution_options(yield_per=chunk_size)
+    )
+    player_id_to_rating: dict[str, float] = {}
+    num_games = 0
+    for chunk in games.partitions():
+        game_ids, game_numbers, *positions, yellow_scores, black_scores = zip(*chunk)
+        encoded = EncodedGames(
+            game_ids=list(game_ids),
+            season_ids=[season_id] * len(chunk),
+            game_numbers=list(game_numbers),
+            positions=[list(position) for position in positions],
+            yellow_scores=yellow_scores,
+            black_scores=black_scores,
+            player_ids=list(player_id_to_rating)
+        )
+        with instrumentation.timed("replay"):
+            result = replay_encoded(encoded, player_id_to_rating, method)
+        player_id_to_rating.update(result.player_id_to_rating())
+        copy_frame(
+            session,
+            shadow.name,
+            pd.DataFrame(result.to_timeseries_columns(), columns=TIMESERIES_COLUMNS)
+        )
+        num_games += len(chunk)
+
+    # Hold the season's row until the commit so edits can't slip in between
+    # the check and the swap
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+    try:
+        locked_data_version = session.exec(
+            select(models.Season.data_version)
+            .where(models.Season.id == season_id)
+            .with_for_update()
+        ).one()
+        if locked_data_version != data_version:
+            raise SeasonChangedError(f"Season {season_id} changed while being re-rated")
+
+        session.execute(
+            delete(models.TimeSeries)
+            .where(models.TimeSeries.season_id == season_id)
+            .execution_options(synchronize_session=False)
+        )
+        session.execute(
+            insert(models.TimeSeries).from_select(
+                TIMESERIES_COLUMNS,
+                select(*[shadow.c[column] for column in TIMESERIES_COLUMNS])
+            )
+        )
+        session.execute(
+            delete(models.GameRating)
+            .where(col(models.GameRating.game_id).in_(
+                select(models.Game.id)
+                .where(models.Game.season_id == season_id)
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        rating.insert_game_ratings(session, season_id)
+        rating.update_player_season_ratings(session, season_id, player_id_to_rating)
+        rating.update_daily_ratings(session, season_id)
+        rating.update_rating_checkpoints(session, season_id, 0)
+
+        season = session.get(models.Season, season_id, populate_existing=True)
+        season.rating_method = method
+        # Every rating was just recomputed, including any pending recompute
+        season.ratings_stale_since = None
+        season.ratings_stale_since_date = None
+        season.data_version += 1
+        session.add(season)
+        session.commit()
+    except OperationalError as e:
+        session.rollback()
+        # Only running out of lock_timeout means a writer holds the season
+        if not isinstance(e.orig, errors.LockNotAvailable):
+            raise
+        raise SeasonChangedError(f"Season {season_id} is being edited: {e.orig}") from e
+    except SeasonChangedError:
+        session.rollback()
+        raise
+    return num_games
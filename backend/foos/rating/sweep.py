@@ -0,0 +1,179 @@
+import itertools
+from typing import Sequence
+
+import numpy as np
+
+from foos.rating.methods import get_rating_method
+from foos.rating.predict import DEFAULT_PREDICTION_SCALE
+from foos.rating.replay import BASE_RATING, EncodedGames
+
+
+METRICS = ("log_loss", "brier", "accuracy")
+
+# Probabilities are clipped away from 0 and 1 so log loss stays finite
+_EPSILON = 1e-15
+
+
+class SweepResult:
+    """
+    Scores of every parameter configuration of a sweep, indexed like the
+    arrays in `params`.
+
+    Each game is scored before its ratings are updated, with the predicted
+    probability of the winning team winning given by a logistic curve over
+    the teams' rating diff. Like in the dry run, the accuracy only counts
+    games whose teams' ratings differed, and a game is correct when the
+    winning team had the higher rating.
+    """
+    def __init__(
+        self,
+        method: str,
+        params: dict[str, np.ndarray],
+        num_games: int,
+        log_loss: np.ndarray,
+        brier: np.ndarray,
+        accuracy: np.ndarray
+    ):
+        self.method = method
+        self.params = params
+        self.num_games = num_games
+        self.log_loss = log_loss
+        self.brier = brier
+        self.accuracy = accuracy
+
+    def __len__(self) -> int:
+        return len(self.log_loss)
+
+    @classmethod
+    def concatenate(cls, results: list["SweepResult"]) -> "SweepResult":
+        """
+        Join the results of sweeps over parts of the same parameter grid.
+        """
+        return cls(
+            results[0].method,
+            {
+                name: np.concatenate([result.params[name] for result in results])
+                for name in results[0].params
+            },
+            results[0].num_games,
+            np.concatenate([result.log_loss for result in results]),
+            np.concatenate([result.brier for result in results]),
+            np.concatenate([result.accuracy for result in results])
+        )
+
+    def ranking(self, metric: str = "log_loss") -> np.ndarray:
+        """
+        Get the configuration indices from best to worst by the given metric.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        scores = getattr(self, metric)
+        if metric == "accuracy":
+            scores = -scores
+        return np.argsort(scores, kind="stable")
+
+    def configuration(self, i: int) -> dict[str, float]:
+        return {name: float(values[i]) for name, values in self.params.items()}
+
+    def top(self, n: int, metric: str = "log_loss") -> list[tuple[dict[str, float], dict[str, float]]]:
+        """
+        Get the best n configurations as (params, scores) pairs.
+        """
+        return [
+            (
+                self.configuration(i),
+                {
+                    "log_loss": float(self.log_loss[i]),
+                    "brier": float(self.brier[i]),
+                    "accuracy": float(self.accuracy[i])
+                }
+            )
+            for i in self.ranking(metric)[:n].tolist()
+        ]
+
+
+def expand_grid(grid: dict[str, Sequence[float]]) -> dict[str, np.ndarray]:
+    """
+    Expand a mapping of parameter names to candidate values into one array
+    per parameter holding every combination.
+    """
+    names = list(grid)
+    combinations = list(itertools.product(*(grid[name] for name in names)))
+    return {
+        name: np.array([combination[i] for combination in combinations], dtype=np.float64)
+        for i, name in enumerate(names)
+    }
+
+
+def split_params(params: dict[str, np.ndarray], num_parts: int) -> list[dict[str, np.ndarray]]:
+    """
+    Split the parameter arrays into at most num_parts contiguous parts.
+    """
+    num_configurations = len(next(iter(params.values())))
+    parts = np.array_split(np.arange(num_configurations), min(num_parts, num_configurations))
+    return [
+        {name: values[part] for name, values in params.items()}
+        for part in parts
+    ]
+
+
+def sweep(
+    seasons: list[EncodedGames],
+    method: str,
+    params: dict[str, np.ndarray]
+) -> SweepResult:
+    """
+    Replay the seasons once under every parameter configuration at the same
+    time. Each season starts every player at BASE_RATING.
+
+    Ratings are kept as a (players, configurations) matrix, so each game
+    updates a contiguous row per player and the delta formula is evaluated
+    over whole parameter arrays with the method's batched kernel.
+    """
+    num_configurations = len(next(iter(params.values()))) if params else 1
+    if any(len(values) != num_configurations for values in params.values()):
+        raise ValueError("Parameter arrays must have the same length")
+    delta_function = get_rating_method(method).get_batch_delta_function(params)
+    prediction_scale = params.get("rating_scale", DEFAULT_PREDICTION_SCALE)
+
+    log_loss = np.zeros(num_configurations)
+    brier = np.zeros(num_configurations)
+    num_correct = np.zeros(num_configurations)
+    # Ties in rating predict neither team, so they are left out of the accuracy
+    num_predicted = np.zeros(num_configurations)
+    num_games = 0
+    with np.errstate(over="ignore"):
+        for encoded in seasons:
+            ratings = np.full((len(encoded.player_ids), num_configurations), BASE_RATING)
+            for (yo, yd, bo, bd), sign, actual_score_diff, win_score in zip(
+                encoded.player_index.tolist(),
+                encoded.sign.tolist(),
+                encoded.actual_score_diff.tolist(),
+                encoded.win_score.tolist()
+            ):
+                # Rating diff from the winning team's point of view
+                rating_diff = sign * (ratings[yo] + ratings[yd] - ratings[bo] - ratings[bd]) / 2
+
+                win_probability = 1 / (1 + np.exp(-rating_diff / prediction_scale))
+                np.clip(win_probability, _EPSILON, 1 - _EPSILON, out=win_probability)
+                log_loss -= np.log(win_probability)
+                brier += (1 - win_probability) ** 2
+                num_correct += rating_diff > 0
+                num_predicted += rating_diff != 0
+
+                d = sign * delta_function(actual_score_diff, rating_diff, win_score)
+                ratings[yo] += d
+                ratings[yd] += d
+                ratings[bo] -= d
+                ratings[bd] -= d
+            num_games += len(encoded)
+
+    num_scored = max(num_games, 1)
+    return SweepResult(
+        method,
+        params,
+        num_games,
+        log_loss / num_scored,
+        brier / num_scored,
+        num_correct / np.maximum(num_predicted, 1)
+    )
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+import threading
+from typing import Hashable
+
+
+DEFAULT_MAX_SIZE = 256
+
+
+class CachedResponse:
+    def __init__(self, body: bytes, headers: dict[str, str]):
+        self.body = body
+        self.headers = headers
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of rendered response bodies.
+
+    Keys are expected to contain the data version the response was rendered
+    from, so entries never need invalidating; outdated ones just age out.
+    """
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        with self._lock:
+            cached_response = self._entries.get(key)
+            if cached_response is not None:
+                self._entries.move_to_end(key)
+            return cached_response
+
+    def set(self, key: Hashable, cached_response: CachedResponse):
+        with self._lock:
+            self._entries[key] = cached_response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
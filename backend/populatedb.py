@@ -1,33 +1,65 @@
 import sys
+import time
 import datetime
-from zoneinfo import ZoneInfo
-from sqlmodel import Session, SQLModel
+from sqlmodel import Session, SQLModel, func, select, text
 import pandas as pd
 from tqdm import tqdm
 
 from foos import color
 from foos.database import engine, create_db_and_tables
-from foos.database import models
+from foos.database import models, pair_stats
+from foos.database.bulk import copy_frame
 from foos import rating
+from foos.rating.replay import EncodedGames, replay_encoded
+
+CHUNK_SIZE = 10_000
+
+GAME_COLUMNS = [
+    "id",
+    "game_number",
+    "date",
+    "season_id",
+    "yellow_offense",
+    "yellow_defense",
+    "yellow_score",
+    "black_offense",
+    "black_defense",
+    "black_score",
+    "created_at",
+    "updated_at",
+    "removed_at"
+]
+TIMESERIES_COLUMNS = [
+    "game_id",
+    "player_id",
+    "rating",
+    "delta",
+    "win",
+    "season_id",
+    "game_number"
+]
+POSITION_COLUMNS = ["yellow_offense", "yellow_defense", "black_offense", "black_defense"]
+
+
+def read_game_chunks(path: str):
+    """
+    Read the games CSV in chunks of CHUNK_SIZE games, each in game number
+    order. The file must be sorted by game number across chunks.
+    """
+    prev_game_number = None
+    for chunk in pd.read_csv(path, chunksize=CHUNK_SIZE):
+        chunk = chunk.sort_values(by="game_number", ascending=True)
+        if prev_game_number is not None and chunk["game_number"].iloc[0] <= prev_game_number:
+            raise ValueError(f"{path} must be sorted by game_number")
+        prev_game_number = chunk["game_number"].iloc[-1]
+        for column in ["game_number", "season_id", "yellow_score", "black_score"]:
+            chunk[column] = chunk[column].astype(int)
+        for column in ["date", "created_at", "updated_at", "removed_at"]:
+            chunk[column] = pd.to_datetime(chunk[column], format="ISO8601", utc=True)
+        yield chunk
 
-def populate_db():
-    game_data = pd.read_csv(sys.argv[1]).sort_values(by="game_number", ascending=True)
-    game_data["date"] = pd.to_datetime(game_data["date"], format="ISO8601", utc=False)
-    game_data["created_at"] = pd.to_datetime(game_data["created_at"], format="ISO8601", utc=False)
-    game_data["updated_at"] = pd.to_datetime(game_data["updated_at"], format="ISO8601", utc=False)
-    game_data["removed_at"] = pd.to_datetime(game_data["removed_at"], format="ISO8601", utc=False)
-    # game_data["date"] = game_data["date"].dt.tz_convert(ZoneInfo("America/Los_Angeles")).dt.floor("D")
-    print(game_data)
-
-    player_data: list[str] = pd.concat(
-        [
-            game_data["yellow_offense"],
-            game_data["yellow_defense"],
-            game_data["black_offense"],
-            game_data["black_defense"]
-        ]
-    ).unique().tolist()
 
+def populate_db():
     seasons = [
         {
             "name": "1",
@@ -73,76 +105,96 @@ def populate_db():
         session.bulk_save_objects(seasons_to_upload)
         session.commit()
 
-        players_to_upload = []
-        player_id_to_rating: dict[str, float] = {}
-        for player in player_data:
-            player_id = player.lower().replace(" ", "_")
-            db_player = models.Player(
-                id=player_id,
-                name=player.capitalize(),
-                color=color.get_random_dark_color()
-            )
-            players_to_upload.append(db_player)
-            player_id_to_rating[player_id] = rating.BASE_RATING
-        session.add_all(players_to_upload)
-        session.commit()
+        season_id_to_method = {
+            season.id: season.rating_method
+            for season in session.exec(select(models.Season))
+        }
+        season_id_to_ratings: dict[int, dict[str, float]] = {}
+        player_ids: set[str] = set()
+        next_game_id = (session.exec(select(func.max(models.Game.id))).one() or 0) + 1
 
-        games_to_upload: list[models.Game] = []
-        for _, game in tqdm(game_data.iterrows()):
-            db_game = models.Game(
-                date=game[["date"]].item(),
-                game_number=game[["game_number"]].item(),
-                yellow_offense=game[["yellow_offense"]].item(),
-                yellow_defense=game[["yellow_defense"]].item(),
-                yellow_score=int(game[["yellow_score"]].item()),
-                black_offense=game[["black_offense"]].item(),
-                black_defense=game[["black_defense"]].item(),
-                black_score=int(game[["black_score"]].item()),
-                season_id=int(game[["season_id"]].item()),
-                created_at=game[["created_at"]].item(),
-                updated_at=game[["updated_at"]].item(),
-                removed_at=game[["removed_at"]].item() if not pd.isna(game[["removed_at"]].item()) else None
-            )
-            games_to_upload.append(db_game)
-        session.add_all(games_to_upload)
-        session.commit()
+        start_time = time.perf_counter()
+        num_games = 0
+        num_timeseries_points = 0
+        progress = tqdm(unit="games")
+        for chunk in read_game_chunks(sys.argv[1]):
+            new_players = [
+                player
+                for player in pd.unique(chunk[POSITION_COLUMNS].to_numpy().ravel()).tolist()
+                if player.lower().replace(" ", "_") not in player_ids
+            ]
+            for player in new_players:
+                player_ids.add(player.lower().replace(" ", "_"))
+            session.add_all([
+                models.Player(
+                    id=player.lower().replace(" ", "_"),
+                    name=player.capitalize(),
+                    color=color.get_random_dark_color()
+                )
+                for player in new_players
+            ])
+            session.flush()
 
-        timeseries_to_upload: list[models.TimeSeries] = []
-        curr_season = None
-        for db_game in tqdm(games_to_upload):
-            if curr_season != db_game.season_id:
-                curr_season = db_game.season_id
-                player_id_to_rating = { p: rating.BASE_RATING for p in player_id_to_rating }
-
-            game_player_id_to_rating = {
-                player_id: rating
-                for player_id, rating in player_id_to_rating.items()
-                if player_id in [
-                    db_game.yellow_offense,
-                    db_game.yellow_defense,
-                    db_game.black_offense,
-                    db_game.black_defense
-                ]
-            }
-            game_player_id_to_updated_rating = rating.update_ratings(
-                db_game=db_game,
-                player_id_to_rating=game_player_id_to_rating,
-                method=db_game.season.rating_method
-            )
-            for player_id, updated_rating in game_player_id_to_updated_rating.items():
-                db_timeseries_point = models.TimeSeries(
-                    game_id=db_game.id,
-                    player_id=player_id,
-                    rating=updated_rating,
-                    delta=updated_rating - player_id_to_rating[player_id],
-                    win=updated_rating > player_id_to_rating[player_id]
+            chunk["id"] = range(next_game_id, next_game_id + len(chunk))
+            next_game_id += len(chunk)
+            copy_frame(session, models.Game.__tablename__, chunk[GAME_COLUMNS])
+
+            # Replay each run of consecutive same-season games against that
+            # season's in-memory ratings
+            season_ids = chunk["season_id"].to_numpy()
+            run_starts = [0] + [
+                i for i in range(1, len(season_ids))
+                if season_ids[i] != season_ids[i - 1]
+            ]
+            for run_start, run_end in zip(run_starts, run_starts[1:] + [len(chunk)]):
+                run = chunk.iloc[run_start:run_end]
+                season_id = int(run["season_id"].iloc[0])
+                season_player_id_to_rating = season_id_to_ratings.setdefault(season_id, {})
+                encoded = EncodedGames(
+                    game_ids=run["id"].tolist(),
+                    season_ids=[season_id] * len(run),
+                    game_numbers=run["game_number"].tolist(),
+                    positions=[run[column].tolist() for column in POSITION_COLUMNS],
+                    yellow_scores=run["yellow_score"].to_numpy(),
+                    black_scores=run["black_score"].to_numpy(),
+                    player_ids=list(season_player_id_to_rating)
+                )
+                result = replay_encoded(
+                    encoded,
+                    season_player_id_to_rating,
+                    season_id_to_method[season_id]
                 )
+                season_player_id_to_rating.update(result.player_id_to_rating())
+                copy_frame(
+                    session,
+                    models.TimeSeries.__tablename__,
+                    pd.DataFrame(result.to_timeseries_columns(), columns=TIMESERIES_COLUMNS)
+                )
+                num_timeseries_points += 4 * len(run)
+
+            num_games += len(chunk)
+            progress.update(len(chunk))
+        progress.close()
 
-                timeseries_to_upload.append(db_timeseries_point)
-                player_id_to_rating[player_id] = updated_rating
-        session.bulk_save_objects(timeseries_to_upload)
+        # Ids were assigned explicitly, so move the sequence past them
+        session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('game', 'id'), "
+            "(SELECT coalesce(max(id), 1) FROM game))"
+        ))
         session.commit()
 
+        elapsed = time.perf_counter() - start_time
+        print(
+            f"Loaded {num_games} games and {num_timeseries_points} timeseries points "
+            f"in {elapsed:.1f}s ({num_games / max(elapsed, 1e-9):.0f} games/s)"
+        )
+
+        rating.backfill_player_season_ratings(session)
+        rating.backfill_game_ratings(session)
+        rating.backfill_daily_ratings(session)
+        rating.backfill_rating_checkpoints(session)
+        pair_stats.backfill_pair_stats(session)
+
 
 if __name__ == "__main__":
     SQLModel.metadata.drop_all(engine)
@@ -0,0 +1,64 @@
+import argparse
+import time
+
+from sqlmodel import Session, select
+
+from foos.database import engine
+from foos.database import models
+from foos.rating import rerate
+from foos.rating.methods import RATING_METHODS
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Re-rate whole seasons in place, e.g. after changing their rating method. "
+        "The service can keep running, its rating endpoints see the new ratings once each season is swapped in."
+    )
+    parser.add_argument("season_ids", type=int, nargs="*", help="seasons to re-rate")
+    parser.add_argument("--all", action="store_true", help="re-rate every season")
+    parser.add_argument(
+        "--method",
+        choices=sorted(RATING_METHODS),
+        help="rating method to switch the seasons to, defaults to each season's own"
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=5,
+        help="attempts per season when games are edited during the re-rate"
+    )
+    parser.add_argument("--chunk-size", type=int, default=rerate.DEFAULT_CHUNK_SIZE, help="games per replay chunk")
+    args = parser.parse_args()
+    if not args.season_ids and not args.all:
+        parser.error("give season ids or --all")
+    return args
+
+
+def main():
+    args = parse_args()
+    season_ids = args.season_ids
+    if args.all:
+        with Session(engine) as session:
+            season_ids = list(session.exec(select(models.Season.id).order_by(models.Season.id)).all())
+
+    for season_id in season_ids:
+        for attempt in range(1, args.retries + 1):
+            start = time.perf_counter()
+            try:
+                with Session(engine) as session:
+                    num_games = rerate.rerate_season(session, season_id, args.method, args.chunk_size)
+            except rerate.SeasonChangedError as e:
+                print(f"Season {season_id}: attempt {attempt} failed: {e}")
+                if attempt == args.retries:
+                    raise
+                continue
+            elapsed = time.perf_counter() - start
+            print(
+                f"Season {season_id}: re-rated {num_games} games in {elapsed:.1f}s "
+                f"({num_games / max(elapsed, 1e-9):.0f} games/s)"
+            )
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,28 @@
+import asyncio
 from collections import defaultdict
+from collections.abc import AsyncGenerator, Generator
 import datetime
+import hashlib
+import time
 from zoneinfo import ZoneInfo
 import os
-from typing import Any
+from pathlib import Path
+import re
+from typing import Annotated, Any
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query, Request, status
+import numpy as np
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlmodel import Session, col, desc, select, func
-from sqlalchemy.orm import aliased
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlmodel import Session, col, delete, desc, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from foos import color, database as db, rating
-from foos.database import models
+from foos import color, database as db, instrumentation, live, rating
+from foos.database import games, models, pair_stats
+from foos.rating import predict, recompute
+from foos.response_cache import CachedResponse, ResponseCache
 
 
 load_dotenv()
@@ -23,6 +33,23 @@ if not SHARED_SECRET:
 ORIGINS = os.getenv("ORIGINS")
 if not ORIGINS:
     raise ValueError("Invalid origins")
+BACKGROUND_RECOMPUTE = os.getenv("BACKGROUND_RECOMPUTE", "").strip().lower() in ("1", "true", "yes", "on")
+MAX_BATCH_SIZE = 100
+MAX_MATCHMAKING_PLAYERS = 16
+# Requests slower than this dump a sampled profile, unset to disable
+PROFILE_SLOW_REQUESTS_SECONDS = (
+    float(os.getenv("PROFILE_SLOW_REQUESTS_SECONDS", ""))
+    if os.getenv("PROFILE_SLOW_REQUESTS_SECONDS")
+    else None
+)
+PROFILE_DIR = os.getenv("PROFILE_DIR") or "profiles"
+RECOMPUTE_DELAY_SECONDS = float(
+    os.getenv("RECOMPUTE_DELAY_SECONDS") or recompute.DEFAULT_DELAY_SECONDS
+)
+# Idle event streams send a comment this often to keep proxies from closing
+# them, and check for changes made by other processes
+EVENTS_KEEPALIVE_SECONDS = 15.0
+EVENTS_RETRY_MILLISECONDS = 3000
 
 app = FastAPI()
 
@@ -31,7 +58,8 @@ app.add_middleware(
     allow_origins=ORIGINS.split(","),
     allow_credentials=False,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"]
 )
 
 
@@ -47,504 +75,998 @@ async def verify_internal_token(request: Request, call_next):
     return response
 
 
+instrumentation.instrument_engine(db.engine)
+instrumentation.instrument_engine(db.get_async_engine().sync_engine)
+request_metrics = instrumentation.RequestMetrics()
+
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    stats = instrumentation.start_request()
+    profiler = None
+    if PROFILE_SLOW_REQUESTS_SECONDS is not None:
+        profiler = instrumentation.SamplingProfiler(stats)
+        profiler.start()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    seconds = time.perf_counter() - start
+
+    # Label by route template so path parameters don't blow up the series
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    request_metrics.record(request.method, route_path, response.status_code, seconds, stats)
+    response.headers["Server-Timing"] = stats.server_timing(seconds)
+
+    if profiler is not None and seconds >= PROFILE_SLOW_REQUESTS_SECONDS:
+        name = route_path.strip("/").replace("/", "_") or "root"
+        profiler.dump(os.path.join(PROFILE_DIR, f"{time.time_ns()}-{request.method}-{name}.folded"))
+    return response
+
+
+def get_session(request: Request) -> Generator[Session, None, None]:
+    start = time.perf_counter()
+    error = False
+    try:
+        with Session(db.engine) as session:
+            yield session
+    except Exception:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        request.state.db_session_seconds = seconds
+        db.session_metrics.record(seconds, error)
+
+
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    start = time.perf_counter()
+    error = False
+    try:
+        async with AsyncSession(db.get_async_engine()) as session:
+            yield session
+    except Exception:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        request.state.db_session_seconds = seconds
+        db.session_metrics.record(seconds, error)
+
+
+SessionDep = Annotated[Session, Depends(get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+
+response_cache = ResponseCache()
+
+
+async def get_data_version(session: AsyncSession, season_id: int) -> int:
+    data_version = (await session.exec(
+        select(models.Season.data_version)
+        .where(models.Season.id == season_id)
+    )).first()
+    return data_version or 0
+
+
+def get_build_version() -> str:
+    """
+    Get a hash of the backend's source files, which changes whenever a deploy
+    may change the shape or contents of a response for the same data.
+    """
+    source_hash = hashlib.sha1()
+    root = Path(__file__).parent
+    for path in sorted([root / "service.py", *(root / "foos").rglob("*.py")]):
+        source_hash.update(path.relative_to(root).as_posix().encode())
+        source_hash.update(path.read_bytes())
+    return source_hash.hexdigest()
+
+
+BUILD_VERSION = get_build_version()
+ENTITY_TAG_PATTERN = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an If-None-Match header against the ETag. The header can list
+    several ETags or be `*`, and weak ETags match their strong counterpart.
+    """
+    if not if_none_match:
+        return False
+    for entity_tag in ENTITY_TAG_PATTERN.findall(if_none_match):
+        if entity_tag == "*" or entity_tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def get_cached_response(request: Request, key: tuple) -> tuple[str, Response | None]:
+    """
+    Get the ETag of the given cache key, which must include the data version,
+    along with a response if the client already has it or it is cached.
+    The ETag also covers the build version, so clients refetch after deploys.
+    """
+    etag = '"' + hashlib.sha1(repr((BUILD_VERSION, key)).encode()).hexdigest() + '"'
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return etag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    cached_response = response_cache.get(key)
+    if cached_response is not None:
+        return etag, Response(
+            content=cached_response.body,
+            media_type="application/json",
+            headers={"ETag": etag, **cached_response.headers}
+        )
+    return etag, None
+
+
+async def cache_json_response(
+    session: AsyncSession,
+    season_id: int,
+    data_version: int,
+    key: tuple,
+    etag: str,
+    content: Any,
+    headers: dict[str, str] | None = None
+) -> JSONResponse:
+    """
+    Respond with the content read at the season's data_version, cached under
+    key and tagged with etag. The data version and the content are read by
+    separate statements that may see a write committed in between, so the
+    data version is read again and if it changed, the content is neither
+    cached nor tagged.
+    """
+    headers = headers or {}
+    if await get_data_version(session, season_id) != data_version:
+        return JSONResponse(content=jsonable_encoder(content), headers=headers)
+    response = JSONResponse(
+        content=jsonable_encoder(content),
+        headers={"ETag": etag, **headers}
+    )
+    response_cache.set(key, CachedResponse(bytes(response.body), headers))
+    return response
+
+
+live_updates = live.LiveUpdates()
+
+
+def get_game_delta(game: models.Game, game_rating: models.GameRating) -> models.GameDeltaPublic:
+    return models.GameDeltaPublic.model_validate(
+        game,
+        update={
+            "yellow_offense_rating": round(game_rating.yellow_offense_rating),
+            "yellow_offense_delta": round(game_rating.yellow_offense_delta),
+            "yellow_defense_rating": round(game_rating.yellow_defense_rating),
+            "yellow_defense_delta": round(game_rating.yellow_defense_delta),
+            "black_offense_rating": round(game_rating.black_offense_rating),
+            "black_offense_delta": round(game_rating.black_offense_delta),
+            "black_defense_rating": round(game_rating.black_defense_rating),
+            "black_defense_delta": round(game_rating.black_defense_delta)
+        }
+    )
+
+
+def publish_game_change(
+    session: Session,
+    season_id: int,
+    kind: str,
+    game_ids: list[int] | None = None,
+    removed_game_ids: list[int] | None = None
+):
+    """
+    Send a committed change to the season's live subscribers, with the
+    changed games as rated rows. Games whose ratings are pending a background
+    recompute are left out, the recompute's own event follows.
+    """
+    if not live_updates.has_subscribers(season_id):
+        return
+    game_rows = []
+    if game_ids:
+        game_rows = [
+            get_game_delta(game, game_rating)
+            for game, game_rating in session.exec(
+                select(models.Game, models.GameRating)
+                .join(models.GameRating)
+                .where(col(models.Game.id).in_(game_ids))
+                .order_by(models.Game.game_number)
+            ).all()
+        ]
+    live_updates.publish(session, season_id, {
+        "kind": kind,
+        "games": game_rows,
+        "removed_game_ids": removed_game_ids or []
+    })
+
+
+recompute_worker = recompute.RecomputeWorker(
+    db.engine,
+    delay=RECOMPUTE_DELAY_SECONDS,
+    on_recompute=lambda session, season_id: publish_game_change(session, season_id, "ratings_recomputed")
+)
+
+
+def recalculate_ratings(
+    session: Session,
+    season: models.Season,
+    game_number: int,
+    since_date: datetime.datetime | None = None
+) -> bool:
+    """
+    Recalculate the season's ratings from game_number onward, or mark them
+    stale for the recompute worker if background recomputes are enabled.
+    Returns whether the recompute was deferred. Nothing is committed.
+    """
+    if BACKGROUND_RECOMPUTE:
+        recompute.mark_ratings_stale(session, season, game_number, since_date)
+        return True
+    rating.recalculate_timeseries_points(session, season, game_number, since_date=since_date)
+    return False
+
+
+def rate_new_games(
+    session: Session,
+    season: models.Season,
+    game_number: int,
+    num_games: int
+) -> bool:
+    """
+    Rate newly inserted games starting at game_number, given the number of
+    games before the insert. Appending games only rates the new games and
+    updates their players' season ratings, so only past-dated inserts are left
+    to the recompute worker.
+    Returns whether the recompute was deferred. Nothing is committed.
+    """
+    if game_number <= num_games:
+        return recalculate_ratings(session, season, game_number)
+    rating.recalculate_timeseries_points(session, season, game_number, appended=True)
+    return False
+
+
+def commit_game_change(session: Session, game_number: int, deferred: bool):
+    session.commit()
+    rating.rating_cache.invalidate(session, game_number)
+    if deferred:
+        recompute_worker.notify()
+
+
 @app.on_event("startup")
 def on_startup():
     db.create_db_and_tables()
-
-
-@app.post("/games/", response_model=models.GamePublic)
-def create_game(game: models.GameCreate):
+    with Session(db.engine) as session:
+        rating.backfill_player_season_ratings(session)
+        rating.backfill_game_ratings(session)
+        rating.backfill_daily_ratings(session)
+        rating.backfill_rating_checkpoints(session)
+        pair_stats.backfill_pair_stats(session)
+    # Finish recomputes left pending by a previous run
+    recompute_worker.run_pending()
+    if BACKGROUND_RECOMPUTE:
+        recompute_worker.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    recompute_worker.stop()
+
+
+def lock_season(session: Session, season_id: int | None) -> models.Season:
+    """
+    Lock the season's row until the commit. Game writers lock the season
+    before touching any game, the same order as the rating writers and the
+    recompute worker, which lock the season and then write timeseries points
+    referencing its games.
+    """
+    season = session.exec(
+        select(models.Season)
+        .where(models.Season.id == season_id)
+        .with_for_update()
+    ).first()
+    if season is None:
+        raise HTTPException(status_code=400, detail="Game has no season")
+    return season
+
+
+def lock_game(session: Session, game_id: int) -> tuple[models.Game, models.Season]:
+    """
+    Lock the game's season and then load the game, so its game number is read
+    after any concurrent write to the season committed. Raises a 404 if the
+    game doesn't exist.
+    """
+    game_row = session.exec(
+        select(models.Game.id, models.Game.season_id)
+        .where(models.Game.id == game_id)
+    ).first()
+    if game_row is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    season = lock_season(session, game_row.season_id)
+    db_game = session.get(models.Game, game_id, populate_existing=True)
+    if db_game is None or db_game.season_id != season.id:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return db_game, season
+
+
+def get_game_error(game: models.GameCreate) -> str | None:
     if game.black_score == game.yellow_score:
-        raise HTTPException(status_code=400, detail="Tie game")
+        return "Tie game"
     if game.black_score < 0 or game.yellow_score < 0:
-        raise HTTPException(status_code=400, detail="Invalid score")
+        return "Invalid score"
     if len(set([
         game.yellow_offense,
         game.yellow_defense,
         game.black_offense,
         game.black_defense
     ])) != 4:
-        raise HTTPException(status_code=400, detail="Invalid players")
+        return "Invalid players"
+    return None
+
+
+def get_game_date(iso_date: str) -> datetime.datetime:
+    return (
+        datetime.datetime.fromisoformat(iso_date)
+        .astimezone(PST)
+        .replace(hour=0, minute=0, second=0, microsecond=0)
+    )
 
-    with Session(db.engine) as session:
-        current_season = session.exec(
-            select(models.Season)
-            .where(models.Season.active)
-        ).first()
-        if not current_season or not current_season.id:
-            raise HTTPException(status_code=400, detail="No active season")
-
-        num_games = session.exec(
-            select(func.count(models.Game.id))
-        ).one()
-        game_date = (
-            datetime.datetime.fromisoformat(game.iso_date)
-            .astimezone(PST)
-            .replace(hour=0, minute=0, second=0, microsecond=0)
-        )
 
-        games_affected = []
-        today = datetime.datetime.now(PST).replace(hour=0, minute=0, second=0, microsecond=0)
-        # Insert game if it's in the past
+@app.post("/games/", response_model=models.GamePublic)
+def create_game(game: models.GameCreate, session: SessionDep):
+    error = get_game_error(game)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    current_season = session.exec(
+        select(models.Season)
+        .where(models.Season.active)
+        .with_for_update()
+    ).first()
+    if not current_season or not current_season.id:
+        raise HTTPException(status_code=400, detail="No active season")
+
+    num_games = session.exec(
+        select(func.count(models.Game.id))
+    ).one()
+    game_date = get_game_date(game.iso_date)
+
+    today = datetime.datetime.now(PST).replace(hour=0, minute=0, second=0, microsecond=0)
+    # Insert game if it's in the past
+    if num_games > 0 and game_date < today:
+        # Find the closest game with date earlier than game_date
+        closest_earlier_game = session.exec(
+            select(models.Game)
+            .where(models.Game.date <= game_date)
+            .order_by(desc(models.Game.game_number))
+            .limit(1)
+        ).first()
+        insert_game_number = closest_earlier_game.game_number + 1
+
+        # Bump game numbers
+        games.renumber_games(session, insert_game_number, None, 1)
+    else:
+        insert_game_number = num_games + 1
+
+    db_game = models.Game.model_validate(game, update={
+        "season_id": current_season.id,
+        "date": game_date,
+        "game_number": insert_game_number
+    })
+    session.add(db_game)
+    session.flush()
+    pair_stats.update_pair_stats(session, [db_game])
+
+    deferred = rate_new_games(session, current_season, insert_game_number, num_games)
+    commit_game_change(session, insert_game_number, deferred)
+    session.refresh(db_game)
+    publish_game_change(session, current_season.id, "game_created", [db_game.id])
+    return db_game
+
+
+@app.post("/games/batch/", response_model=list[models.GamePublic])
+def create_games(batch: list[models.GameCreate], session: SessionDep):
+    if not batch:
+        raise HTTPException(status_code=400, detail="No games")
+    if len(batch) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} games per batch")
+    for i, game in enumerate(batch):
+        error = get_game_error(game)
+        if error:
+            raise HTTPException(status_code=400, detail=f"Game {i}: {error}")
+
+    current_season = session.exec(
+        select(models.Season)
+        .where(models.Season.active)
+        .with_for_update()
+    ).first()
+    if not current_season or not current_season.id:
+        raise HTTPException(status_code=400, detail="No active season")
+
+    num_games = session.exec(
+        select(func.count(models.Game.id))
+    ).one()
+    game_dates = [get_game_date(game.iso_date) for game in batch]
+
+    # Past games go right after the last game on or before their date, like
+    # in create_game, everything else goes after the latest game
+    today = datetime.datetime.now(PST).replace(hour=0, minute=0, second=0, microsecond=0)
+    date_to_insert_game_number = {}
+    for game_date in set(game_dates):
         if num_games > 0 and game_date < today:
-            # Find the closest game with date earlier than game_date
-            closest_earlier_game = session.exec(
-                select(models.Game)
+            closest_earlier_game_number = session.exec(
+                select(func.max(models.Game.game_number))
                 .where(models.Game.date <= game_date)
-                .order_by(desc(models.Game.game_number))
-                .limit(1)
-            ).first()
-            insert_game_number = closest_earlier_game.game_number + 1
-
-            # Delete stale timeseries points
-            stale_timeseries_points = session.exec(
-                select(models.TimeSeries)
-                .join(models.Game)
-                .where(models.Game.game_number >= insert_game_number)
-            ).all()
-            for stale_timeseries_point in stale_timeseries_points:
-                session.delete(stale_timeseries_point)
-
-            # Bump game numbers
-            stale_games = session.exec(
-                select(models.Game)
-                .where(models.Game.game_number >= insert_game_number)
-                .order_by(desc(models.Game.game_number))
-            ).all()
-            if len(stale_games) > 0:
-                for stale_game in stale_games:
-                    stale_game.game_number += 1
-                    session.add(stale_game)
-                    session.commit()
-                    session.refresh(stale_game)
-                games_affected.extend(stale_games)
+            ).one()
+            date_to_insert_game_number[game_date] = (closest_earlier_game_number or 0) + 1
         else:
-            insert_game_number = num_games + 1
-
-        db_game = models.Game.model_validate(game, update={
+            date_to_insert_game_number[game_date] = num_games + 1
+
+    # Insert in date order, keeping the submission order within a day
+    insert_order = sorted(
+        range(len(batch)),
+        key=lambda i: (date_to_insert_game_number[game_dates[i]], game_dates[i], i)
+    )
+    insert_game_numbers = games.open_game_number_gaps(
+        session,
+        [date_to_insert_game_number[game_dates[i]] for i in insert_order]
+    )
+
+    index_to_game_number = dict(zip(insert_order, insert_game_numbers))
+    db_games = [
+        models.Game.model_validate(game, update={
             "season_id": current_season.id,
-            "date": game_date,
-            "game_number": insert_game_number
+            "date": game_dates[i],
+            "game_number": index_to_game_number[i]
         })
-        games_affected.append(db_game)
-        games_affected = games_affected[::-1]
-
-        session.add(db_game)
-        session.commit()
-
-        player_id_to_snapshot_rating = rating.get_player_ratings(
-            session,
-            current_season.id,
-            date=game_date,
-        )
-        timeseries_points = rating.calculate_timeseries_points(
-            games_affected,
-            player_id_to_snapshot_rating,
-            current_season.rating_method
-        )
-        session.add_all(timeseries_points)
-        session.commit()
+        for i, game in enumerate(batch)
+    ]
+    session.add_all(db_games)
+    session.flush()
+    pair_stats.update_pair_stats(session, db_games)
+
+    first_game_number = min(insert_game_numbers)
+    deferred = rate_new_games(session, current_season, first_game_number, num_games)
+    commit_game_change(session, first_game_number, deferred)
+    for db_game in db_games:
         session.refresh(db_game)
-        return db_game
+    publish_game_change(session, current_season.id, "games_created", [db_game.id for db_game in db_games])
+    return db_games
 
 
 @app.put("/games/")
-def update_game(game_id: int, game: models.GameCreate):
-    with Session(db.engine) as session:
-        db_game = session.exec(
-            select(models.Game)
-            .where(models.Game.id == game_id)
-        ).first()
-        if not db_game:
-            raise HTTPException(status_code=404, detail="Game not found")
-
-        db_game.date = (
-            datetime.datetime.fromisoformat(game.iso_date)
-            .astimezone(PST)
-            .replace(hour=0, minute=0, second=0, microsecond=0)
-        )
-        db_game.yellow_score = game.yellow_score
-        db_game.black_score = game.black_score
-        db_game.yellow_offense = game.yellow_offense
-        db_game.yellow_defense = game.yellow_defense
-        db_game.black_offense = game.black_offense
-        db_game.black_defense = game.black_defense
-        db_game.updated_at = datetime.datetime.now(PST)
-
-        session.add(db_game)
-        session.commit()
-        session.refresh(db_game)
-
-        # Delete stale timeseries points
-        stale_timeseries_points = session.exec(
-            select(models.TimeSeries)
-            .join(models.Game)
-            .where(
-                models.Game.game_number >= db_game.game_number,
-                models.Game.season_id == db_game.season_id
-            )
-        ).all()
-        for stale_timeseries_point in stale_timeseries_points:
-            session.delete(stale_timeseries_point)
-        session.commit()
-
-        # Recalculate timeseries points
-        affected_games = session.exec(
-            select(models.Game)
-            .where(
-                models.Game.game_number >= db_game.game_number,
-                models.Game.season_id == db_game.season_id
-            )
-        ).all()
-        player_id_to_snapshot_rating = rating.get_player_ratings(
-            session,
-            db_game.season_id,
-            game_number=db_game.game_number
-        )
-        timeseries_points = rating.calculate_timeseries_points(
-            sorted(affected_games, key=lambda g: g.game_number),
-            player_id_to_snapshot_rating,
-            db_game.season.rating_method
-        )
-        session.add_all(timeseries_points)
-        session.commit()
-        session.refresh(db_game)
-
-        return db_game
+def update_game(game_id: int, game: models.GameCreate, session: SessionDep):
+    db_game, season = lock_game(session, game_id)
+
+    # Uncount the game as it was and count it again once edited
+    pair_stats.update_pair_stats(session, [db_game], -1)
+    prev_date = db_game.date
+    db_game.date = get_game_date(game.iso_date)
+    db_game.yellow_score = game.yellow_score
+    db_game.black_score = game.black_score
+    db_game.yellow_offense = game.yellow_offense
+    db_game.yellow_defense = game.yellow_defense
+    db_game.black_offense = game.black_offense
+    db_game.black_defense = game.black_defense
+    db_game.updated_at = datetime.datetime.now(PST)
+    session.add(db_game)
+    session.flush()
+    pair_stats.update_pair_stats(session, [db_game])
+
+    deferred = recalculate_ratings(session, season, db_game.game_number, prev_date)
+    commit_game_change(session, db_game.game_number, deferred)
+    session.refresh(db_game)
+    publish_game_change(session, db_game.season_id, "game_updated", [db_game.id])
+
+    return db_game
 
 
 @app.put("/games/move/")
-def move_game(game_id: int, delta: int):
+def move_game(game_id: int, delta: int, session: SessionDep):
     if delta == 0:
         raise HTTPException(status_code=400, detail="Invalid delta")
 
-    with Session(db.engine) as session:
-        db_game = session.exec(
-            select(models.Game)
-            .where(models.Game.id == game_id)
-        ).first()
-        if not db_game:
-            raise HTTPException(status_code=404, detail="Game not found")
-
-        src_game_number = int(db_game.game_number)
-        dst_game_number = src_game_number + delta
-
-        # Delete stale timeseries points
-        stale_timeseries_points = session.exec(
-            select(models.TimeSeries)
-            .join(models.Game)
-            .where(
-                models.Game.game_number >= min(src_game_number, dst_game_number),
-                models.Game.season_id == db_game.season_id
-            )
-        ).all()
-        for stale_timeseries_point in stale_timeseries_points:
-            session.delete(stale_timeseries_point)
-        session.commit()
+    db_game, season = lock_game(session, game_id)
 
-        # Move games around
-        affected_games = session.exec(
-            select(models.Game)
-            .where(
-                models.Game.game_number >= min(src_game_number, dst_game_number),
-                models.Game.season_id == db_game.season_id
-            )
-        ).all()
-        # Isolate game getting moved
-        db_game.game_number = -1
-        session.add(db_game)
-        session.commit()
-        session.refresh(db_game)
+    src_game_number = int(db_game.game_number)
+    dst_game_number = src_game_number + delta
 
-        # Shift game numbers
-        shift_games = [
-            affected_game
-            for affected_game in affected_games
-            if affected_game.game_number != src_game_number
-            and affected_game.game_number >= min(src_game_number, dst_game_number)
-            and affected_game.game_number <= max(src_game_number, dst_game_number)
-        ]
-        for shift_game in shift_games:
-            shift_game.game_number += -1 if delta > 0 else 1
-            session.add(shift_game)
-            session.commit()
-            session.refresh(shift_game)
-        # Move src game
-        db_game.game_number = dst_game_number
-        session.add(db_game)
-        session.commit()
-        session.refresh(db_game)
+    # Shift the games between src and dst towards src and move src game
+    games.renumber_games(
+        session,
+        min(src_game_number, dst_game_number),
+        max(src_game_number, dst_game_number),
+        -1 if delta > 0 else 1,
+        game_id=db_game.id,
+        game_number=dst_game_number
+    )
 
-        # Recalculate timeseries points
-        current_season = session.exec(
-            select(models.Season)
-            .where(models.Season.active)
-        ).one()
-        player_id_to_snapshot_rating = rating.get_player_ratings(
-            session,
-            current_season.id,
-            game_number=db_game.game_number
-        )
-        timeseries_points = rating.calculate_timeseries_points(
-            sorted(affected_games, key=lambda g: g.game_number),
-            player_id_to_snapshot_rating,
-            current_season.rating_method
-        )
-        session.add_all(timeseries_points)
-        session.commit()
+    deferred = recalculate_ratings(session, season, min(src_game_number, dst_game_number))
+    commit_game_change(session, min(src_game_number, dst_game_number), deferred)
+    session.refresh(db_game)
+    publish_game_change(session, db_game.season_id, "game_moved", [db_game.id])
 
-        return db_game
+    return db_game
 
 
 @app.get("/games/", response_model=list[models.GameDeltaPublic])
-def read_games(season_id: int, offset: int = 0, limit: int = Query(default=20, le=100)):
-    with Session(db.engine) as session:
-        # Create aliases for the TimeSeries table for each player position
-        tyo = aliased(models.TimeSeries)
-        tyd = aliased(models.TimeSeries)
-        tbo = aliased(models.TimeSeries)
-        tbd = aliased(models.TimeSeries)
-
-        query = (
-            select(
-                models.Game,
-                tyo.rating.label("yellow_offense_rating"),
-                tyo.delta.label("yellow_offense_delta"),
-                tyd.rating.label("yellow_defense_rating"),
-                tyd.delta.label("yellow_defense_delta"),
-                tbo.rating.label("black_offense_rating"),
-                tbo.delta.label("black_offense_delta"),
-                tbd.rating.label("black_defense_rating"),
-                tbd.delta.label("black_defense_delta")
-            )
-            .join(
-                tyo,
-                (models.Game.id == tyo.game_id) &
-                (models.Game.yellow_offense == tyo.player_id)
-            )
-            .join(
-                tyd,
-                (models.Game.id == tyd.game_id) &
-                (models.Game.yellow_defense == tyd.player_id)
-            )
-            .join(
-                tbo,
-                (models.Game.id == tbo.game_id) &
-                (models.Game.black_offense == tbo.player_id)
-            )
-            .join(
-                tbd,
-                (models.Game.id == tbd.game_id) &
-                (models.Game.black_defense == tbd.player_id)
-            )
-            .where(models.Game.season_id == season_id)
-            .order_by(desc(col(models.Game.game_number)))
-            .limit(limit)
-            .offset(offset)
-        )
-        games = [
-            models.GameDeltaPublic.model_validate(
-                game,
-                update={
-                    "yellow_offense_rating": round(deltas[0]),
-                    "yellow_offense_delta": round(deltas[1]),
-                    "yellow_defense_rating": round(deltas[2]),
-                    "yellow_defense_delta": round(deltas[3]),
-                    "black_offense_rating": round(deltas[4]),
-                    "black_offense_delta": round(deltas[5]),
-                    "black_defense_rating": round(deltas[6]),
-                    "black_defense_delta": round(deltas[7])
-                }
-            )
-            for game, *deltas in session.exec(query).all()
-        ]
-        return games
+async def read_games(
+    request: Request,
+    session: AsyncSessionDep,
+    season_id: int,
+    offset: int = 0,
+    limit: int = Query(default=20, le=100),
+    before_game_number: int | None = None
+):
+    data_version = await get_data_version(session, season_id)
+    key = ("games", season_id, offset, limit, before_game_number, data_version)
+    etag, cached_response = get_cached_response(request, key)
+    if cached_response is not None:
+        return cached_response
+
+    query = (
+        select(models.Game, models.GameRating)
+        .join(models.GameRating)
+        .where(models.Game.season_id == season_id)
+        .order_by(desc(col(models.Game.game_number)))
+        .limit(limit)
+        .offset(offset)
+    )
+    # Keyset pagination through the (season_id, game_number) index
+    if before_game_number is not None:
+        query = query.where(col(models.Game.game_number) < before_game_number)
+    games = [
+        get_game_delta(game, game_rating)
+        for game, game_rating in (await session.exec(query)).all()
+    ]
+    headers = {}
+    if len(games) == limit:
+        headers["X-Next-Cursor"] = str(games[-1].game_number)
+    return await cache_json_response(session, season_id, data_version, key, etag, games, headers)
 
 
 @app.delete("/games/")
-def delete_game(game_id: int):
-    with Session(db.engine) as session:
-        db_game = session.exec(
-            select(models.Game)
-            .where(models.Game.id == game_id)
-        ).first()
-        if not db_game:
-            raise HTTPException(status_code=404, detail="Game not found")
-        # Delete the game and all associated timeseries points through cascade
-        session.delete(db_game)
-        session.commit()
-
-        affected_games = session.exec(
-            select(models.Game)
-            .where(
-                models.Game.game_number >= db_game.game_number,
-                models.Game.id != game_id
-            )
-        ).all()
-        # Shift game numbers
-        shift_games = [
-            affected_game
-            for affected_game in affected_games
-            if affected_game.game_number != db_game.game_number
-            and affected_game.game_number >= db_game.game_number
-        ]
-        for shift_game in shift_games:
-            shift_game.game_number -= 1
-            session.add(shift_game)
-            session.commit()
-            session.refresh(shift_game)
-
-        # Delete stale timeseries points
-        stale_timeseries_points = session.exec(
-            select(models.TimeSeries)
-            .join(models.Game)
-            .where(
-                models.Game.game_number >= db_game.game_number,
-                models.Game.season_id == db_game.season_id,
-                models.Game.id != game_id
-            )
-        ).all()
-        for stale_timeseries_point in stale_timeseries_points:
-            session.delete(stale_timeseries_point)
-        session.commit()
-
-        # Recalculate timeseries points
-        games_to_recalculate = [
-            affected_game
-            for affected_game in affected_games
-            if affected_game.game_number != db_game.game_number
-            and affected_game.season_id == db_game.season_id
-        ]
-        player_id_to_snapshot_rating = rating.get_player_ratings(
-            session,
-            db_game.season_id,
-            game_number=db_game.game_number
-        )
-        curr_season = session.exec(
-            select(models.Season)
-            .where(models.Season.active)
-        ).one()
-        timeseries_points = rating.calculate_timeseries_points(
-            sorted(games_to_recalculate, key=lambda g: g.game_number),
-            player_id_to_snapshot_rating,
-            curr_season.rating_method
-        )
-        session.add_all(timeseries_points)
-        session.commit()
+def delete_game(game_id: int, session: SessionDep):
+    db_game, season = lock_game(session, game_id)
+    game_number = int(db_game.game_number)
+    game_date = db_game.date
+    pair_stats.update_pair_stats(session, [db_game], -1)
+
+    # Delete the game and all associated timeseries points
+    session.execute(
+        delete(models.TimeSeries)
+        .where(models.TimeSeries.game_id == game_id)
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        delete(models.GameRating)
+        .where(models.GameRating.game_id == game_id)
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        delete(models.RatingCheckpoint)
+        .where(models.RatingCheckpoint.game_id == game_id)
+        .execution_options(synchronize_session=False)
+    )
+    session.delete(db_game)
+    session.flush()
+
+    # Close the gap left by the game
+    games.renumber_games(session, game_number + 1, None, -1)
+
+    deferred = recalculate_ratings(session, season, game_number, game_date)
+    commit_game_change(session, game_number, deferred)
+    publish_game_change(session, season.id, "game_deleted", removed_game_ids=[game_id])
 
-        return {"ok": True}
+    return {"ok": True}
 
 
 @app.post("/players/recolor/")
-def recolor_players():
-    with Session(db.engine) as session:
-        players = session.exec(select(models.Player)).all()
-        for p in players:
-            p.color = color.get_random_dark_color()
-            session.add(p)
-        session.commit()
-        return {"ok": True}
+def recolor_players(session: SessionDep):
+    players = session.exec(select(models.Player)).all()
+    for p in players:
+        p.color = color.get_random_dark_color()
+        session.add(p)
+    # Player colors are part of the season responses
+    rating.bump_data_version(session)
+    session.commit()
+    return {"ok": True}
 
 
 @app.get("/players/", response_model=list[models.PlayerPublic])
-def read_players():
-    with Session(db.engine) as session:
-        players = session.exec(
-            select(models.Player)
-            .order_by(models.Player.name)
-        ).all()
-        return players
+async def read_players(session: AsyncSessionDep):
+    players = (await session.exec(
+        select(models.Player)
+        .order_by(models.Player.name)
+    )).all()
+    return players
 
 
 @app.get("/players/stats/", response_model=list[models.RatedPlayerPublic])
-def read_player_stats(season_id: int):
-    with Session(db.engine) as session:
-        player_to_stats = rating.get_player_stats(session, season_id)
-        rated_players = [
-            models.RatedPlayerPublic.model_validate(
-                p,
-                update={
-                    "rating": round(stats.rating),
-                    "probationary": stats.num_games < 10,
-                    "win_rate": round(100 * stats.win_rate, 2)
-                }
+async def read_player_stats(
+    request: Request,
+    season_id: int,
+    session: AsyncSessionDep,
+    as_of_game: int | None = None,
+    as_of_date: datetime.date | None = None
+):
+    data_version = await get_data_version(session, season_id)
+    key = ("players/stats", season_id, as_of_game, as_of_date, data_version)
+    etag, cached_response = get_cached_response(request, key)
+    if cached_response is not None:
+        return cached_response
+
+    if as_of_game is None and as_of_date is None:
+        player_to_stats = await session.run_sync(rating.get_player_stats, season_id)
+    else:
+        # Historical leaderboard after the given game or at the end of the
+        # given day, whichever comes first
+        player_to_stats = await session.run_sync(
+            lambda sync_session: rating.get_player_stats_as_of(
+                sync_session,
+                season_id,
+                game_number=as_of_game,
+                date=datetime.datetime.combine(as_of_date, datetime.time(), tzinfo=PST)
+                if as_of_date is not None else None
             )
-            for p, stats in player_to_stats.items()
-        ]
-        return rated_players
+        )
+    rated_players = [
+        models.RatedPlayerPublic.model_validate(
+            p,
+            update={
+                "rating": round(stats.rating),
+                "probationary": stats.num_games < 10,
+                "win_rate": round(100 * stats.win_rate, 2)
+            }
+        )
+        for p, stats in player_to_stats.items()
+    ]
+    return await cache_json_response(session, season_id, data_version, key, etag, rated_players)
+
+
+def get_win_rate(num_games: int, num_wins: int) -> float:
+    return round(100 * num_wins / num_games, 2) if num_games else 0
+
+
+def get_pair_stats_public(
+    player_id_to_counts: dict[str, list[int]]
+) -> list[models.PairStatsPublic]:
+    """
+    Get the (num_games, num_wins) records with each player from best to worst
+    win rate, ties broken by number of games.
+    """
+    pairs = [
+        models.PairStatsPublic(
+            player_id=player_id,
+            num_games=num_games,
+            num_wins=num_wins,
+            win_rate=get_win_rate(num_games, num_wins)
+        )
+        for player_id, (num_games, num_wins) in player_id_to_counts.items()
+    ]
+    return sorted(pairs, key=lambda pair: (-pair.win_rate, -pair.num_games, pair.player_id))
+
+
+@app.get("/players/matchups/", response_model=models.PlayerMatchupsPublic)
+async def read_player_matchups(
+    request: Request,
+    season_id: int,
+    player_id: str,
+    session: AsyncSessionDep
+):
+    data_version = await get_data_version(session, season_id)
+    key = ("players/matchups", season_id, player_id, data_version)
+    etag, cached_response = get_cached_response(request, key)
+    if cached_response is not None:
+        return cached_response
+
+    pair_rows = await session.run_sync(pair_stats.get_player_pair_stats, season_id, player_id)
+    position_to_counts: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0])
+    relation_to_counts: defaultdict[str, defaultdict[str, list[int]]] = defaultdict(
+        lambda: defaultdict(lambda: [0, 0])
+    )
+    for pair_row in pair_rows:
+        counts = relation_to_counts[pair_row.relation][pair_row.other_player_id]
+        counts[0] += pair_row.num_games
+        counts[1] += pair_row.num_wins
+        # Every game has exactly one partner
+        if pair_row.relation == "partner":
+            position_to_counts[pair_row.position][0] += pair_row.num_games
+            position_to_counts[pair_row.position][1] += pair_row.num_wins
+
+    matchups = models.PlayerMatchupsPublic(
+        player_id=player_id,
+        positions=[
+            models.PositionStatsPublic(
+                position=position,
+                num_games=num_games,
+                num_wins=num_wins,
+                win_rate=get_win_rate(num_games, num_wins)
+            )
+            for position in ["offense", "defense"]
+            for num_games, num_wins in [position_to_counts[position]]
+        ],
+        partners=get_pair_stats_public(relation_to_counts["partner"]),
+        opponents=get_pair_stats_public(relation_to_counts["opponent"])
+    )
+    return await cache_json_response(session, season_id, data_version, key, etag, matchups)
+
+
+@app.get("/players/head-to-head/", response_model=models.HeadToHeadPublic)
+async def read_head_to_head(
+    request: Request,
+    season_id: int,
+    player_id: str,
+    other_player_id: str,
+    session: AsyncSessionDep
+):
+    data_version = await get_data_version(session, season_id)
+    key = ("players/head-to-head", season_id, player_id, other_player_id, data_version)
+    etag, cached_response = get_cached_response(request, key)
+    if cached_response is not None:
+        return cached_response
+
+    pair_rows = await session.run_sync(
+        pair_stats.get_player_pair_stats,
+        season_id,
+        player_id,
+        other_player_id
+    )
+    relation_to_counts = {"partner": [0, 0], "opponent": [0, 0]}
+    for pair_row in pair_rows:
+        relation_to_counts[pair_row.relation][0] += pair_row.num_games
+        relation_to_counts[pair_row.relation][1] += pair_row.num_wins
+
+    [against] = get_pair_stats_public({other_player_id: relation_to_counts["opponent"]})
+    [together] = get_pair_stats_public({other_player_id: relation_to_counts["partner"]})
+    head_to_head = models.HeadToHeadPublic(
+        player_id=player_id,
+        other_player_id=other_player_id,
+        against=against,
+        together=together
+    )
+    return await cache_json_response(session, season_id, data_version, key, etag, head_to_head)
 
 
 @app.post("/players/", response_model=models.PlayerPublic)
-def add_player(player: models.PlayerCreate):
-    with Session(db.engine) as session:
-        player_db = models.Player.model_validate(player, update={
-            "id": player.name.lower().replace(" ", "_"),
-            "color": color.get_random_dark_color()
-        })
-        session.add(player_db)
-        session.commit()
-        session.refresh(player_db)
-        return player_db
+def add_player(player: models.PlayerCreate, session: SessionDep):
+    player_db = models.Player.model_validate(player, update={
+        "id": player.name.lower().replace(" ", "_"),
+        "color": color.get_random_dark_color()
+    })
+    session.add(player_db)
+    session.commit()
+    session.refresh(player_db)
+    return player_db
 
 
 @app.get("/timeseries/day/", response_model=list[dict[str, Any]])
-def read_ratings(season_id: int):
-    with Session(db.engine) as session:
-        eod_timeseries_query = (
-            select(
-                models.Game.date,
-                models.TimeSeries.player_id,
-                models.Player.name,
-                models.TimeSeries.rating
-            )
-            .join(models.TimeSeries, models.TimeSeries.game_id == models.Game.id)
-            .join(models.Player, models.TimeSeries.player_id == models.Player.id)
-            .where(models.Game.season_id == season_id)
-            .order_by(
-                models.TimeSeries.player_id,
-                desc(models.Game.date),
-                desc(models.Game.game_number)
-            )
-            .prefix_with(
-                f"DISTINCT ON ({models.TimeSeries.player_id}, {models.Game.date})"
-            )
+async def read_ratings(request: Request, season_id: int, session: AsyncSessionDep):
+    data_version = await get_data_version(session, season_id)
+    key = ("timeseries/day", season_id, data_version)
+    etag, cached_response = get_cached_response(request, key)
+    if cached_response is not None:
+        return cached_response
+
+    eod_timeseries_query = (
+        select(
+            models.DailyRating.date,
+            models.DailyRating.player_id,
+            models.Player.name,
+            models.DailyRating.rating
         )
-        timeseries = session.exec(eod_timeseries_query).all()
-        timeseries_points = [models.MinimalTimeSeriesPoint(*ts) for ts in timeseries]
-
-        # Group player rating snapshots by date
-        date_to_timeseries_points: defaultdict[
-            datetime.datetime,
-            list[models.MinimalTimeSeriesPoint]
-        ] = defaultdict(list)
-        for t in timeseries_points:
-            date_to_timeseries_points[t.date].append(t)
-
-        # Generate graph timeseries output format with rating deltas
-        player_id_to_prev_rating = {}
-        timeseries_results = []
-        chronological_timeseries = sorted(
-            list(date_to_timeseries_points.items()),
-            key=lambda dated_timeseries: dated_timeseries[0]
+        .join(models.Player)
+        .where(models.DailyRating.season_id == season_id)
+        .order_by(models.DailyRating.date)
+    )
+    timeseries = (await session.exec(eod_timeseries_query)).all()
+    timeseries_points = [models.MinimalTimeSeriesPoint(*ts) for ts in timeseries]
+
+    # Group player rating snapshots by date
+    date_to_timeseries_points: defaultdict[
+        datetime.datetime,
+        list[models.MinimalTimeSeriesPoint]
+    ] = defaultdict(list)
+    for t in timeseries_points:
+        date_to_timeseries_points[t.date].append(t)
+
+    # Generate graph timeseries output format with rating deltas
+    player_id_to_prev_rating = {}
+    timeseries_results = []
+    for date, timeseries_points in date_to_timeseries_points.items():
+        timeseries_result: dict[str, Any] = {"date": date}
+        for tp in timeseries_points:
+            timeseries_result[tp.name] = round(tp.rating)
+
+            prev_rating = player_id_to_prev_rating.get(tp.player_id, 500)
+            timeseries_result[f"{tp.name}_delta"] = round(tp.rating - prev_rating)
+
+            player_id_to_prev_rating[tp.player_id] = timeseries_result[tp.name]
+        timeseries_results.append(timeseries_result)
+
+    return await cache_json_response(session, season_id, data_version, key, etag, timeseries_results)
+
+
+def get_match_predictions_public(
+    player_ids: list[str],
+    predictions: predict.MatchPredictions,
+    indices: np.ndarray
+) -> list[models.MatchPredictionPublic]:
+    return [
+        models.MatchPredictionPublic(
+            yellow_offense=player_ids[yellow_offense],
+            yellow_defense=player_ids[yellow_defense],
+            black_offense=player_ids[black_offense],
+            black_defense=player_ids[black_defense],
+            yellow_rating=round(float(predictions.yellow_ratings[i])),
+            black_rating=round(float(predictions.black_ratings[i])),
+            yellow_win_probability=round(float(predictions.yellow_win_probabilities[i]), 4),
+            yellow_score=round(float(predictions.yellow_scores[i]), 1),
+            black_score=round(float(predictions.black_scores[i]), 1)
         )
-        for date, timeseries_points in chronological_timeseries:
-            timeseries_result: dict[str, Any] = {"date": date}
-            for tp in timeseries_points:
-                timeseries_result[tp.name] = round(tp.rating)
-
-                prev_rating = player_id_to_prev_rating.get(tp.player_id, 500)
-                timeseries_result[f"{tp.name}_delta"] = round(tp.rating - prev_rating)
-
-                player_id_to_prev_rating[tp.player_id] = timeseries_result[tp.name]
-            timeseries_results.append(timeseries_result)
+        for i in indices.tolist()
+        for yellow_offense, yellow_defense, black_offense, black_defense in [predictions.matches[i].tolist()]
+    ]
+
+
+async def get_prediction_scale(session: AsyncSession, season_id: int) -> float:
+    """
+    Get the season's prediction scale from its rating method, or raise a 404
+    if there is no such season.
+    """
+    rating_method = (await session.exec(
+        select(models.Season.rating_method)
+        .where(models.Season.id == season_id)
+    )).first()
+    if rating_method is None:
+        raise HTTPException(status_code=404, detail="Season not found")
+    return predict.get_prediction_scale(rating_method)
+
+
+async def get_player_rating_array(
+    session: AsyncSession,
+    season_id: int,
+    player_ids: list[str]
+) -> np.ndarray:
+    """
+    Get the season ratings of the given players, in order, or raise a 400 if
+    any of them is not a player. Players without a game in the season get
+    the base rating.
+    """
+    known_player_ids = set((await session.exec(
+        select(models.Player.id)
+        .where(col(models.Player.id).in_(player_ids))
+    )).all())
+    unknown_player_ids = [player_id for player_id in player_ids if player_id not in known_player_ids]
+    if unknown_player_ids:
+        raise HTTPException(status_code=400, detail=f"Unknown players: {', '.join(unknown_player_ids)}")
+
+    # Read the materialized ratings directly rather than through the rating
+    # cache, whose thread locks must not be waited on from the event loop
+    player_id_to_rating = dict((await session.exec(
+        select(models.PlayerSeasonRating.player_id, models.PlayerSeasonRating.rating)
+        .where(
+            models.PlayerSeasonRating.season_id == season_id,
+            col(models.PlayerSeasonRating.player_id).in_(player_ids)
+        )
+    )).all())
+    return np.array([player_id_to_rating.get(player_id, rating.BASE_RATING) for player_id in player_ids])
+
+
+@app.get("/predict/", response_model=models.MatchPredictionPublic)
+async def predict_match(
+    season_id: int,
+    yellow_offense: str,
+    yellow_defense: str,
+    black_offense: str,
+    black_defense: str,
+    session: AsyncSessionDep
+):
+    player_ids = [yellow_offense, yellow_defense, black_offense, black_defense]
+    if len(set(player_ids)) != 4:
+        raise HTTPException(status_code=400, detail="Invalid players")
 
-        return timeseries_results
+    scale = await get_prediction_scale(session, season_id)
+    ratings = await get_player_rating_array(session, season_id, player_ids)
+    predictions = predict.MatchPredictions(ratings, np.array([[0, 1, 2, 3]]), scale=scale)
+    [prediction] = get_match_predictions_public(player_ids, predictions, np.arange(1))
+    return prediction
+
+
+@app.get("/matchmake/", response_model=list[models.MatchPredictionPublic])
+async def matchmake(
+    season_id: int,
+    session: AsyncSessionDep,
+    player_ids: list[str] = Query(),
+    limit: int = Query(default=5, ge=1, le=100)
+):
+    """
+    Get the most balanced 2v2 matches between the given players, closest to
+    even odds first. Every match is scored at once over a precomputed table
+    of the possible splits.
+    """
+    player_ids = list(dict.fromkeys(player_ids))
+    if len(player_ids) < 4:
+        raise HTTPException(status_code=400, detail="At least 4 players needed")
+    if len(player_ids) > MAX_MATCHMAKING_PLAYERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MATCHMAKING_PLAYERS} players")
+
+    scale = await get_prediction_scale(session, season_id)
+    ratings = await get_player_rating_array(session, season_id, player_ids)
+    predictions = predict.MatchPredictions(
+        ratings,
+        predict.get_team_splits(len(player_ids)),
+        scale=scale
+    )
+    return get_match_predictions_public(player_ids, predictions, predictions.most_balanced(limit))
+
+
+@app.get("/events/")
+async def stream_events(season_id: int):
+    """
+    Stream the season's changes as Server-Sent Events. `update` events carry
+    the changed games and the new rating and delta of every player whose
+    rating changed. `refresh` events mean changes were missed, e.g. made by
+    another process, and the client should refetch the season.
+    """
+    async with AsyncSession(db.get_async_engine()) as session:
+        data_version = await get_data_version(session, season_id)
+        player_id_to_rating = dict((await session.exec(
+            select(models.PlayerSeasonRating.player_id, models.PlayerSeasonRating.rating)
+            .where(models.PlayerSeasonRating.season_id == season_id)
+        )).all())
+    subscription = live_updates.subscribe(season_id, player_id_to_rating)
+
+    async def event_stream() -> AsyncGenerator[str, None]:
+        nonlocal data_version
+        try:
+            yield f"retry: {EVENTS_RETRY_MILLISECONDS}\n\n"
+            while True:
+                try:
+                    event_data_version, data = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        EVENTS_KEEPALIVE_SECONDS
+                    )
+                except TimeoutError:
+                    async with AsyncSession(db.get_async_engine()) as session:
+                        latest_data_version = await get_data_version(session, season_id)
+                    if latest_data_version != data_version:
+                        data_version = latest_data_version
+                        yield f"event: refresh\ndata: {data_version}\n\n"
+                    else:
+                        yield ": keepalive\n\n"
+                    continue
+
+                if subscription.overflowed:
+                    while not subscription.queue.empty():
+                        event_data_version, _ = subscription.queue.get_nowait()
+                    subscription.overflowed = False
+                    data_version = event_data_version
+                    yield f"event: refresh\ndata: {data_version}\n\n"
+                    continue
+                data_version = event_data_version
+                yield f"event: update\ndata: {data}\n\n"
+        finally:
+            live_updates.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/metrics")
+async def read_metrics():
+    session_stats = db.session_metrics.snapshot()
+    content = request_metrics.render([
+        ("foos_db_sessions_total", "counter", session_stats["num_sessions"]),
+        ("foos_db_session_errors_total", "counter", session_stats["num_errors"]),
+        ("foos_db_session_seconds_total", "counter", session_stats["total_seconds"]),
+        ("foos_db_session_max_seconds", "gauge", session_stats["max_seconds"])
+    ])
+    return Response(content=content, media_type="text/plain; version=0.0.4")
 
 
 @app.get("/seasons/current", response_model=models.Season)
-def get_current_season():
-    with Session(db.engine) as session:
-        return session.exec(select(models.Season).where(models.Season.active)).one()
+def get_current_season(session: SessionDep):
+    return session.exec(select(models.Season).where(models.Season.active)).one()
 
 
 @app.get("/")
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+import pytest
+
+
+# foos.database needs a DB url at import time. Tests run against a temporary
+# SQLite database shared by the sync and async engines, never against the
+# database configured for the service.
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["DB_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["ASYNC_DB_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ.setdefault("SHARED_SECRET", "secret")
+os.environ.setdefault("ORIGINS", "*")
+
+
+@pytest.fixture
+def database():
+    """
+    Create every table for the test and drop them afterwards, along with
+    the in-process caches keyed on data versions that start over.
+    """
+    from sqlalchemy import event
+    from sqlmodel import SQLModel
+
+    import service
+    from foos import database as db, rating
+    from foos.database import models
+
+    # SQLite drops the time zone of stored dates, which are stored as PST
+    def restore_time_zone(game: models.Game, *args):
+        date = game.__dict__.get("date")
+        if date is not None and date.tzinfo is None:
+            game.__dict__["date"] = date.replace(tzinfo=service.PST)
+
+    event.listen(models.Game, "load", restore_time_zone)
+    event.listen(models.Game, "refresh", restore_time_zone)
+    db.create_db_and_tables()
+    yield db
+    SQLModel.metadata.drop_all(db.engine)
+    event.remove(models.Game, "load", restore_time_zone)
+    event.remove(models.Game, "refresh", restore_time_zone)
+    rating.rating_cache.clear()
+    service.response_cache.clear()
+
+
+@pytest.fixture
+def client(database):
+    from fastapi.testclient import TestClient
+
+    import service
+
+    return TestClient(service.app, headers={"X-Auth-Token": os.environ["SHARED_SECRET"]})
+
+
+@pytest.fixture
+def season_client(database, client):
+    """
+    Client of a database with an active season 1 and six players, ann to fay.
+    """
+    import datetime
+
+    from sqlmodel import Session
+
+    from foos.database import models
+
+    with Session(database.engine) as session:
+        session.add(models.Season(
+            id=1,
+            name="1",
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 12, 31),
+            rating_method="sigmoid_differential",
+            active=True
+        ))
+        session.commit()
+    for name in ["Ann", "Bob", "Cat", "Dan", "Eve", "Fay"]:
+        assert client.post("/players/", json={"name": name}).status_code == 200
+    return client
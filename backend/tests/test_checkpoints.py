@@ -0,0 +1,114 @@
+import datetime
+from itertools import combinations
+
+import numpy as np
+from sqlmodel import Session, select
+
+from foos.database import models
+from foos.rating.checkpoints import CHECKPOINT_INTERVAL, get_checkpoint_ratings
+from foos.rating.replay import replay_games
+
+
+PLAYER_IDS = ["ann", "bob", "cat", "dan", "eve", "fay"]
+
+
+def get_games(num_games: int, first_day: int = 0) -> list[dict]:
+    """
+    Get num_games games, three a day from 2025-01-01 plus first_day, cycling
+    through every lineup of four players.
+    """
+    lineups = list(combinations(PLAYER_IDS, 4))
+    games = []
+    for i in range(first_day * 3, first_day * 3 + num_games):
+        yellow_offense, yellow_defense, black_offense, black_defense = lineups[i % len(lineups)]
+        date = datetime.date(2025, 1, 1) + datetime.timedelta(days=i // 3)
+        games.append({
+            "yellow_offense": yellow_offense,
+            "yellow_defense": yellow_defense,
+            "black_offense": black_offense,
+            "black_defense": black_defense,
+            "yellow_score": 10 if i % 3 else i % 10,
+            "black_score": i % 10 if i % 3 else 10,
+            "iso_date": f"{date.isoformat()}T20:00:00+00:00"
+        })
+    return games
+
+
+def get_season_games(session: Session) -> list[models.Game]:
+    return list(session.exec(
+        select(models.Game)
+        .where(models.Game.season_id == 1)
+        .order_by(models.Game.game_number)
+    ).all())
+
+
+def check_checkpoint_ratings(database):
+    """
+    Check the ratings rebuilt from the checkpoints against a replay of the
+    season's games up to each game number around the checkpoints, and the
+    stored checkpoints against the replayed stats.
+    """
+    with Session(database.engine) as session:
+        games = get_season_games(session)
+        num_games = len(games)
+        game_numbers = {0, 1, num_games - 1, num_games}
+        for checkpoint_game_number in range(CHECKPOINT_INTERVAL, num_games + 1, CHECKPOINT_INTERVAL):
+            game_numbers |= {checkpoint_game_number - 1, checkpoint_game_number, checkpoint_game_number + 1}
+        for game_number in sorted(game_numbers):
+            expected = replay_games(games[:game_number], {}, "sigmoid_differential").player_id_to_rating()
+            last_game_number, player_id_to_rating = get_checkpoint_ratings(session, 1, game_number)
+            assert last_game_number == game_number
+            assert player_id_to_rating.keys() == expected.keys()
+            for player_id, player_rating in player_id_to_rating.items():
+                assert np.isclose(player_rating, expected[player_id])
+
+        expected_checkpoints = {}
+        stats = {}
+        for row in replay_games(games, {}, "sigmoid_differential").to_timeseries_rows():
+            _, player_num_games, player_num_wins = stats.get(row["player_id"], (0.0, 0, 0))
+            stats[row["player_id"]] = (row["rating"], player_num_games + 1, player_num_wins + row["win"])
+            if row["game_number"] % CHECKPOINT_INTERVAL == 0:
+                expected_checkpoints[row["game_id"]] = dict(stats)
+        checkpoints = {}
+        for checkpoint in session.exec(select(models.RatingCheckpoint)).all():
+            checkpoints.setdefault(checkpoint.game_id, {})[checkpoint.player_id] = (
+                checkpoint.rating,
+                checkpoint.num_games,
+                checkpoint.num_wins
+            )
+        assert checkpoints.keys() == expected_checkpoints.keys()
+        for game_id, player_id_to_stats in checkpoints.items():
+            assert player_id_to_stats.keys() == expected_checkpoints[game_id].keys()
+            for player_id, (player_rating, num_games, num_wins) in player_id_to_stats.items():
+                expected_rating, expected_num_games, expected_num_wins = expected_checkpoints[game_id][player_id]
+                assert np.isclose(player_rating, expected_rating)
+                assert (num_games, num_wins) == (expected_num_games, expected_num_wins)
+
+
+def test_checkpoint_ratings_match_full_replay(database, season_client):
+    client = season_client
+    for batch in [get_games(100), get_games(30, first_day=40)]:
+        response = client.post("/games/batch/", json=batch)
+        assert response.status_code == 200, response.text
+    check_checkpoint_ratings(database)
+
+    # Inserting an early game shifts every checkpoint by one game
+    response = client.post("/games/", json=get_games(1, first_day=2)[0])
+    assert response.status_code == 200, response.text
+    check_checkpoint_ratings(database)
+
+    # Deleting an early game shifts them back
+    with Session(database.engine) as session:
+        game_id = get_season_games(session)[10].id
+    assert client.delete("/games/", params={"game_id": game_id}).status_code == 200
+    check_checkpoint_ratings(database)
+
+    # Deleting a game right before a checkpoint drops it
+    with Session(database.engine) as session:
+        num_games = len(get_season_games(session))
+    assert num_games == 130
+    for _ in range(num_games % CHECKPOINT_INTERVAL + 1):
+        with Session(database.engine) as session:
+            game_id = get_season_games(session)[-1].id
+        assert client.delete("/games/", params={"game_id": game_id}).status_code == 200
+    check_checkpoint_ratings(database)
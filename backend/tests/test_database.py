@@ -0,0 +1,13 @@
+import pytest
+
+from foos.database import get_async_db_url
+
+
+@pytest.mark.parametrize("db_url, expected", [
+    ("postgresql://user:pw@host/foos", "postgresql+asyncpg://user:pw@host/foos"),
+    ("postgresql://user:pw@host/foos?sslmode=require&channel_binding=require", "postgresql+asyncpg://user:pw@host/foos?ssl=require"),
+    ("sqlite:///foos.db", "sqlite+aiosqlite:///foos.db"),
+    ("sqlite://", "sqlite+aiosqlite://")
+])
+def test_async_db_url(db_url: str, expected: str):
+    assert get_async_db_url(db_url).render_as_string(hide_password=False) == expected
@@ -0,0 +1,49 @@
+import pytest
+
+from service import etag_matches
+
+
+ETAG = '"0123abcd"'
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ("", False),
+    ('"0123abcd"', True),
+    ('W/"0123abcd"', True),
+    ('"ffff", W/"0123abcd"', True),
+    ('"ffff","0123abcd"', True),
+    ("*", True),
+    ('"0123abc"', False),
+    ('"ffff", W/"eeee"', False)
+])
+def test_etag_matches(if_none_match: str | None, expected: bool):
+    assert etag_matches(if_none_match, ETAG) == expected
+
+
+def test_responses_read_across_a_write_are_not_cached(monkeypatch, season_client):
+    import service
+
+    client = season_client
+    get_data_version = service.get_data_version
+    num_calls = 0
+
+    # The first read of the data version misses a write committed right after
+    async def get_stale_data_version(session, season_id):
+        nonlocal num_calls
+        num_calls += 1
+        data_version = await get_data_version(session, season_id)
+        return data_version - 1 if num_calls == 1 else data_version
+
+    monkeypatch.setattr(service, "get_data_version", get_stale_data_version)
+    response = client.get("/players/stats/", params={"season_id": 1})
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    assert len(service.response_cache) == 0
+
+    response = client.get("/players/stats/", params={"season_id": 1})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert len(service.response_cache) == 1
+    response = client.get("/players/stats/", params={"season_id": 1}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
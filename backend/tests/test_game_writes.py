@@ -0,0 +1,146 @@
+import random
+
+import numpy as np
+import pytest
+from sqlmodel import Session, select
+
+from foos.database import models
+from foos.rating.replay import replay_games
+
+
+PLAYER_IDS = ["ann", "bob", "cat", "dan", "eve", "fay"]
+
+
+def get_game(rng: random.Random, day: int) -> dict:
+    yellow_offense, yellow_defense, black_offense, black_defense = rng.sample(PLAYER_IDS, 4)
+    loser_score = rng.randrange(10)
+    yellow_score, black_score = (10, loser_score) if rng.random() < 0.5 else (loser_score, 10)
+    return {
+        "yellow_offense": yellow_offense,
+        "yellow_defense": yellow_defense,
+        "black_offense": black_offense,
+        "black_defense": black_defense,
+        "yellow_score": yellow_score,
+        "black_score": black_score,
+        "iso_date": f"2025-01-{day:02d}T20:00:00+00:00"
+    }
+
+
+def get_game_ids(client) -> list[int]:
+    """
+    Get the season's game IDs in game number order.
+    """
+    games = client.get("/games/", params={"season_id": 1, "limit": 100}).json()
+    return [game["id"] for game in sorted(games, key=lambda game: game["game_number"])]
+
+
+def check_ratings(database):
+    """
+    Check that the game numbers are contiguous, the games are in date order
+    and the stored timeseries points and season ratings match a full replay
+    of the season.
+    """
+    with Session(database.engine) as session:
+        games = list(session.exec(
+            select(models.Game)
+            .where(models.Game.season_id == 1)
+            .order_by(models.Game.game_number)
+        ).all())
+        assert [game.game_number for game in games] == list(range(1, len(games) + 1))
+        assert [game.date for game in games] == sorted(game.date for game in games)
+
+        result = replay_games(games, {}, "sigmoid_differential")
+        expected_rows = {
+            (row["game_id"], row["player_id"]): row
+            for row in result.to_timeseries_rows()
+        }
+        timeseries = session.exec(select(models.TimeSeries)).all()
+        assert len(timeseries) == len(expected_rows)
+        for point in timeseries:
+            expected_row = expected_rows[(point.game_id, point.player_id)]
+            assert point.season_id == expected_row["season_id"]
+            assert point.game_number == expected_row["game_number"]
+            assert point.win == expected_row["win"]
+            assert np.isclose(point.rating, expected_row["rating"])
+            assert np.isclose(point.delta, expected_row["delta"])
+
+        expected_stats = {}
+        for row in result.to_timeseries_rows():
+            _, num_games, num_wins = expected_stats.get(row["player_id"], (0.0, 0, 0))
+            expected_stats[row["player_id"]] = (row["rating"], num_games + 1, num_wins + row["win"])
+        season_ratings = session.exec(
+            select(models.PlayerSeasonRating)
+            .where(models.PlayerSeasonRating.season_id == 1)
+        ).all()
+        assert {season_rating.player_id for season_rating in season_ratings} == expected_stats.keys()
+        for season_rating in season_ratings:
+            player_rating, num_games, num_wins = expected_stats[season_rating.player_id]
+            assert np.isclose(season_rating.rating, player_rating)
+            assert (season_rating.num_games, season_rating.num_wins) == (num_games, num_wins)
+
+
+def test_game_writes_match_full_replay(database, season_client):
+    client = season_client
+    rng = random.Random(0)
+
+    # Append
+    for day in [1, 3, 5, 5, 8, 10]:
+        assert client.post("/games/", json=get_game(rng, day)).status_code == 200
+        check_ratings(database)
+
+    # Insert past games
+    for day in [2, 5, 9]:
+        assert client.post("/games/", json=get_game(rng, day)).status_code == 200
+        check_ratings(database)
+
+    # Batch of past and appended games, opening several gaps at once
+    batch = [get_game(rng, day) for day in [4, 1, 6, 4, 12, 2]]
+    response = client.post("/games/batch/", json=batch)
+    assert response.status_code == 200, response.text
+    check_ratings(database)
+
+    # Move forward and back within a day
+    games = client.get("/games/", params={"season_id": 1, "limit": 100}).json()
+    day_games = [game for game in games if game["date"].startswith("2025-01-05")]
+    assert len(day_games) == 3
+    game_id = min(day_games, key=lambda game: game["game_number"])["id"]
+    for delta in [2, -1]:
+        response = client.put("/games/move/", params={"game_id": game_id, "delta": delta})
+        assert response.status_code == 200, response.text
+        check_ratings(database)
+
+    # Update scores and players
+    game_ids = get_game_ids(client)
+    games = client.get("/games/", params={"season_id": 1, "limit": 100}).json()
+    game = get_game(rng, 1)
+    game["iso_date"] = next(game["date"] for game in games if game["id"] == game_ids[3])
+    response = client.put("/games/", params={"game_id": game_ids[3]}, json=game)
+    assert response.status_code == 200, response.text
+    check_ratings(database)
+
+    # Delete from the middle and the end
+    for game_id in [game_ids[5], game_ids[-1]]:
+        assert client.delete("/games/", params={"game_id": game_id}).status_code == 200
+        check_ratings(database)
+    assert len(get_game_ids(client)) == len(game_ids) - 2
+
+
+def test_season_ratings_after_changes_past_a_checkpoint(database, season_client):
+    client = season_client
+    rng = random.Random(1)
+    response = client.post("/games/batch/", json=[get_game(rng, 1 + i // 3) for i in range(60)])
+    assert response.status_code == 200, response.text
+    check_ratings(database)
+
+    # Before and after the checkpoint at game 50
+    for day in [2, 19]:
+        assert client.post("/games/", json=get_game(rng, day)).status_code == 200
+        check_ratings(database)
+
+    # A player whose only game is deleted has no season rating left
+    assert client.post("/players/", json={"name": "Gil"}).status_code == 200
+    response = client.post("/games/", json=dict(get_game(rng, 18), yellow_offense="gil"))
+    assert response.status_code == 200, response.text
+    check_ratings(database)
+    assert client.delete("/games/", params={"game_id": response.json()["id"]}).status_code == 200
+    check_ratings(database)
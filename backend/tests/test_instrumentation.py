@@ -0,0 +1,32 @@
+import contextvars
+import threading
+
+from foos import instrumentation
+
+
+def run_request():
+    stats = instrumentation.start_request()
+    context = contextvars.copy_context()
+    in_block = threading.Event()
+    leave_block = threading.Event()
+    thread_ids = []
+
+    def run_timed_block():
+        thread_ids.append(threading.get_ident())
+        with instrumentation.timed("replay"):
+            in_block.set()
+            leave_block.wait()
+
+    thread = threading.Thread(target=lambda: context.run(run_timed_block))
+    thread.start()
+    in_block.wait()
+    assert stats.get_thread_ids() == {threading.get_ident(), *thread_ids}
+    leave_block.set()
+    thread.join()
+    assert stats.get_thread_ids() == {threading.get_ident()}
+    assert stats.timings.keys() == {"replay"}
+
+
+def test_pool_threads_are_only_sampled_while_running_the_request():
+    # In a context of its own so the request's stats don't outlive the test
+    contextvars.Context().run(run_request)
@@ -0,0 +1,84 @@
+from sqlmodel import Session, delete, select
+
+from foos.database import models, pair_stats
+
+
+def get_game(players: str, yellow_score: int, black_score: int, day: int = 1) -> dict:
+    yellow_offense, yellow_defense, black_offense, black_defense = players.split()
+    return {
+        "yellow_offense": yellow_offense,
+        "yellow_defense": yellow_defense,
+        "black_offense": black_offense,
+        "black_defense": black_defense,
+        "yellow_score": yellow_score,
+        "black_score": black_score,
+        "iso_date": f"2025-01-{day:02d}T20:00:00+00:00"
+    }
+
+
+def get_pair_stats(session: Session) -> dict[tuple, tuple[int, int]]:
+    return {
+        (row.season_id, row.player_id, row.position, row.other_player_id, row.relation): (row.num_games, row.num_wins)
+        for row in session.exec(select(models.PlayerPairStats)).all()
+    }
+
+
+def check_pair_stats(database):
+    """
+    Check the incrementally updated pair stats against the ones backfilled
+    from scratch, which have no rows counting zero games.
+    """
+    with Session(database.engine) as session:
+        stored = get_pair_stats(session)
+        session.execute(delete(models.PlayerPairStats))
+        pair_stats.backfill_pair_stats(session)
+        backfilled = get_pair_stats(session)
+    assert stored == backfilled
+    assert all(num_games > 0 for num_games, _ in stored.values())
+    return stored
+
+
+def test_pair_stats_match_backfill(database, season_client):
+    client = season_client
+    game_ids = []
+    for i, game in enumerate([
+        get_game("ann bob cat dan", 10, 5),
+        get_game("eve fay ann bob", 3, 10),
+        get_game("ann cat bob dan", 10, 8, day=2),
+        get_game("cat dan ann bob", 10, 9, day=2)
+    ]):
+        response = client.post("/games/", json=game)
+        assert response.status_code == 200, response.text
+        game_ids.append(response.json()["id"])
+    stored = check_pair_stats(database)
+    assert stored[(1, "eve", "offense", "fay", "partner")] == (1, 0)
+    assert stored[(1, "ann", "offense", "bob", "partner")] == (3, 2)
+
+    # Editing the only game of eve and fay drops their rows, and flipping the
+    # score moves the wins to the other team
+    response = client.put(
+        "/games/",
+        params={"game_id": game_ids[1]},
+        json=get_game("cat dan ann bob", 10, 3)
+    )
+    assert response.status_code == 200, response.text
+    stored = check_pair_stats(database)
+    assert not any("eve" in key or "fay" in key for key in stored)
+    assert stored[(1, "ann", "offense", "bob", "partner")] == (3, 1)
+    assert stored[(1, "cat", "offense", "dan", "partner")] == (3, 2)
+
+    # Deleting a game uncounts it
+    assert client.delete("/games/", params={"game_id": game_ids[0]}).status_code == 200
+    stored = check_pair_stats(database)
+    assert stored[(1, "ann", "offense", "bob", "partner")] == (2, 0)
+    assert stored[(1, "cat", "offense", "dan", "partner")] == (2, 2)
+
+    # Posting a batch counts every game once
+    response = client.post("/games/batch/", json=[
+        get_game("eve fay ann bob", 10, 0, day=3),
+        get_game("fay eve bob ann", 10, 2, day=1)
+    ])
+    assert response.status_code == 200, response.text
+    stored = check_pair_stats(database)
+    assert stored[(1, "eve", "offense", "ann", "opponent")] == (1, 1)
+    assert stored[(1, "eve", "defense", "ann", "opponent")] == (1, 1)
@@ -0,0 +1,35 @@
+import math
+
+import numpy as np
+import pytest
+
+from foos.rating.predict import MatchPredictions, get_team_splits
+
+
+@pytest.mark.parametrize("num_players, num_splits", [(3, 0), (4, 3), (5, 15), (8, 210)])
+def test_team_splits_list_every_match_once(num_players, num_splits):
+    splits = get_team_splits(num_players)
+    assert splits.shape == (num_splits, 4)
+    matches = {
+        frozenset([frozenset(split[:2]), frozenset(split[2:])])
+        for split in splits.tolist()
+    }
+    assert len(matches) == num_splits
+    assert all(len(set(split)) == 4 for split in splits.tolist())
+    assert all(0 <= player < num_players for split in splits.tolist() for player in split)
+
+
+def test_most_balanced_is_closest_to_even():
+    ratings = np.array([500.0, 510.0, 530.0, 560.0])
+    predictions = MatchPredictions(ratings, get_team_splits(4))
+    # Rating diffs: (0, 1) vs (2, 3) is -40, (0, 2) vs (1, 3) is -20 and
+    # (0, 3) vs (1, 2) is 10
+    assert predictions.most_balanced(1).tolist() == [2]
+    assert predictions.most_balanced(3).tolist() == [2, 1, 0]
+    assert predictions.most_balanced(10).tolist() == [2, 1, 0]
+    assert np.isclose(predictions.yellow_win_probabilities[2], 1 / (1 + math.exp(-10 / 40)))
+    assert np.isclose(predictions.yellow_scores[2], 10)
+    assert np.isclose(
+        predictions.black_scores[2],
+        10 - (2 * predictions.yellow_win_probabilities[2] - 1) * 10
+    )
@@ -0,0 +1,86 @@
+import asyncio
+import datetime
+import os
+
+import httpx
+from sqlmodel import Session
+
+import service
+from foos.database import models
+
+
+PLAYER_IDS = [f"player{i}" for i in range(8)]
+
+
+def seed(engine):
+    with Session(engine) as session:
+        session.add(models.Season(
+            id=1,
+            name="1",
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 12, 31),
+            rating_method="sigmoid_differential",
+            active=True
+        ))
+        for i, player_id in enumerate(PLAYER_IDS):
+            session.add(models.Player(id=player_id, name=player_id, color="#000000"))
+            session.add(models.PlayerSeasonRating(
+                season_id=1,
+                player_id=player_id,
+                rating=450.0 + 20 * i,
+                num_games=10,
+                num_wins=5
+            ))
+        session.commit()
+
+
+async def request_concurrently(num_requests: int) -> list[httpx.Response]:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=service.app),
+        base_url="http://test",
+        headers={"X-Auth-Token": os.environ["SHARED_SECRET"]}
+    ) as client:
+        requests = []
+        for i in range(num_requests):
+            if i % 2:
+                requests.append(client.get("/matchmake/", params={"season_id": 1, "player_ids": PLAYER_IDS}))
+            else:
+                requests.append(client.get("/predict/", params={
+                    "season_id": 1,
+                    "yellow_offense": PLAYER_IDS[0],
+                    "yellow_defense": PLAYER_IDS[1],
+                    "black_offense": PLAYER_IDS[2],
+                    "black_defense": PLAYER_IDS[3]
+                }))
+        # A request blocking the event loop would hang every other one
+        return await asyncio.wait_for(asyncio.gather(*requests), timeout=30)
+
+
+def test_concurrent_predictions_do_not_block(database):
+    seed(database.engine)
+
+    responses = asyncio.run(request_concurrently(8))
+
+    assert [response.status_code for response in responses] == [200] * 8
+    prediction = responses[0].json()
+    assert prediction["yellow_rating"] == 460.0
+    assert prediction["black_rating"] == 500.0
+    assert len(responses[1].json()) == 5
+
+
+def test_prediction_errors(client):
+    seed(service.db.engine)
+    params = {
+        "season_id": 1,
+        "yellow_offense": PLAYER_IDS[0],
+        "yellow_defense": PLAYER_IDS[1],
+        "black_offense": PLAYER_IDS[2],
+        "black_defense": PLAYER_IDS[3]
+    }
+
+    assert client.get("/predict/", params={**params, "season_id": 2}).status_code == 404
+    response = client.get("/predict/", params={**params, "black_defense": "nobody"})
+    assert response.status_code == 400
+    assert "nobody" in response.json()["detail"]
+    response = client.get("/matchmake/", params={"season_id": 1, "player_ids": PLAYER_IDS[:3] + ["nobody"]})
+    assert response.status_code == 400
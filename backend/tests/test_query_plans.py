@@ -0,0 +1,112 @@
+import datetime
+import os
+import random
+
+import pytest
+from sqlalchemy import Engine, create_engine, text
+from sqlmodel import Session, SQLModel, insert
+
+from foos import rating
+from foos.database import models
+from foos.rating.replay import replay_games
+
+
+TEST_DB_URL = os.getenv("TEST_DB_URL", "")
+TIMESERIES_INDEX = "timeseries_season_id_player_id_game_number_idx"
+
+NUM_SEASONS = 10
+NUM_GAMES_PER_SEASON = 1000
+NUM_PLAYERS = 30
+FIRST_DAY = datetime.datetime(2025, 1, 1, 20, tzinfo=datetime.timezone.utc)
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DB_URL.startswith("postgresql"),
+    reason="TEST_DB_URL is not set to a Postgres database"
+)
+
+
+def seed(session: Session):
+    rng = random.Random(0)
+    player_ids = [f"player{i}" for i in range(NUM_PLAYERS)]
+    session.execute(insert(models.Player), [
+        {"id": player_id, "name": player_id, "color": "#000000"}
+        for player_id in player_ids
+    ])
+    session.execute(insert(models.Season), [
+        {
+            "id": season_id,
+            "name": str(season_id),
+            "start_date": FIRST_DAY.date(),
+            "end_date": FIRST_DAY.date(),
+            "rating_method": "sigmoid_differential",
+            "active": season_id == NUM_SEASONS
+        }
+        for season_id in range(1, NUM_SEASONS + 1)
+    ])
+    game_number = 0
+    for season_id in range(1, NUM_SEASONS + 1):
+        games = []
+        for i in range(NUM_GAMES_PER_SEASON):
+            game_number += 1
+            yellow_offense, yellow_defense, black_offense, black_defense = rng.sample(player_ids, 4)
+            loser_score = rng.randrange(10)
+            yellow_score, black_score = (10, loser_score) if rng.random() < 0.5 else (loser_score, 10)
+            games.append(models.Game(
+                id=game_number,
+                game_number=game_number,
+                season_id=season_id,
+                date=FIRST_DAY + datetime.timedelta(days=game_number // 10),
+                yellow_offense=yellow_offense,
+                yellow_defense=yellow_defense,
+                black_offense=black_offense,
+                black_defense=black_defense,
+                yellow_score=yellow_score,
+                black_score=black_score
+            ))
+        session.add_all(games)
+        session.flush()
+        result = replay_games(games, {}, "sigmoid_differential")
+        session.execute(insert(models.TimeSeries), result.to_timeseries_rows())
+    session.commit()
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine(TEST_DB_URL)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        seed(session)
+    # VACUUM can't run in a transaction, and sets the visibility map that
+    # index only scans need
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE"))
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def explain(engine: Engine, query) -> str:
+    compiled = query.compile(dialect=engine.dialect)
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql("EXPLAIN " + str(compiled), compiled.params).all()
+    return "\n".join(row[0] for row in rows)
+
+
+@pytest.mark.parametrize("season_id", [1, NUM_SEASONS // 2, NUM_SEASONS])
+@pytest.mark.parametrize("as_of", ["latest", "game", "date", "game_and_date"])
+def test_ratings_query_uses_timeseries_index(engine: Engine, season_id: int, as_of: str):
+    season_game_number = (season_id - 1) * NUM_GAMES_PER_SEASON + NUM_GAMES_PER_SEASON // 2
+    game_number = season_game_number if as_of in ("game", "game_and_date") else None
+    date = (
+        FIRST_DAY + datetime.timedelta(days=season_game_number // 10)
+        if as_of in ("date", "game_and_date") else None
+    )
+
+    plan = explain(engine, rating.get_ratings_query(season_id, date, game_number))
+
+    assert (
+        f"Index Scan using {TIMESERIES_INDEX}" in plan
+        or f"Index Only Scan using {TIMESERIES_INDEX}" in plan
+    ), plan
+    assert "Seq Scan on timeseries" not in plan, plan
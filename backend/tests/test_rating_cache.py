@@ -0,0 +1,87 @@
+import datetime
+
+from sqlmodel import Session, select, update
+
+from foos import rating
+from foos.database import models
+
+
+def seed_games(client, num_games: int):
+    client.post("/players/", json={"name": "Ann"})
+    for name in ["Bob", "Cat", "Dan"]:
+        client.post("/players/", json={"name": name})
+    for i in range(num_games):
+        response = client.post("/games/", json={
+            "yellow_offense": "ann",
+            "yellow_defense": "bob",
+            "black_offense": "cat",
+            "black_defense": "dan",
+            "yellow_score": 10,
+            "black_score": i % 10,
+            "iso_date": f"2025-01-{i + 1:02d}T20:00:00+00:00"
+        })
+        assert response.status_code == 200, response.text
+
+
+def get_latest_ratings(session: Session) -> dict[str, float]:
+    player_id_to_rating = {}
+    for player_id, player_rating in session.exec(
+        select(models.TimeSeries.player_id, models.TimeSeries.rating)
+        .where(models.TimeSeries.season_id == 1)
+        .order_by(models.TimeSeries.game_number)
+    ):
+        player_id_to_rating[player_id] = player_rating
+    return player_id_to_rating
+
+
+def add_season(database):
+    with Session(database.engine) as session:
+        session.add(models.Season(
+            id=1,
+            name="1",
+            start_date=datetime.date(2025, 1, 1),
+            end_date=datetime.date(2025, 12, 31),
+            rating_method="sigmoid_differential",
+            active=True
+        ))
+        session.commit()
+
+
+def test_invalidate_drops_seasons_changed_by_others(database, client):
+    add_season(database)
+    seed_games(client, 5)
+    with Session(database.engine) as session:
+        assert rating.get_player_ratings(session, 1) == get_latest_ratings(session)
+
+    with Session(database.engine) as session, Session(database.engine) as other_session:
+        # This process commits a change that doesn't touch the loaded games
+        rating.bump_data_version(session, 1)
+        session.commit()
+        # Another process commits an edit before the cache is invalidated
+        other_session.execute(
+            update(models.TimeSeries)
+            .where(models.TimeSeries.season_id == 1)
+            .values(rating=models.TimeSeries.rating + 100)
+        )
+        rating.bump_data_version(other_session, 1)
+        other_session.commit()
+
+        rating.rating_cache.invalidate(session, 100)
+
+        assert rating.get_player_ratings(session, 1) == get_latest_ratings(session)
+
+
+def test_invalidate_keeps_seasons_only_changed_by_the_session(database, client):
+    add_season(database)
+    seed_games(client, 5)
+    with Session(database.engine) as session:
+        rating.get_player_ratings(session, 1)
+        [state] = rating.rating_cache._seasons.values()
+        loaded_game_number = state.game_number
+
+        rating.bump_data_version(session, 1)
+        session.commit()
+        rating.rating_cache.invalidate(session, loaded_game_number + 1)
+
+        assert state.game_number == loaded_game_number
+        assert rating.get_player_ratings(session, 1) == get_latest_ratings(session)
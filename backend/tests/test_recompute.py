@@ -0,0 +1,32 @@
+import threading
+
+from sqlalchemy.exc import OperationalError
+
+from foos.rating import recompute
+
+
+class FlakyWorker(recompute.RecomputeWorker):
+    """
+    Worker whose first run fails like a dropped database connection.
+    """
+    def __init__(self):
+        super().__init__(engine=None, delay=0, poll_interval=0.01)
+        self.num_runs = 0
+        self.recovered = threading.Event()
+
+    def run_pending(self) -> int:
+        self.num_runs += 1
+        if self.num_runs == 1:
+            raise OperationalError("SELECT 1", {}, Exception("connection reset"))
+        self.recovered.set()
+        return 0
+
+
+def test_worker_survives_database_errors():
+    worker = FlakyWorker()
+    worker.start()
+    try:
+        assert worker.recovered.wait(5)
+        assert worker._thread.is_alive()
+    finally:
+        worker.stop()
@@ -0,0 +1,98 @@
+import datetime
+import random
+
+import numpy as np
+import pytest
+
+from foos import rating
+from foos.database import models
+from foos.rating.replay import BASE_RATING, EncodedGames, replay_encoded, replay_games
+
+
+METHODS = ["min_scaled_flat_score", "sigmoid_differential", "square_differential"]
+
+
+def get_random_games(num_games: int, num_players: int, seed: int) -> list[models.Game]:
+    rng = random.Random(seed)
+    player_ids = [f"player{i}" for i in range(num_players)]
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    games = []
+    for i in range(num_games):
+        yellow_offense, yellow_defense, black_offense, black_defense = rng.sample(player_ids, 4)
+        loser_score = rng.randrange(10)
+        yellow_score, black_score = (10, loser_score) if rng.random() < 0.5 else (loser_score, 10)
+        games.append(models.Game(
+            id=i + 1,
+            season_id=1,
+            game_number=i + 1,
+            date=start + datetime.timedelta(minutes=i),
+            yellow_offense=yellow_offense,
+            yellow_defense=yellow_defense,
+            black_offense=black_offense,
+            black_defense=black_defense,
+            yellow_score=yellow_score,
+            black_score=black_score
+        ))
+    return games
+
+
+def replay_per_game(
+    games: list[models.Game],
+    player_id_to_rating: dict[str, float],
+    method: str
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Replay the games one `update_ratings` call at a time, like the rating
+    path did before games were replayed in batches.
+    """
+    player_id_to_rating = player_id_to_rating.copy()
+    ratings = []
+    deltas = []
+    for game in games:
+        positions = [game.yellow_offense, game.yellow_defense, game.black_offense, game.black_defense]
+        for player_id in positions:
+            player_id_to_rating.setdefault(player_id, BASE_RATING)
+        updated = rating.update_ratings(game, player_id_to_rating, method)
+        ratings.append([updated[player_id] for player_id in positions])
+        deltas.append([updated[player_id] - player_id_to_rating[player_id] for player_id in positions])
+        player_id_to_rating = updated
+    return np.array(ratings), np.array(deltas)
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("initial_ratings", [False, True])
+def test_replay_matches_per_game_updates(method: str, initial_ratings: bool):
+    games = get_random_games(num_games=500, num_players=12, seed=1)
+    player_id_to_rating = {"player0": 620.0, "player5": 410.0} if initial_ratings else {}
+
+    expected_ratings, expected_deltas = replay_per_game(games, player_id_to_rating, method)
+    result = replay_encoded(
+        EncodedGames.from_games(games, list(player_id_to_rating)),
+        player_id_to_rating,
+        method
+    )
+
+    assert result.ratings.shape == expected_ratings.shape
+    assert np.allclose(result.ratings, expected_ratings)
+    assert np.allclose(result.deltas, expected_deltas)
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_replay_games_final_ratings(method: str):
+    games = get_random_games(num_games=200, num_players=8, seed=2)
+
+    expected_ratings, _ = replay_per_game(games, {}, method)
+    player_id_to_rating = replay_games(games, {}, method).player_id_to_rating()
+
+    last_ratings: dict[str, float] = {}
+    for game, game_ratings in zip(games, expected_ratings):
+        for player_id, player_rating in zip(
+            [game.yellow_offense, game.yellow_defense, game.black_offense, game.black_defense],
+            game_ratings
+        ):
+            last_ratings[player_id] = player_rating
+    assert player_id_to_rating.keys() == last_ratings.keys()
+    assert np.allclose(
+        [player_id_to_rating[player_id] for player_id in last_ratings],
+        list(last_ratings.values())
+    )
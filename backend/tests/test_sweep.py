@@ -0,0 +1,48 @@
+import math
+
+import numpy as np
+
+from foos.rating.replay import EncodedGames
+from foos.rating.sweep import sweep
+
+
+def sigmoid(x: float) -> float:
+    return 1 / (1 + math.exp(-x))
+
+
+def test_sweep_scores_match_hand_computed_values():
+    # With square_differential, the winners gain the score diff to the
+    # exponent: score diff with exponent 1, and 1 with exponent 0
+    encoded = EncodedGames(
+        game_ids=[1, 2, 3, 4],
+        season_ids=[1, 1, 1, 1],
+        game_numbers=[1, 2, 3, 4],
+        positions=[
+            ["a", "a", "a", "c"],
+            ["b", "b", "c", "d"],
+            ["c", "c", "b", "a"],
+            ["d", "d", "d", "b"]
+        ],
+        yellow_scores=[10, 4, 10, 10],
+        black_scores=[6, 10, 0, 9],
+        player_ids=[]
+    )
+    result = sweep([encoded], "square_differential", {"exponent": np.array([1.0, 0.0])})
+    assert result.num_games == 4
+
+    # Exponent 1: a, b, c, d go from 500 to 504, 504, 496, 496 after game 1,
+    # 498, 498, 502, 502 after game 2 and 508, 488, 512, 492 after game 3.
+    # Games 1 and 3 are ties, black wins game 2 rated 8 lower and yellow
+    # wins game 4 rated 4 higher.
+    # Exponent 0: 501, 501, 499, 499 after game 1, all 500 after game 2 and
+    # 501, 499, 501, 499 after game 3. Only game 2 isn't a tie, won by black
+    # rated 2 lower.
+    win_probabilities = [
+        [0.5, sigmoid(-8 / 40), 0.5, sigmoid(4 / 40)],
+        [0.5, sigmoid(-2 / 40), 0.5, 0.5]
+    ]
+    for i, probabilities in enumerate(win_probabilities):
+        assert np.isclose(result.log_loss[i], -sum(math.log(p) for p in probabilities) / 4)
+        assert np.isclose(result.brier[i], sum((1 - p) ** 2 for p in probabilities) / 4)
+    assert result.accuracy.tolist() == [0.5, 0.0]
+    assert result.ranking("accuracy").tolist() == [0, 1]